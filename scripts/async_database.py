@@ -0,0 +1,529 @@
+"""
+Async MongoDB Database Layer for the FastAPI Endpoints
+Same methods as CertificateDatabase, awaited on the event loop through Motor
+so database-bound requests run concurrently instead of blocking each other
+"""
+
+import os
+import asyncio
+from datetime import datetime
+from typing import AsyncIterator, Dict, List, Optional, Union
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import DESCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError, ConnectionFailure
+
+from database import (
+    CertificateDatabase, CertificateStore, CERTIFICATE_INDEXES, SEARCH_PROJECTION, USER_INDEXES, VERIFY_PROJECTION, certificate_document,
+    client_options, listing_error, listing_page, listing_request, search_result, stats_pipeline, stats_result,
+    user_document, verification_result, LISTING_SORT, STATUS_LISTING_INDEX, StatsCache, VerifyPolicy
+)
+from attempt_counter import AttemptCounter
+from hash_filter import HashFilter
+from lookup_cache import LookupCache
+
+
+class AsyncCertificateDatabase:
+    def __init__(self, connection_string: str = None, database_name: str = None,
+                 hash_filter: Optional[HashFilter] = None, attempt_counter: Optional[AttemptCounter] = None,
+                 lookup_cache: Optional[LookupCache] = None):
+        """
+        Create the Motor client; no connection is made until connect() or the first query
+
+        Args:
+            connection_string: MongoDB URI (MONGODB_URI)
+            database_name: Database name (MONGODB_DATABASE)
+            hash_filter: Filter to share with a CertificateDatabase in the same process
+                         (a new one is created unless HASH_FILTER=off)
+            attempt_counter: Counter buffer to share likewise (a new one is created
+                             unless ATTEMPT_BUFFER=off)
+            lookup_cache: Verify/search cache to share likewise, so a status update
+                          through either client invalidates it (unless LOOKUP_CACHE=off)
+        """
+        self.connection_string = connection_string or os.getenv(
+            'MONGODB_URI',
+            'mongodb://localhost:27017/'
+        )
+        self.database_name = database_name or os.getenv('MONGODB_DATABASE', 'certificate_validator')
+        self.certificates_collection = 'certificates'
+        self.users_collection = 'users'
+
+        if hash_filter is not None:
+            self.hash_filter = hash_filter
+        else:
+            self.hash_filter = HashFilter() if os.getenv('HASH_FILTER', 'on').lower() != 'off' else None
+
+        if lookup_cache is not None:
+            self.lookup_cache = lookup_cache
+        else:
+            self.lookup_cache = LookupCache() if os.getenv('LOOKUP_CACHE', 'on').lower() != 'off' else None
+
+        # Last get_database_stats result
+        self._stats_cache = StatsCache()
+        self._stats_lock = asyncio.Lock()
+
+        # Pool size and timeouts come from the same MONGODB_* variables as the sync client
+        self.client = AsyncIOMotorClient(self.connection_string, **client_options())
+        self.db = self.client[self.database_name]
+        self.certificates = self.db[self.certificates_collection]
+        self.users = self.db[self.users_collection]
+
+        # The buffer flushes from its own thread, through the client's pymongo delegate
+        if attempt_counter is not None:
+            self.attempt_counter = attempt_counter
+        else:
+            self.attempt_counter = (
+                AttemptCounter(self.certificates.delegate)
+                if os.getenv('ATTEMPT_BUFFER', 'on').lower() != 'off' else None
+            )
+
+    async def connect(self):
+        """
+        Check the server is reachable and create indexes
+
+        Raises:
+            ConnectionFailure: If no server is reachable within the selection timeout
+        """
+        try:
+            await self.client.admin.command('ping')
+            await self._create_indexes()
+            print("Connected to MongoDB (async) successfully!")
+        except ConnectionFailure as e:
+            print(f"Failed to connect to MongoDB: {e}")
+            raise
+
+    async def _create_indexes(self):
+        for keys, options in CERTIFICATE_INDEXES:
+            await self.certificates.create_index(keys, **options)
+        for keys, options in USER_INDEXES:
+            await self.users.create_index(keys, **options)
+
+    async def store_certificate(self, certificate_data: Dict) -> Dict:
+        """
+        Store certificate data in MongoDB
+
+        Args:
+            certificate_data: Dictionary containing certificate information
+
+        Returns:
+            Dictionary with storage result
+        """
+        try:
+            document = certificate_document(certificate_data)
+            result = await self.certificates.insert_one(document)
+            if self.hash_filter:
+                self.hash_filter.add(document["hash"])
+
+            return {
+                "success": True,
+                "document_id": str(result.inserted_id),
+                "hash": certificate_data.get("hash"),
+                "message": "Certificate stored successfully"
+            }
+
+        except DuplicateKeyError:
+            return {
+                "success": False,
+                "error": "Certificate with this hash already exists",
+                "duplicate": True
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    async def verify_certificate_by_hash(self, hash_value: str) -> Dict:
+        """
+        Verify certificate by its SHA-256 hash (see CertificateDatabase.verify_certificate_by_hash)
+
+        Args:
+            hash_value: SHA-256 hash to verify
+
+        Returns:
+            Dictionary with verification result
+        """
+        policy = VerifyPolicy(self.hash_filter, self.lookup_cache, self.attempt_counter)
+        try:
+            if policy.filtered(hash_value):
+                recheck = policy.recheck_query(hash_value)
+                if recheck is None or not await self.certificates.find_one(recheck, {"_id": 1}):
+                    return verification_result(hash_value, None)
+                policy.found_unseen(hash_value)
+
+            certificate = policy.cached(hash_value)
+            if certificate:
+                if not policy.buffer_attempt(hash_value):
+                    await self.certificates.update_one({"hash": hash_value}, {"$inc": {"verification_attempts": 1}})
+                return verification_result(hash_value, certificate)
+
+            if policy.buffers_attempts:
+                certificate = await self.certificates.find_one({"hash": hash_value}, VERIFY_PROJECTION)
+                if certificate:
+                    policy.buffer_attempt(hash_value)
+            else:
+                certificate = await self.certificates.find_one_and_update(
+                    {"hash": hash_value},
+                    {"$inc": {"verification_attempts": 1}},
+                    projection=VERIFY_PROJECTION,
+                    return_document=ReturnDocument.BEFORE
+                )
+            return policy.settle(hash_value, certificate)
+
+        except Exception as e:
+            return {
+                "verified": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    async def verify_certificates_by_hashes(self, hash_values: List[str],
+                                            chunk_size: int = None) -> AsyncIterator[List[Dict]]:
+        """
+        Verify many hashes, one chunk at a time (see CertificateDatabase.verify_certificates_by_hashes)
+
+        Args:
+            hash_values: Hashes to verify (duplicates are allowed)
+            chunk_size: Hashes per query (BULK_VERIFY_CHUNK_SIZE)
+
+        Yields:
+            Lists of results, in input order, shaped like verify_certificate_by_hash
+        """
+        chunk_size = chunk_size or int(os.getenv('BULK_VERIFY_CHUNK_SIZE', 1000))
+        policy = VerifyPolicy(self.hash_filter, self.lookup_cache, self.attempt_counter)
+
+        for start in range(0, len(hash_values), chunk_size):
+            chunk = hash_values[start:start + chunk_size]
+            candidates, misses, query = policy.plan_chunk(chunk)
+
+            try:
+                found = {}
+                if query:
+                    async for certificate in self.certificates.find(query, {**VERIFY_PROJECTION, "hash": 1}):
+                        found[certificate["hash"]] = certificate
+
+                attempts = policy.settle_chunk(chunk, candidates, misses, found)
+                if attempts:
+                    try:
+                        await self.certificates.bulk_write([
+                            UpdateOne({"hash": hash_value}, {"$inc": {"verification_attempts": count}})
+                            for hash_value, count in attempts.items()
+                        ], ordered=False)
+                    except Exception as e:
+                        print(f"Error updating verification attempts: {e}")
+
+                results = [verification_result(hash_value, found.get(hash_value)) for hash_value in chunk]
+
+            except Exception as e:
+                results = [
+                    {"verified": False, "hash": hash_value, "error": f"Database error: {str(e)}"}
+                    for hash_value in chunk
+                ]
+            yield results
+
+    async def search_certificate_by_id(self, certificate_id: str) -> Dict:
+        """
+        Search for certificate by certificate ID
+
+        Args:
+            certificate_id: Certificate ID to search for
+
+        Returns:
+            Dictionary with search result
+        """
+        try:
+            certificate = self.lookup_cache.get('search', certificate_id) if self.lookup_cache else None
+            if certificate is None:
+                certificate = await self.certificates.find_one({"certificate_id": certificate_id}, SEARCH_PROJECTION)
+                if certificate and self.lookup_cache:
+                    self.lookup_cache.put('search', certificate_id, certificate)
+            return search_result(certificate_id, certificate)
+
+        except Exception as e:
+            return {
+                "found": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    async def get_certificates_by_user(self, user_id: str, limit: int = 50, page_token: str = None,
+                                       fields: List[str] = None) -> Dict:
+        """
+        Get one page of certificates uploaded by a specific user, newest first
+
+        Args:
+            user_id: User ID
+            limit: Certificates per page (at most CERTIFICATE_PAGE_MAX)
+            page_token: next_page_token from the previous page
+            fields: Fields to return (LISTING_FIELDS by default)
+
+        Returns:
+            Dictionary with the certificates, their count and next_page_token (None on the last page)
+
+        Raises:
+            ValueError: For an invalid page token or an unknown field
+        """
+        return await self._listing_page({"uploaded_by": user_id}, limit, page_token, fields)
+
+    async def get_all_certificates(self, limit: int = 100, status: str = None, page_token: str = None,
+                                   fields: List[str] = None) -> Dict:
+        """
+        Get one page of all certificates, newest first (admin function)
+
+        Args:
+            limit: Certificates per page (at most CERTIFICATE_PAGE_MAX)
+            status: Filter by status (optional)
+            page_token: next_page_token from the previous page
+            fields: Fields to return (LISTING_FIELDS by default)
+
+        Returns:
+            Dictionary with the certificates, their count and next_page_token (None on the last page)
+
+        Raises:
+            ValueError: For an invalid page token or an unknown field
+        """
+        query = {}
+        if status:
+            query["status"] = status
+        return await self._listing_page(query, limit, page_token, fields)
+
+    async def _listing_page(self, query: Dict, limit: int, page_token: Optional[str],
+                            fields: Optional[List[str]]) -> Dict:
+        """
+        Keyset pagination on (upload_date, _id) (see CertificateDatabase._listing_page)
+        """
+        query, projection, limit = listing_request(query, limit, page_token, fields)
+
+        try:
+            cursor = self.certificates.find(query, projection).sort(LISTING_SORT).limit(limit + 1)
+            return listing_page([cert async for cert in cursor], limit)
+
+        except Exception as e:
+            return listing_error(e)
+
+    async def update_certificate_status(self, hash_value: str, status: str) -> Dict:
+        """
+        Update certificate status
+
+        Args:
+            hash_value: Certificate hash
+            status: New status
+
+        Returns:
+            Dictionary with update result
+        """
+        try:
+            certificate = await self.certificates.find_one_and_update(
+                {"hash": hash_value},
+                {"$set": {"status": status, "last_updated": datetime.utcnow()}},
+                projection={"_id": 0, "certificate_id": 1}
+            )
+
+            if certificate is not None:
+                if self.lookup_cache:
+                    self.lookup_cache.invalidate('verify', hash_value)
+                    self.lookup_cache.invalidate('search', certificate.get("certificate_id"))
+                return {
+                    "success": True,
+                    "message": "Certificate status updated"
+                }
+            return {
+                "success": False,
+                "message": "Certificate not found"
+            }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    async def store_user(self, user_data: Dict) -> Dict:
+        """
+        Store user information
+
+        Args:
+            user_data: Dictionary containing user information
+
+        Returns:
+            Dictionary with storage result
+        """
+        try:
+            result = await self.users.insert_one(user_document(user_data))
+
+            return {
+                "success": True,
+                "user_id": str(result.inserted_id),
+                "message": "User stored successfully"
+            }
+
+        except DuplicateKeyError:
+            return {
+                "success": False,
+                "error": "User with this email already exists"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    async def get_database_stats(self) -> Dict:
+        """
+        Get database statistics from one aggregation, cached for ADMIN_STATS_CACHE_SECONDS
+
+        Concurrent requests on an expired cache wait for a single refresh.
+
+        Returns:
+            Dictionary with database statistics
+        """
+        async with self._stats_lock:
+            cached = self._stats_cache.get()
+            if cached:
+                return cached
+
+            try:
+                cursor = self.certificates.aggregate(stats_pipeline(), hint=STATUS_LISTING_INDEX)
+                status_groups = [group async for group in cursor]
+                total_users = await self.users.count_documents({})
+
+                return self._stats_cache.put(stats_result(status_groups, total_users))
+
+            except Exception as e:
+                return {
+                    "error": f"Database error: {str(e)}"
+                }
+
+    async def load_hash_filter(self):
+        """
+        Load or build the hash filter in a worker thread, through the client's pymongo delegate
+        """
+        if not self.hash_filter:
+            return
+        await asyncio.to_thread(self.hash_filter.build, self.certificates.delegate, self.database_name)
+        await asyncio.to_thread(self.hash_filter.save, self.database_name)
+
+    async def refresh_hash_filter(self):
+        """
+        Add hashes stored by other processes since the last refresh and persist the filter
+        """
+        if not self.hash_filter or not self.hash_filter.ready:
+            return
+        await asyncio.to_thread(self.hash_filter.catch_up, self.certificates.delegate)
+        await asyncio.to_thread(self.hash_filter.save, self.database_name)
+
+    async def get_hash_filter_stats(self) -> Dict:
+        """
+        Hash filter size, memory use and false-positive rates
+        """
+        if not self.hash_filter:
+            return {"enabled": False}
+        return self.hash_filter.info()
+
+    async def get_lookup_cache_stats(self) -> Dict:
+        """
+        Verify and search cache hit ratios
+        """
+        if not self.lookup_cache:
+            return {"enabled": False}
+        return self.lookup_cache.stats()
+
+    async def get_attempt_counter_stats(self) -> Dict:
+        """
+        Buffered verification attempts and flush counts
+        """
+        if not self.attempt_counter:
+            return {"enabled": False}
+        return {"enabled": True, **self.attempt_counter.info()}
+
+    def close_connection(self):
+        """
+        Close database connection (after flushing buffered verification attempts)
+        """
+        if self.attempt_counter:
+            self.attempt_counter.close()
+        self.client.close()
+        print("Database connection closed")
+
+
+class ThreadedCertificateDatabase:
+    """
+    Async front for a backend without an async driver (the embedded SQLite store):
+    each call runs in a worker thread, so it never blocks the event loop
+    """
+
+    def __init__(self, store: CertificateStore):
+        self.store = store
+        self.hash_filter = store.hash_filter
+        self.attempt_counter = store.attempt_counter
+        self.lookup_cache = store.lookup_cache
+
+    async def connect(self):
+        """
+        Nothing to do: the store opened its database when it was created
+        """
+
+    async def store_certificate(self, certificate_data: Dict) -> Dict:
+        return await asyncio.to_thread(self.store.store_certificate, certificate_data)
+
+    async def verify_certificate_by_hash(self, hash_value: str) -> Dict:
+        return await asyncio.to_thread(self.store.verify_certificate_by_hash, hash_value)
+
+    async def verify_certificates_by_hashes(self, hash_values: List[str],
+                                            chunk_size: int = None) -> AsyncIterator[List[Dict]]:
+        chunks = self.store.verify_certificates_by_hashes(hash_values, chunk_size)
+        while True:
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                return
+            yield chunk
+
+    async def search_certificate_by_id(self, certificate_id: str) -> Dict:
+        return await asyncio.to_thread(self.store.search_certificate_by_id, certificate_id)
+
+    async def get_certificates_by_user(self, user_id: str, limit: int = 50, page_token: str = None,
+                                       fields: List[str] = None) -> Dict:
+        return await asyncio.to_thread(self.store.get_certificates_by_user, user_id, limit, page_token, fields)
+
+    async def get_all_certificates(self, limit: int = 100, status: str = None, page_token: str = None,
+                                   fields: List[str] = None) -> Dict:
+        return await asyncio.to_thread(self.store.get_all_certificates, limit, status, page_token, fields)
+
+    async def update_certificate_status(self, hash_value: str, status: str) -> Dict:
+        return await asyncio.to_thread(self.store.update_certificate_status, hash_value, status)
+
+    async def store_user(self, user_data: Dict) -> Dict:
+        return await asyncio.to_thread(self.store.store_user, user_data)
+
+    async def get_database_stats(self) -> Dict:
+        return await asyncio.to_thread(self.store.get_database_stats)
+
+    async def load_hash_filter(self):
+        await asyncio.to_thread(self.store.load_hash_filter)
+
+    async def refresh_hash_filter(self):
+        await asyncio.to_thread(self.store.refresh_hash_filter)
+
+    async def get_hash_filter_stats(self) -> Dict:
+        return self.store.get_hash_filter_stats()
+
+    async def get_lookup_cache_stats(self) -> Dict:
+        return self.store.get_lookup_cache_stats()
+
+    async def get_attempt_counter_stats(self) -> Dict:
+        return self.store.get_attempt_counter_stats()
+
+    def close_connection(self):
+        """
+        Nothing to do: the store is closed by its owner
+        """
+
+
+def create_async_database(db: CertificateStore) -> Union[AsyncCertificateDatabase, ThreadedCertificateDatabase]:
+    """
+    Async client for the API endpoints over the same database as db
+
+    MongoDB gets a Motor client sharing db's hash filter, attempt counter and
+    lookup cache; other backends are called through worker threads.
+    """
+    if isinstance(db, CertificateDatabase):
+        return AsyncCertificateDatabase(db.connection_string, db.database_name, hash_filter=db.hash_filter,
+                                        attempt_counter=db.attempt_counter, lookup_cache=db.lookup_cache)
+    return ThreadedCertificateDatabase(db)
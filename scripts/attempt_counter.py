@@ -0,0 +1,122 @@
+"""
+Write-Behind Buffer for Certificate Verification Counters
+Coalesces verification_attempts increments per hash in memory and writes them
+with one unordered bulk_write per flush, instead of one $inc per verify
+"""
+
+import os
+import threading
+from typing import Dict
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+
+
+class AttemptCounter:
+    def __init__(self, collection, flush_seconds: float = None, max_pending: int = None):
+        """
+        Buffer increments for a certificates collection
+
+        Args:
+            collection: pymongo collection the counters live in
+            flush_seconds: Flush interval; a crash loses at most this many seconds
+                           of increments (ATTEMPT_FLUSH_SECONDS)
+            max_pending: Distinct hashes that trigger an early flush (ATTEMPT_FLUSH_MAX_PENDING)
+        """
+        self.collection = collection
+        self.flush_seconds = flush_seconds or float(os.getenv('ATTEMPT_FLUSH_SECONDS', 5))
+        self.max_pending = max_pending or int(os.getenv('ATTEMPT_FLUSH_MAX_PENDING', 10000))
+
+        self._pending: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self._thread = None
+        self.stats = {'increments': 0, 'flushes': 0, 'writes': 0, 'failed_flushes': 0}
+
+    def add(self, hash_value: str, count: int = 1):
+        """
+        Count verification attempts; they reach the database at the next flush
+        """
+        with self._lock:
+            self._pending[hash_value] = self._pending.get(hash_value, 0) + count
+            self.stats['increments'] += count
+            pending = len(self._pending)
+
+        if self._closed:
+            self.flush()
+            return
+        if self._thread is None:
+            self._start()
+        if pending >= self.max_pending:
+            self._wake.set()
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='attempt-counter', daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._closed:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        Write every buffered increment with one unordered bulk_write
+
+        Increments that fail to write go back in the buffer for the next flush.
+
+        Returns:
+            Number of certificates updated
+        """
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+
+        operations = list(pending.items())
+        try:
+            self.collection.bulk_write([
+                UpdateOne({"hash": hash_value}, {"$inc": {"verification_attempts": count}})
+                for hash_value, count in operations
+            ], ordered=False)
+            failed = []
+        except BulkWriteError as e:
+            # Unordered: everything but the reported operations was applied
+            failed = [operations[error['index']] for error in e.details['writeErrors']]
+            print(f"Error updating verification attempts: {len(failed)} failed")
+        except Exception as e:
+            # Nothing is known to be applied; retrying may count some attempts twice
+            failed = operations
+            print(f"Error updating verification attempts: {e}")
+
+        with self._lock:
+            for hash_value, count in failed:
+                self._pending[hash_value] = self._pending.get(hash_value, 0) + count
+            self.stats['flushes'] += 1
+            self.stats['writes'] += len(operations) - len(failed)
+            if failed:
+                self.stats['failed_flushes'] += 1
+        return len(operations) - len(failed)
+
+    def close(self):
+        """
+        Stop the flusher and write what is left (call on shutdown)
+        """
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def info(self) -> Dict:
+        with self._lock:
+            return {
+                'flush_seconds': self.flush_seconds,
+                'pending_hashes': len(self._pending),
+                'pending_increments': sum(self._pending.values()),
+                **self.stats
+            }
@@ -0,0 +1,265 @@
+"""
+Batch Certificate Processing
+Expands multi-file and zip uploads and micro-batches the LayoutLMv3 stage
+"""
+
+import os
+import io
+import asyncio
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, List, Tuple
+
+from fastapi import HTTPException
+
+from upload_handling import CERTIFICATE_FORMATS, MAX_FILE_SIZE, read_upload, sniff_format
+
+# Zip archives may hold many certificates, so they get their own upload limit
+MAX_ARCHIVE_SIZE = int(os.getenv('BATCH_MAX_ARCHIVE_MB', 100)) * 1024 * 1024
+
+# Most bytes one batch request may carry, both as uploaded and once zip members are
+# counted at their uncompressed size; bounds a request's memory (and zip bombs)
+MAX_BATCH_TOTAL_SIZE = int(os.getenv('BATCH_MAX_TOTAL_MB', 200)) * 1024 * 1024
+
+# Certificates held in memory at once per OCR worker while a batch is processed
+IN_FLIGHT_PER_WORKER = int(os.getenv('BATCH_IN_FLIGHT_PER_WORKER', 2))
+
+
+def _error_result(filename: str, error: str) -> Dict:
+    return {
+        'filename': filename,
+        'success': False,
+        'error': error,
+        'timestamp': datetime.now().isoformat()
+    }
+
+
+async def read_uploads(files: List, max_total_size: int = None) -> Tuple[List[Tuple[str, bytes]], List[Dict]]:
+    """
+    Read batch uploads one at a time, turning invalid files into per-file rejections
+
+    Files that would take the request past max_total_size bytes (BATCH_MAX_TOTAL_MB)
+    are rejected, unread when the multipart parser already knows their size.
+
+    Returns:
+        Tuple of (filename, contents) pairs and per-file rejection results
+    """
+    max_total_size = max_total_size or MAX_BATCH_TOTAL_SIZE
+    too_large = f"Batch size limit reached (max {max_total_size // (1024 * 1024)}MB)"
+    uploads = []
+    rejected = []
+    total = 0
+    for file in files:
+        if file.size is not None and total + file.size > max_total_size:
+            rejected.append(_error_result(file.filename, too_large))
+            continue
+        try:
+            _, contents = await read_upload(
+                file, formats=CERTIFICATE_FORMATS + ('zip',), max_sizes={'zip': MAX_ARCHIVE_SIZE}
+            )
+        except HTTPException as e:
+            rejected.append(_error_result(file.filename, e.detail))
+            continue
+        if total + len(contents) > max_total_size:
+            rejected.append(_error_result(file.filename, too_large))
+            continue
+        total += len(contents)
+        uploads.append((file.filename, contents))
+    return uploads, rejected
+
+
+def _read_head(archive: zipfile.ZipFile, info: zipfile.ZipInfo) -> bytes:
+    """
+    The first bytes of a zip member, enough to sniff its format, without inflating the rest
+    """
+    with archive.open(info) as member:
+        return member.read(1024)
+
+
+def expand_uploads(uploads: List[Tuple[str, bytes]], max_files: int = None,
+                   max_total_size: int = None) -> Tuple[List[Tuple[str, Callable[[], bytes]]], List[Dict]]:
+    """
+    Flatten uploaded files and zip archives into individual certificates
+
+    Zip members are not inflated here: each accepted certificate comes with a
+    callable returning its contents, which process_batch calls when it gets to it.
+    Sizes are checked against the members' declared uncompressed size, which zipfile
+    enforces (a member inflating past it fails its CRC check instead of growing).
+
+    Args:
+        uploads: (filename, contents) pairs as received
+        max_files: Maximum number of certificates accepted in one batch
+        max_total_size: Maximum uncompressed bytes of all certificates in one batch
+
+    Returns:
+        Tuple of accepted (filename, load) pairs and per-file rejection results
+    """
+    max_files = max_files or int(os.getenv('BATCH_MAX_FILES', 500))
+    max_total_size = max_total_size or MAX_BATCH_TOTAL_SIZE
+    accepted = []
+    rejected = []
+    total = 0
+
+    def add(filename: str, size: int, head: Callable[[], bytes], load: Callable[[], bytes]):
+        nonlocal total
+        if size > MAX_FILE_SIZE:
+            rejected.append(_error_result(filename, "File too large (max 10MB)"))
+        elif len(accepted) >= max_files:
+            rejected.append(_error_result(filename, f"Batch limit reached (max {max_files} files)"))
+        elif total + size > max_total_size:
+            rejected.append(_error_result(
+                filename, f"Batch size limit reached (max {max_total_size // (1024 * 1024)}MB)"
+            ))
+        else:
+            try:
+                file_format = sniff_format(head())
+            except Exception:
+                rejected.append(_error_result(filename, "Invalid zip member"))
+                return
+            # Formats are identified by content, not by the file name
+            if file_format not in CERTIFICATE_FORMATS:
+                rejected.append(_error_result(filename, "Unsupported file format"))
+            else:
+                total += size
+                accepted.append((filename, load))
+
+    for filename, contents in uploads:
+        if sniff_format(contents[:1024]) != 'zip':
+            add(filename, len(contents), lambda contents=contents: contents[:1024],
+                lambda contents=contents: contents)
+            continue
+
+        try:
+            archive = zipfile.ZipFile(io.BytesIO(contents))
+        except zipfile.BadZipFile:
+            rejected.append(_error_result(filename, "Invalid zip archive"))
+            continue
+
+        # Left open for the loaders; it only wraps the archive bytes, no file handle
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            # Check the declared size before inflating anything
+            add(f"{filename}/{info.filename}", info.file_size,
+                lambda info=info, archive=archive: _read_head(archive, info),
+                lambda info=info, archive=archive: archive.read(info))
+
+    return accepted, rejected
+
+
+def format_result(filename: str, result: Dict, cached: bool = False) -> Dict:
+    """
+    Shape a pipeline result like the single-file /process-certificate response
+    """
+    if not result['success']:
+        return _error_result(filename, f"Processing failed: {result['error']}")
+
+    return {
+        'filename': filename,
+        'success': True,
+        'extracted_data': result['extracted_data'],
+        'hash': result['hash'],
+        'confidence': result['confidence'],
+        'processing_info': result['processing_info'],
+        'cached': cached,
+        'timestamp': result['timestamp']
+    }
+
+
+async def process_batch(executor, uploads: List[Tuple[str, Callable[[], bytes]]], batch_size: int = None,
+                        max_wait: float = None, cache=None, max_in_flight: int = None) -> AsyncIterator[Dict]:
+    """
+    Process certificates concurrently and yield each result as soon as it is ready
+
+    The OpenCV/Tesseract stages run in parallel on the OCR executor. Prepared pages
+    are then grouped into LayoutLMv3 micro-batches of up to batch_size, flushed early
+    once max_wait seconds pass without the batch filling up.
+
+    Certificates are loaded only as slots free up: at most max_in_flight of them
+    are held (read, being prepared, waiting for a micro-batch or in one) at a time.
+
+    Args:
+        executor: Started OCRExecutor
+        uploads: (filename, load) pairs from expand_uploads
+        batch_size: Maximum pages per LayoutLMv3 forward pass
+        max_wait: Seconds a partial micro-batch may wait for more pages
+        cache: Optional ResultCache consulted before, and filled after, processing
+        max_in_flight: Certificates held at once (OCR_POOL_SIZE x BATCH_IN_FLIGHT_PER_WORKER)
+    """
+    batch_size = batch_size or int(os.getenv('LAYOUT_BATCH_SIZE', 8))
+    max_wait = max_wait if max_wait is not None else float(os.getenv('LAYOUT_BATCH_WAIT', 0.05))
+    max_in_flight = max_in_flight or executor.pool_size * IN_FLIGHT_PER_WORKER
+
+    pending = iter(uploads)
+    in_flight = 0
+    preparing = {}
+    completing = {}
+    ready = []
+
+    def flush(chunk: List[Tuple[Tuple[str, bytes], Dict]]):
+        future = asyncio.ensure_future(
+            executor.run('complete_certificates', [prepared for _, prepared in chunk])
+        )
+        completing[future] = [item for item, _ in chunk]
+
+    while True:
+        # Top up to max_in_flight before waiting on anything
+        while in_flight < max_in_flight:
+            next_upload = next(pending, None)
+            if next_upload is None:
+                break
+            filename, load = next_upload
+            try:
+                # Inflating a zip member is CPU work; keep it off the event loop
+                contents = await asyncio.to_thread(load)
+            except Exception as e:
+                yield _error_result(filename, f"Could not read file: {e}")
+                continue
+            cached = await asyncio.to_thread(cache.get, contents) if cache is not None else None
+            if cached is not None:
+                yield format_result(filename, cached, cached=True)
+                continue
+            preparing[asyncio.ensure_future(executor.run('prepare_certificate', contents))] = (filename, contents)
+            in_flight += 1
+
+        if not (preparing or completing or ready):
+            break
+
+        if ready and (len(ready) >= batch_size or not preparing):
+            flush(ready[:batch_size])
+            ready = ready[batch_size:]
+            continue
+
+        done, _ = await asyncio.wait(
+            set(preparing) | set(completing),
+            timeout=max_wait if ready else None,
+            return_when=asyncio.FIRST_COMPLETED
+        )
+
+        if not done:
+            # Timed out with a partial micro-batch; flush it rather than idle
+            flush(ready)
+            ready = []
+            continue
+
+        for future in done:
+            if future in preparing:
+                item = preparing.pop(future)
+                try:
+                    ready.append((item, future.result()))
+                except Exception as e:
+                    in_flight -= 1
+                    yield _error_result(item[0], f"Processing failed: {e}")
+            else:
+                items = completing.pop(future)
+                in_flight -= len(items)
+                try:
+                    results = future.result()
+                except Exception as e:
+                    for filename, _ in items:
+                        yield _error_result(filename, f"Processing failed: {e}")
+                    continue
+                for (filename, contents), result in zip(items, results):
+                    if cache is not None:
+                        await asyncio.to_thread(cache.put, contents, result)
+                    yield format_result(filename, result)
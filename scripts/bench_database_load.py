@@ -0,0 +1,151 @@
+"""
+Load test: database-bound endpoints on the sync data layer vs. the async one
+Runs concurrent verify/search/stats requests on one event loop, as uvicorn
+would, against a local mongod (MONGODB_URI) in a throwaway database
+"""
+
+import os
+import asyncio
+import random
+import statistics
+import time
+
+from async_database import AsyncCertificateDatabase
+from database import CertificateDatabase
+
+# Dropped when the benchmark finishes; never point this at real data
+BENCH_DATABASE = os.getenv('BENCH_MONGODB_DATABASE', 'certificate_validator_bench')
+
+CERTIFICATES = 2000
+REQUESTS = 5000
+CONCURRENCY = (1, 16, 64)
+MISS_RATIO = 0.2
+
+# Share of each request type (the remainder is /admin/stats)
+VERIFY_SHARE = 0.7
+SEARCH_SHARE = 0.25
+
+
+def seed(db: CertificateDatabase) -> list:
+    """
+    Store certificates shaped like real uploads and return their hashes
+    """
+    db.certificates.delete_many({})
+    hashes = []
+    for i in range(CERTIFICATES):
+        hash_value = f"{i:064x}"
+        db.store_certificate({
+            "hash": hash_value,
+            "certificate_id": f"CERT-2024-{i:05d}",
+            "name": f"Student {i}",
+            "roll_no": f"CS{2020000 + i}",
+            "marks": "85%",
+            "institution": "University of Technology",
+            "confidence": 90.0 if i % 3 else 70.0,
+            "filename": f"certificate_{i}.pdf",
+            "file_size": 2048576,
+            "uploaded_by": f"user{i % 50}",
+            "processing_info": {"tesseract_confidence": 88.0, "layout_confidence": 92.0},
+            "file_type": "application/pdf",
+            "processing_time": 2.5
+        })
+        hashes.append(hash_value)
+    return hashes
+
+
+def workload(hashes: list) -> list:
+    """
+    The same request mix for every run: (kind, argument)
+    """
+    rng = random.Random(0)
+    requests = []
+    for _ in range(REQUESTS):
+        roll = rng.random()
+        if roll < VERIFY_SHARE:
+            hit = rng.random() > MISS_RATIO
+            requests.append(('verify', rng.choice(hashes) if hit else f"{rng.getrandbits(256):064x}"))
+        elif roll < VERIFY_SHARE + SEARCH_SHARE:
+            requests.append(('search', f"CERT-2024-{rng.randrange(CERTIFICATES):05d}"))
+        else:
+            requests.append(('stats', None))
+    return requests
+
+
+def sync_handlers(db: CertificateDatabase) -> dict:
+    """
+    Handlers as they were: async def calling the sync layer, blocking the loop
+    """
+    async def verify(hash_value):
+        return db.verify_certificate_by_hash(hash_value)
+
+    async def search(certificate_id):
+        return db.search_certificate_by_id(certificate_id)
+
+    async def stats(_):
+        return db.get_database_stats()
+
+    return {'verify': verify, 'search': search, 'stats': stats}
+
+
+def async_handlers(db: AsyncCertificateDatabase) -> dict:
+    async def verify(hash_value):
+        return await db.verify_certificate_by_hash(hash_value)
+
+    async def search(certificate_id):
+        return await db.search_certificate_by_id(certificate_id)
+
+    async def stats(_):
+        return await db.get_database_stats()
+
+    return {'verify': verify, 'search': search, 'stats': stats}
+
+
+async def run_load(handlers: dict, requests: list, concurrency: int):
+    """
+    Serve the requests with `concurrency` clients; latency includes time queued on the loop
+    """
+    queue = iter(requests)
+    latencies = []
+
+    async def client():
+        for kind, argument in queue:
+            start = time.perf_counter()
+            await handlers[kind](argument)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - start, sorted(latencies)
+
+
+async def run_all(sync_db: CertificateDatabase, async_db: AsyncCertificateDatabase, requests: list):
+    await async_db.connect()
+    print(f"{REQUESTS} requests ({VERIFY_SHARE:.0%} verify, {SEARCH_SHARE:.0%} search, "
+          f"{1 - VERIFY_SHARE - SEARCH_SHARE:.0%} stats) over {CERTIFICATES} certificates")
+    print(f"{'layer':<8}{'clients':>8}{'req/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for concurrency in CONCURRENCY:
+        for name, handlers in (('sync', sync_handlers(sync_db)), ('async', async_handlers(async_db))):
+            await run_load(handlers, requests[:100], concurrency)  # warm the connection pool
+            elapsed, latencies = await run_load(handlers, requests, concurrency)
+            print(f"{name:<8}{concurrency:>8}{len(latencies) / elapsed:>10.0f}"
+                  f"{latencies[len(latencies) // 2] * 1000:>10.3f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.3f}"
+                  f"{statistics.mean(latencies) * 1000:>10.3f}")
+
+
+def run_benchmark():
+    # Every request goes to the database; the hash filter would answer the misses
+    os.environ['HASH_FILTER'] = 'off'
+    sync_db = CertificateDatabase(database_name=BENCH_DATABASE)
+    async_db = AsyncCertificateDatabase(database_name=BENCH_DATABASE)
+    try:
+        requests = workload(seed(sync_db))
+        asyncio.run(run_all(sync_db, async_db, requests))
+    finally:
+        async_db.close_connection()
+        sync_db.client.drop_database(sync_db.database_name)
+        sync_db.close_connection()
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,110 @@
+"""
+Micro-benchmark: field extraction engine vs. the previous per-pattern implementation
+Runs on synthetic multi-page transcript text; no OCR dependencies required
+"""
+
+import random
+import re
+import timeit
+
+from field_extraction import FIELD_PATTERNS, engine
+
+HEADER = (
+    "This is to certify that Jane Doe Roll No EE2020005 Certificate No CERT-2024-002 "
+    "marks 92% University of Engineering "
+)
+VOCABULARY = (
+    "the of and in to semester course credits subject grade point total examination "
+    "held during academic year passed with distinction page transcript department engineering"
+).split()
+
+
+def legacy_extract(text: str) -> dict:
+    """
+    The previous extract_fields_with_patterns: pattern dict rebuilt per call,
+    lowercased copy of the text, one uncompiled re.search per pattern
+    """
+    fields = {field: None for field in FIELD_PATTERNS}
+    patterns = {
+        'name': [
+            r'(?:name|student|candidate)[\s:]+([A-Za-z\s]{2,50})',
+            r'(?:this is to certify that)[\s]+([A-Za-z\s]{2,50})',
+            r'(?:mr\.|ms\.|miss)[\s]+([A-Za-z\s]{2,50})'
+        ],
+        'roll_no': [
+            r'(?:roll|reg|registration|student)[\s]*(?:no|number|id)[\s:]*([A-Z0-9]{4,20})',
+            r'(?:roll|reg)[\s]*:[\s]*([A-Z0-9]{4,20})',
+            r'([A-Z]{2}[0-9]{4,8})'
+        ],
+        'certificate_id': [
+            r'(?:certificate|cert)[\s]*(?:no|number|id)[\s:]*([A-Z0-9-]{4,30})',
+            r'(?:serial|ref)[\s]*(?:no|number)[\s:]*([A-Z0-9-]{4,30})',
+            r'(CERT-[A-Z0-9-]{4,20})'
+        ],
+        'marks': [
+            r'(?:marks|grade|score|percentage)[\s:]*([0-9]{1,3}\.?[0-9]*%?)',
+            r'(?:secured|obtained)[\s]*([0-9]{1,3}\.?[0-9]*%?)',
+            r'([0-9]{1,3}\.?[0-9]*%)'
+        ],
+        'institution': [
+            r'(?:university|college|institute|school)[\s]*(?:of)?[\s]*([A-Za-z\s]{5,100})',
+            r'(?:issued by|from)[\s]*([A-Za-z\s]{5,100})',
+            r'([A-Za-z\s]*(?:university|college|institute))'
+        ]
+    }
+    text_lower = text.lower()
+    for field, field_patterns in patterns.items():
+        for pattern in field_patterns:
+            match = re.search(pattern, text_lower, re.IGNORECASE)
+            if match and not fields[field]:
+                fields[field] = match.group(1).strip()
+                break
+    return fields
+
+
+def transcript(pages: int, with_header: bool = True, seed: int = 0) -> str:
+    """
+    Build OCR-like transcript text: a certificate header followed by ~400-word pages
+    """
+    rng = random.Random(seed)
+    body = ' '.join(
+        f"Transcript page {page} "
+        + ' '.join(rng.choice(VOCABULARY) for _ in range(400))
+        + f" Subject code MA{100 + page} credits 4"
+        for page in range(pages)
+    )
+    return HEADER + body if with_header else body
+
+
+def time_call(func, text: str, budget: float = 1.0) -> float:
+    """
+    Mean seconds per call, repeating until roughly `budget` seconds are spent
+    """
+    single = timeit.timeit(lambda: func(text), number=1)
+    number = max(1, min(200, int(budget / max(single, 1e-6))))
+    return timeit.timeit(lambda: func(text), number=number) / number
+
+
+def run_benchmark():
+    print(f"{'case':<28}{'chars':>9}{'legacy':>12}{'engine':>12}{'speedup':>10}")
+    for pages in (1, 10, 50):
+        for label, with_header in (('all fields present', True), ('fields missing', False)):
+            text = transcript(pages, with_header)
+
+            # Same matches as before; the engine keeps the original case
+            expected = legacy_extract(text)
+            actual = {
+                field: value.lower() if value else value
+                for field, value in engine.extract_values(text).items()
+            }
+            assert actual == expected, (expected, actual)
+
+            legacy_time = time_call(legacy_extract, text)
+            engine_time = time_call(engine.extract, text)
+            print(f"{f'{pages}p {label}':<28}{len(text):>9}"
+                  f"{legacy_time * 1000:>10.2f}ms{engine_time * 1000:>10.2f}ms"
+                  f"{legacy_time / engine_time:>9.1f}x")
+
+
+if __name__ == "__main__":
+    run_benchmark()
@@ -0,0 +1,55 @@
+"""
+Benchmark: open time, heap use and lookup rate of the memory-mapped hash snapshot
+Runs on synthetic digests in a temporary directory; no database is needed
+"""
+
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from hash_snapshot import HashSnapshot, write_snapshot
+
+SIZES = (100_000, 1_000_000, 5_000_000)
+LOOKUPS = 100_000
+MISS_RATIO = 0.5
+
+
+def run_benchmark():
+    rng = random.Random(0)
+    print(f"{'hashes':>10}{'file MB':>10}{'open ms':>10}{'heap KB':>10}{'lookups/s':>12}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in SIZES:
+            path = os.path.join(directory, f"hashes_{size}.snapshot")
+            stored = sorted(f"{rng.getrandbits(256):064x}" for _ in range(size))
+            write_snapshot(iter(stored), path)
+            lookups = [
+                f"{rng.getrandbits(256):064x}" if rng.random() < MISS_RATIO else rng.choice(stored)
+                for _ in range(LOOKUPS)
+            ]
+            del stored
+
+            # Heap allocated by opening the snapshot and a first thousand lookups
+            tracemalloc.start()
+            start = time.perf_counter()
+            snapshot = HashSnapshot(path)
+            opened = time.perf_counter() - start
+
+            found = sum(hash_value in snapshot for hash_value in lookups[:1000])
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # Timed without tracemalloc, which slows every allocation
+            start = time.perf_counter()
+            found = sum(hash_value in snapshot for hash_value in lookups)
+            elapsed = time.perf_counter() - start
+
+            assert abs(found / LOOKUPS - (1 - MISS_RATIO)) < 0.02
+            print(f"{size:>10}{os.path.getsize(path) / 2**20:>10.1f}{opened * 1000:>10.3f}"
+                  f"{peak / 1024:>10.1f}{LOOKUPS / elapsed:>12.0f}")
+            snapshot.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
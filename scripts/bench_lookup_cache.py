@@ -0,0 +1,75 @@
+"""
+Benchmark: verify and search latency with and without the lookup cache
+Runs against a local mongod (MONGODB_URI) in a throwaway database
+"""
+
+import os
+import random
+import statistics
+import time
+
+from bench_verify import BENCH_DATABASE, CERTIFICATES, seed
+from database import CertificateDatabase
+from lookup_cache import LookupCache
+
+LOOKUPS = 10000
+SEARCH_RATIO = 0.3
+# Popularity skew: a few certificates (recent graduates, job portal re-checks) take most lookups
+POPULARITY_ALPHA = 1.2
+
+
+def workload(hashes: list) -> list:
+    """
+    The same skewed (kind, key) sequence for every run
+    """
+    rng = random.Random(0)
+    lookups = []
+    for _ in range(LOOKUPS):
+        index = min(int(rng.paretovariate(POPULARITY_ALPHA)) - 1, len(hashes) - 1)
+        if rng.random() < SEARCH_RATIO:
+            lookups.append(('search', f"CERT-2024-{index:05d}"))
+        else:
+            lookups.append(('verify', hashes[index]))
+    return lookups
+
+
+def measure(db: CertificateDatabase, lookups: list) -> list:
+    latencies = []
+    for kind, key in lookups:
+        start = time.perf_counter()
+        if kind == 'verify':
+            db.verify_certificate_by_hash(key)
+        else:
+            db.search_certificate_by_id(key)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def run_benchmark():
+    # Every lookup in the workload is a hit in the database; keep the filter out of the way
+    os.environ['HASH_FILTER'] = 'off'
+    db = CertificateDatabase(database_name=BENCH_DATABASE)
+    try:
+        lookups = workload(seed(db))
+        print(f"{LOOKUPS} lookups over {CERTIFICATES} certificates, {SEARCH_RATIO:.0%} searches, "
+              f"Pareto({POPULARITY_ALPHA}) popularity")
+        print(f"{'cache':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}{'hit ratio':>11}")
+        for name, cache in (('off', None), ('on', LookupCache())):
+            db.lookup_cache = cache
+            db.verify_certificate_by_hash(lookups[0][1])  # warm the connection pool
+            latencies = measure(db, lookups)
+            hit_ratio = ''
+            if cache:
+                stats = cache.stats()
+                hits = stats['verify']['hits'] + stats['search']['hits']
+                hit_ratio = f"{hits / (hits + stats['verify']['misses'] + stats['search']['misses']):.1%}"
+            print(f"{name:<10}{latencies[len(latencies) // 2] * 1000:>10.3f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.3f}"
+                  f"{statistics.mean(latencies) * 1000:>10.3f}{hit_ratio:>11}")
+    finally:
+        db.client.drop_database(db.database_name)
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    run_benchmark()
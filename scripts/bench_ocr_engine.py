@@ -0,0 +1,81 @@
+"""
+Benchmark: pooled in-process Tesseract vs. one pytesseract subprocess per call
+Measures per-call latency and concurrent throughput on a synthetic certificate page
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+from ocr_engine import SubprocessTesseractEngine, TesseractEnginePool
+
+CALLS = 40
+CONCURRENCY = 4
+LINES = (
+    "CERTIFICATE OF COMPLETION",
+    "This is to certify that Jane Doe",
+    "Roll No EE2020005 Certificate No CERT-2024-002",
+    "has secured 92% marks",
+    "University of Engineering",
+)
+
+
+def synthetic_page() -> np.ndarray:
+    """
+    Binarized certificate-like page, similar to preprocess_image output
+    """
+    page = np.full((1100, 1700), 255, np.uint8)
+    for row, line in enumerate(LINES):
+        cv2.putText(page, line, (100, 200 + row * 150), cv2.FONT_HERSHEY_SIMPLEX, 1.6, 0, 3)
+    return page
+
+
+def run_calls(engine, page: np.ndarray, workers: int):
+    """
+    Returns (per-call latencies in seconds, wall time) for CALLS calls on `workers` threads
+    """
+    def timed_call(_):
+        start = time.perf_counter()
+        engine.image_to_data(page)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        latencies = list(pool.map(timed_call, range(CALLS)))
+    return latencies, time.perf_counter() - start
+
+
+def build_engines():
+    engines = [SubprocessTesseractEngine()]
+    try:
+        engines.append(TesseractEnginePool(pool_size=CONCURRENCY))
+    except ImportError:
+        print("tesserocr is not installed; only the subprocess engine is measured")
+    return engines
+
+
+def run_benchmark():
+    page = synthetic_page()
+    engines = build_engines()
+
+    # Same words from both engines before comparing speed
+    words = {engine.name: [w for w in engine.image_to_data(page)['text'] if w.strip()] for engine in engines}
+    for name, found in words.items():
+        print(f"{name}: {' '.join(found)}")
+
+    print(f"{'engine':<12}{'threads':>8}{'mean ms':>10}{'p95 ms':>10}{'pages/s':>10}")
+    for engine in engines:
+        engine.warm_up()
+        for workers in (1, CONCURRENCY):
+            latencies, wall = run_calls(engine, page, workers)
+            latencies.sort()
+            p95 = latencies[int(len(latencies) * 0.95) - 1]
+            print(f"{engine.name:<12}{workers:>8}{np.mean(latencies) * 1000:>10.1f}"
+                  f"{p95 * 1000:>10.1f}{CALLS / wall:>10.1f}")
+        engine.close()
+
+
+if __name__ == "__main__":
+    run_benchmark()
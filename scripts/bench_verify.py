@@ -0,0 +1,96 @@
+"""
+Benchmark: single round-trip verify vs. the previous find_one + update_one verify
+Runs against a local mongod (MONGODB_URI) in a throwaway database
+"""
+
+import os
+import random
+import statistics
+import time
+
+from database import CertificateDatabase
+
+# Dropped when the benchmark finishes; never point this at real data
+BENCH_DATABASE = os.getenv('BENCH_MONGODB_DATABASE', 'certificate_validator_bench')
+
+CERTIFICATES = 2000
+LOOKUPS = 5000
+MISS_RATIO = 0.2
+
+
+def legacy_verify(db: CertificateDatabase, hash_value: str) -> bool:
+    """
+    The previous verify: full-document find_one, then a second round trip to count it
+    """
+    certificate = db.certificates.find_one({"hash": hash_value})
+    if certificate:
+        db.certificates.update_one({"hash": hash_value}, {"$inc": {"verification_attempts": 1}})
+    return certificate is not None
+
+
+def seed(db: CertificateDatabase) -> list:
+    """
+    Store certificates shaped like real uploads and return their hashes
+    """
+    db.certificates.delete_many({})
+    hashes = []
+    for i in range(CERTIFICATES):
+        hash_value = f"{i:064x}"
+        db.store_certificate({
+            "hash": hash_value,
+            "certificate_id": f"CERT-2024-{i:05d}",
+            "name": f"Student {i}",
+            "roll_no": f"CS{2020000 + i}",
+            "marks": "85%",
+            "institution": "University of Technology",
+            "confidence": 90.0,
+            "filename": f"certificate_{i}.pdf",
+            "file_size": 2048576,
+            "uploaded_by": "bench",
+            "processing_info": {
+                "tesseract_confidence": 88.0,
+                "layout_confidence": 92.0,
+                "enhanced_extraction": False,
+                "layout_stage": "skipped",
+                "normalization": {"mode": "text-height", "original_size": [2480, 3508], "scale": 0.8}
+            },
+            "file_type": "application/pdf",
+            "processing_time": 2.5
+        })
+        hashes.append(hash_value)
+    return hashes
+
+
+def measure(verify, hashes: list) -> list:
+    rng = random.Random(0)
+    latencies = []
+    for _ in range(LOOKUPS):
+        hash_value = rng.choice(hashes) if rng.random() > MISS_RATIO else f"{rng.getrandbits(256):064x}"
+        start = time.perf_counter()
+        verify(hash_value)
+        latencies.append(time.perf_counter() - start)
+    return sorted(latencies)
+
+
+def run_benchmark():
+    db = CertificateDatabase(database_name=BENCH_DATABASE)
+    try:
+        hashes = seed(db)
+        print(f"{LOOKUPS} lookups over {CERTIFICATES} certificates, {MISS_RATIO:.0%} misses")
+        print(f"{'verify':<10}{'p50 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+        for name, verify in (
+            ('legacy', lambda hash_value: legacy_verify(db, hash_value)),
+            ('single', db.verify_certificate_by_hash),
+        ):
+            verify(hashes[0])  # warm the connection pool
+            latencies = measure(verify, hashes)
+            print(f"{name:<10}{latencies[len(latencies) // 2] * 1000:>10.3f}"
+                  f"{latencies[int(len(latencies) * 0.99)] * 1000:>10.3f}"
+                  f"{statistics.mean(latencies) * 1000:>10.3f}")
+    finally:
+        db.client.drop_database(db.database_name)
+        db.close_connection()
+
+
+if __name__ == "__main__":
+    run_benchmark()
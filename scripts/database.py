@@ -1,18 +1,648 @@
 """
 MongoDB Database Integration for Certificate Authenticity Validator
-Handles storage and retrieval of certificate data and hashes
+Handles storage and retrieval of certificate data and hashes; CertificateStore
+is the backend interface and create_database() opens the configured backend
 """
 
 import os
+import time
+from abc import ABC, abstractmethod
 from datetime import datetime
-from typing import Dict, List, Optional
-from pymongo import MongoClient, ASCENDING, DESCENDING
-from pymongo.errors import DuplicateKeyError, ConnectionFailure
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+from pymongo import MongoClient, ASCENDING, DESCENDING, ReturnDocument, UpdateOne, monitoring
+from pymongo.errors import BulkWriteError, DuplicateKeyError, ConnectionFailure
+import base64
 import hashlib
 import json
+from bson import ObjectId
+from bson.errors import InvalidId
 
-class CertificateDatabase:
-    def __init__(self, connection_string: str = None):
+from attempt_counter import AttemptCounter
+from hash_filter import HashFilter
+from lookup_cache import LookupCache
+from metrics import metrics
+
+# Fields read by verify_certificate_by_hash; nothing else leaves the server
+VERIFY_PROJECTION = {
+    "_id": 0,
+    "extracted_data": 1,
+    "upload_date": 1,
+    "confidence": 1,
+    "status": 1
+}
+
+# Listings page newest first; _id breaks ties between equal upload dates
+LISTING_SORT = [("upload_date", DESCENDING), ("_id", DESCENDING)]
+
+# Serves status-filtered listings in LISTING_SORT order, and is the index the
+# admin stats aggregation scans instead of the documents
+STATUS_LISTING_INDEX = [("status", ASCENDING), *LISTING_SORT]
+
+# Fields a listing may ask for; LISTING_FIELDS is returned when none are given.
+# _id and upload_date are always included (the page token is built from them)
+CERTIFICATE_FIELDS = (
+    "certificate_id", "hash", "extracted_data", "processing_info", "confidence", "filename",
+    "file_size", "upload_date", "uploaded_by", "status", "verification_attempts", "metadata",
+    "last_updated"
+)
+LISTING_FIELDS = (
+    "certificate_id", "hash", "extracted_data", "confidence", "filename", "uploaded_by", "status",
+    "verification_attempts"
+)
+CERTIFICATE_PAGE_MAX = int(os.getenv('CERTIFICATE_PAGE_MAX', 500))
+
+# How long /admin/stats results are reused; dashboards poll far more often than counts change
+ADMIN_STATS_CACHE_SECONDS = float(os.getenv('ADMIN_STATS_CACHE_SECONDS', 10))
+
+# Index keys and options, created by both the sync and async clients
+CERTIFICATE_INDEXES = [
+    ([("hash", ASCENDING)], {"unique": True}),
+    ([("certificate_id", ASCENDING)], {}),
+    ([("roll_no", ASCENDING)], {}),
+    (LISTING_SORT, {}),
+    (STATUS_LISTING_INDEX, {}),
+    ([("uploaded_by", ASCENDING), *LISTING_SORT], {})
+]
+USER_INDEXES = [
+    ([("email", ASCENDING)], {"unique": True}),
+    ([("user_id", ASCENDING)], {"unique": True})
+]
+
+# Fields read by search_certificate_by_id
+SEARCH_PROJECTION = {**VERIFY_PROJECTION, "hash": 1}
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Connection pool and timeout settings, shared by the sync and async clients;
+# unset variables keep the driver defaults
+CLIENT_OPTIONS = {
+    'maxPoolSize': 'MONGODB_MAX_POOL_SIZE',
+    'minPoolSize': 'MONGODB_MIN_POOL_SIZE',
+    'maxIdleTimeMS': 'MONGODB_MAX_IDLE_TIME_MS',
+    'waitQueueTimeoutMS': 'MONGODB_WAIT_QUEUE_TIMEOUT_MS',
+    'connectTimeoutMS': 'MONGODB_CONNECT_TIMEOUT_MS',
+    'socketTimeoutMS': 'MONGODB_SOCKET_TIMEOUT_MS',
+    'serverSelectionTimeoutMS': 'MONGODB_SERVER_SELECTION_TIMEOUT_MS'
+}
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """
+    Counts every MongoDB round trip (getMore batches included) and its latency,
+    by command name, in the /metrics registry
+    """
+    
+    def started(self, event):
+        pass
+    
+    def succeeded(self, event):
+        self._record(event, "ok")
+    
+    def failed(self, event):
+        self._record(event, "error")
+    
+    def _record(self, event, outcome: str):
+        metrics.increment("certificate_db_round_trips_total", command=event.command_name, outcome=outcome)
+        metrics.observe("certificate_db_round_trip_seconds", event.duration_micros / 1_000_000,
+                        command=event.command_name)
+
+
+COMMAND_METRICS = CommandMetrics()
+
+
+def client_options() -> Dict:
+    """
+    MongoClient keyword arguments: the pool and timeout variables that are set,
+    and the round-trip listener
+    """
+    options = {option: int(os.environ[name]) for option, name in CLIENT_OPTIONS.items() if os.getenv(name)}
+    return {**options, "event_listeners": [COMMAND_METRICS]}
+
+
+def certificate_document(certificate_data: Dict) -> Dict:
+    """
+    Shape the document stored for a processed certificate
+    """
+    return {
+        "certificate_id": certificate_data.get("certificate_id"),
+        "hash": certificate_data.get("hash"),
+        "extracted_data": {
+            "name": certificate_data.get("name"),
+            "roll_no": certificate_data.get("roll_no"),
+            "certificate_id": certificate_data.get("certificate_id"),
+            "marks": certificate_data.get("marks"),
+            "institution": certificate_data.get("institution")
+        },
+        "processing_info": certificate_data.get("processing_info", {}),
+        "confidence": certificate_data.get("confidence", 0),
+        "filename": certificate_data.get("filename"),
+        "file_size": certificate_data.get("file_size"),
+        "upload_date": datetime.utcnow(),
+        "uploaded_by": certificate_data.get("uploaded_by"),
+        "status": "verified" if certificate_data.get("confidence", 0) > 80 else "pending",
+        "verification_attempts": 0,
+        "metadata": {
+            "ocr_version": "1.0.0",
+            "processing_time": certificate_data.get("processing_time"),
+            "file_type": certificate_data.get("file_type")
+        }
+    }
+
+
+def user_document(user_data: Dict) -> Dict:
+    """
+    Shape the document stored for a user
+    """
+    return {
+        "user_id": user_data.get("user_id"),
+        "email": user_data.get("email"),
+        "name": user_data.get("name"),
+        "role": user_data.get("role", "verifier"),
+        "created_date": datetime.utcnow(),
+        "last_login": datetime.utcnow(),
+        "is_active": True,
+        "verification_count": 0
+    }
+
+
+def verification_result(hash_value: str, certificate: Optional[Dict]) -> Dict:
+    """
+    Shape a verify response from a document fetched with VERIFY_PROJECTION
+    """
+    if not certificate:
+        return {
+            "verified": False,
+            "hash": hash_value,
+            "message": "Certificate not found in database"
+        }
+    
+    return {
+        "verified": True,
+        "certificate_data": {
+            "name": certificate["extracted_data"]["name"],
+            "roll_no": certificate["extracted_data"]["roll_no"],
+            "certificate_id": certificate["extracted_data"]["certificate_id"],
+            "marks": certificate["extracted_data"]["marks"],
+            "institution": certificate["extracted_data"]["institution"],
+            "upload_date": certificate["upload_date"].isoformat(),
+            "confidence": certificate["confidence"],
+            "status": certificate["status"]
+        },
+        "hash": hash_value
+    }
+
+
+def search_result(certificate_id: str, certificate: Optional[Dict]) -> Dict:
+    """
+    Shape a search-by-ID response
+    """
+    if not certificate:
+        return {
+            "found": False,
+            "certificate_id": certificate_id,
+            "message": "Certificate ID not found"
+        }
+    
+    return {
+        "found": True,
+        "certificate_data": {
+            "name": certificate["extracted_data"]["name"],
+            "roll_no": certificate["extracted_data"]["roll_no"],
+            "certificate_id": certificate["extracted_data"]["certificate_id"],
+            "marks": certificate["extracted_data"]["marks"],
+            "institution": certificate["extracted_data"]["institution"],
+            "upload_date": certificate["upload_date"].isoformat(),
+            "confidence": certificate["confidence"],
+            "status": certificate["status"],
+            "hash": certificate["hash"]
+        }
+    }
+
+
+def serialize_certificate(certificate: Dict) -> Dict:
+    """
+    Convert ObjectId to string and format dates for a JSON response
+    """
+    certificate["_id"] = str(certificate["_id"])
+    certificate["upload_date"] = certificate["upload_date"].isoformat()
+    return certificate
+
+
+def listing_projection(fields: Optional[List[str]] = None) -> Dict:
+    """
+    Projection for a listing page
+
+    Raises:
+        ValueError: If a field is not in CERTIFICATE_FIELDS
+    """
+    fields = fields or LISTING_FIELDS
+    unknown = [field for field in fields if field not in CERTIFICATE_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return {"upload_date": 1, **{field: 1 for field in fields}}
+
+
+def encode_page_token(certificate: Dict) -> str:
+    """
+    Opaque token for the page after this certificate (its position in LISTING_SORT)
+    """
+    position = json.dumps([certificate["upload_date"].isoformat(), str(certificate["_id"])])
+    return base64.urlsafe_b64encode(position.encode()).decode().rstrip("=")
+
+
+def decode_page_token(page_token: str) -> Tuple[datetime, str]:
+    """
+    (upload_date, id) position from a page token
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        upload_date, document_id = json.loads(base64.urlsafe_b64decode(page_token + "=" * (-len(page_token) % 4)))
+        return datetime.fromisoformat(upload_date), str(document_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid page token")
+
+
+def listing_query(query: Dict, page_token: Optional[str] = None) -> Dict:
+    """
+    Add the keyset condition for page_token: strictly after its position in LISTING_SORT
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    if not page_token:
+        return query
+    upload_date, document_id = decode_page_token(page_token)
+    try:
+        object_id = ObjectId(document_id)
+    except InvalidId:
+        raise ValueError("Invalid page token")
+    # The top-level range bounds the index scan; the $or only filters the tie at its start
+    return {
+        **query,
+        "upload_date": {"$lte": upload_date},
+        "$or": [
+            {"upload_date": {"$lt": upload_date}},
+            {"_id": {"$lt": object_id}}
+        ]
+    }
+
+
+def listing_page(certificates: List[Dict], limit: int) -> Dict:
+    """
+    Shape a listing response from up to limit + 1 certificates (the extra one only signals a next page)
+    """
+    next_page_token = encode_page_token(certificates[limit - 1]) if len(certificates) > limit else None
+    certificates = [serialize_certificate(cert) for cert in certificates[:limit]]
+    return {
+        "certificates": certificates,
+        "count": len(certificates),
+        "next_page_token": next_page_token
+    }
+
+
+def page_limit(limit: int) -> int:
+    return max(1, min(limit, CERTIFICATE_PAGE_MAX))
+
+
+def listing_request(query: Dict, limit: int, page_token: Optional[str] = None,
+                    fields: Optional[List[str]] = None) -> Tuple[Dict, Dict, int]:
+    """
+    (query, projection, page size) for one keyset listing page: the caller
+    reads page size + 1 certificates in LISTING_SORT for listing_page
+
+    Raises:
+        ValueError: For an invalid page token or an unknown field
+    """
+    return listing_query(query, page_token), listing_projection(fields), page_limit(limit)
+
+
+def listing_error(error: Exception) -> Dict:
+    """
+    Empty listing response for a failed page read
+    """
+    print(f"Error retrieving certificates: {error}")
+    return {"certificates": [], "count": 0, "next_page_token": None, "error": f"Database error: {str(error)}"}
+
+
+def plan_stages(explain: Dict) -> List[Dict]:
+    """
+    Stages of the winning plan(s) in explain output, as {'stage', 'index'} (index is None for non-scans)
+    """
+    stages = []
+
+    def walk(node, in_winning_plan: bool):
+        if isinstance(node, list):
+            for item in node:
+                walk(item, in_winning_plan)
+        elif isinstance(node, dict):
+            if in_winning_plan and "stage" in node:
+                stages.append({"stage": node["stage"], "index": node.get("indexName")})
+            for key, value in node.items():
+                if key != "rejectedPlans":
+                    walk(value, in_winning_plan or key == "winningPlan")
+
+    walk(explain, False)
+    return stages
+
+
+# Plan stages that mean a query shape is missing an index: reading every
+# document, or reading matches and then sorting them in memory
+UNINDEXED_STAGES = ("COLLSCAN", "SORT")
+
+
+def count_attempts(hash_values: List[str], found: Dict) -> Dict[str, int]:
+    """
+    Verification attempts per found hash (duplicates in a request count separately)
+    """
+    attempts = {}
+    for hash_value in hash_values:
+        if hash_value in found:
+            attempts[hash_value] = attempts.get(hash_value, 0) + 1
+    return attempts
+
+
+def verify_query(candidates: Set[str], misses: Set[str], unseen: Optional[Dict]) -> Optional[Dict]:
+    """
+    One query for a bulk-verify chunk: the hashes that passed the filter, plus the
+    filter misses among documents it may not have seen (see HashFilter.unseen_query)
+    """
+    clauses = []
+    if candidates:
+        clauses.append({"hash": {"$in": list(candidates)}})
+    if misses and unseen is not None:
+        clauses.append({"hash": {"$in": list(misses)}, **unseen})
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$or": clauses}
+
+
+class VerifyPolicy:
+    """
+    Per-call decisions of a verification, shared by the sync and async MongoDB
+    clients so that each keeps only its queries: when the hash filter answers a
+    miss, when a miss is rechecked, what the lookup cache serves, and whether an
+    attempt is buffered or counted by the lookup itself
+    
+    Built per call from the client's current components (any of them may be None).
+    """
+    
+    def __init__(self, hash_filter: Optional[HashFilter], lookup_cache: Optional[LookupCache],
+                 attempt_counter: Optional[AttemptCounter]):
+        self.hash_filter = hash_filter
+        self.lookup_cache = lookup_cache
+        self.attempt_counter = attempt_counter
+    
+    @property
+    def buffers_attempts(self) -> bool:
+        """
+        True if attempts go to the counter and a lookup is a plain read;
+        False if the lookup counts the attempt itself (find_one_and_update)
+        """
+        return self.attempt_counter is not None
+    
+    def filtered(self, hash_value: str) -> bool:
+        """
+        True if the hash filter rules the hash out
+        """
+        return bool(self.hash_filter) and not self.hash_filter.might_contain(hash_value)
+    
+    def recheck_query(self, hash_value: str) -> Optional[Dict]:
+        """
+        Query for a filtered hash among documents the filter may not have seen,
+        or None to answer 'not found' without a lookup (see HashFilter.unseen_query)
+        """
+        unseen = self.hash_filter.unseen_query()
+        return None if unseen is None else {"hash": hash_value, **unseen}
+    
+    def found_unseen(self, hash_value: str):
+        self.hash_filter.record_unseen(hash_value)
+    
+    def cached(self, hash_value: str) -> Optional[Dict]:
+        return self.lookup_cache.get('verify', hash_value) if self.lookup_cache else None
+    
+    def buffer_attempt(self, hash_value: str, count: int = 1) -> bool:
+        """
+        Count attempts in the counter
+        
+        Returns:
+            False if there is no counter and the caller must write the increment
+        """
+        if not self.attempt_counter:
+            return False
+        self.attempt_counter.add(hash_value, count)
+        return True
+    
+    def settle(self, hash_value: str, certificate: Optional[Dict]) -> Dict:
+        """
+        Cache a found certificate or record a filter false positive for a missing
+        one, and shape the verification result
+        """
+        if certificate and self.lookup_cache:
+            self.lookup_cache.put('verify', hash_value, certificate)
+        if not certificate and self.hash_filter and self.hash_filter.ready:
+            self.hash_filter.record_false_positive()
+        return verification_result(hash_value, certificate)
+    
+    def plan_chunk(self, chunk: List[str]) -> Tuple[Set[str], Set[str], Optional[Dict]]:
+        """
+        Split a bulk-verify chunk into the hashes that passed the filter and the
+        filter misses, with the one query covering both (see verify_query)
+        """
+        candidates = {hash_value for hash_value in chunk if not self.filtered(hash_value)}
+        misses = set(chunk) - candidates
+        unseen = self.hash_filter.unseen_query() if misses else None
+        return candidates, misses, verify_query(candidates, misses, unseen)
+    
+    def settle_chunk(self, chunk: List[str], candidates: Set[str], misses: Set[str],
+                     found: Dict[str, Dict]) -> Dict[str, int]:
+        """
+        Record a chunk's rechecked finds, false positives and buffered attempts
+        
+        Returns:
+            Attempts per found hash left for the caller to write (empty when buffered)
+        """
+        for hash_value in misses & found.keys():
+            self.found_unseen(hash_value)
+        if self.hash_filter and self.hash_filter.ready:
+            for _ in candidates - found.keys():
+                self.hash_filter.record_false_positive()
+        
+        # Duplicate hashes in the request count as separate attempts
+        attempts = count_attempts(chunk, found)
+        if self.attempt_counter:
+            for hash_value, count in attempts.items():
+                self.attempt_counter.add(hash_value, count)
+            return {}
+        return attempts
+
+
+def stats_pipeline() -> List[Dict]:
+    """
+    Certificate counts per status, with today's uploads, in one aggregation
+
+    Run with hint=STATUS_LISTING_INDEX the pass reads only index keys, never documents.
+    """
+    start_of_today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    return [
+        {"$project": {"_id": 0, "status": 1, "upload_date": 1}},
+        {"$group": {
+            "_id": "$status",
+            "count": {"$sum": 1},
+            "today": {"$sum": {"$cond": [{"$gte": ["$upload_date", start_of_today]}, 1, 0]}}
+        }}
+    ]
+
+
+def stats_result(status_groups: List[Dict], total_users: int) -> Dict:
+    """
+    Shape the database statistics response from the stats_pipeline() output
+    """
+    counts = {group["_id"]: group["count"] for group in status_groups}
+    total_certificates = sum(counts.values())
+    verified_certificates = counts.get("verified", 0)
+    return {
+        "total_certificates": total_certificates,
+        "verified_certificates": verified_certificates,
+        "pending_certificates": counts.get("pending", 0),
+        "total_users": total_users,
+        "recent_certificates_today": sum(group["today"] for group in status_groups),
+        "verification_rate": round((verified_certificates / total_certificates * 100), 2) if total_certificates > 0 else 0,
+        "generated_at": datetime.utcnow().isoformat()
+    }
+
+
+class StatsCache:
+    """
+    The last get_database_stats result, kept for ADMIN_STATS_CACHE_SECONDS
+    """
+    
+    def __init__(self, seconds: float = ADMIN_STATS_CACHE_SECONDS):
+        self.seconds = seconds
+        # (stats, monotonic expiry)
+        self._entry = None
+    
+    def get(self) -> Optional[Dict]:
+        entry = self._entry
+        if entry and entry[1] > time.monotonic():
+            return entry[0]
+        return None
+    
+    def put(self, stats: Dict) -> Dict:
+        self._entry = (stats, time.monotonic() + self.seconds)
+        return stats
+
+
+class CertificateStore(ABC):
+    """
+    Storage backend interface: every backend stores and answers lookups with
+    the documents and response shapes of the helpers above
+
+    Optional accelerators (hash filter, lookup cache, write-behind attempt
+    counter) are None when a backend does not use them.
+    """
+    database_name: str = None
+    hash_filter: Optional[HashFilter] = None
+    lookup_cache: Optional[LookupCache] = None
+    attempt_counter: Optional[AttemptCounter] = None
+    
+    @abstractmethod
+    def store_certificate(self, certificate_data: Dict) -> Dict:
+        """Store one processed certificate (see certificate_document)"""
+    
+    @abstractmethod
+    def insert_certificates(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Insert prepared documents, continuing past failures
+        
+        Returns:
+            One {'index', 'duplicate', 'error'} entry per document that was not inserted
+        """
+    
+    @abstractmethod
+    def verify_certificate_by_hash(self, hash_value: str) -> Dict:
+        """Look up a hash and count the attempt (see verification_result)"""
+    
+    @abstractmethod
+    def verify_certificates_by_hashes(self, hash_values: List[str], chunk_size: int = None) -> Iterator[List[Dict]]:
+        """Verify many hashes, yielding results chunk by chunk in input order"""
+    
+    @abstractmethod
+    def search_certificate_by_id(self, certificate_id: str) -> Dict:
+        """Look up a certificate by ID (see search_result)"""
+    
+    @abstractmethod
+    def iter_hashes(self) -> Iterator[str]:
+        """Every stored hash, in ascending order, streamed from the hash index"""
+    
+    @abstractmethod
+    def get_certificates_by_user(self, user_id: str, limit: int = 50, page_token: str = None,
+                                 fields: List[str] = None) -> Dict:
+        """One listing page of a user's certificates (see listing_page)"""
+    
+    @abstractmethod
+    def get_all_certificates(self, limit: int = 100, status: str = None, page_token: str = None,
+                             fields: List[str] = None) -> Dict:
+        """One listing page of all certificates (see listing_page)"""
+    
+    @abstractmethod
+    def update_certificate_status(self, hash_value: str, status: str) -> Dict:
+        """Set a certificate's status"""
+    
+    @abstractmethod
+    def store_user(self, user_data: Dict) -> Dict:
+        """Store one user (see user_document)"""
+    
+    @abstractmethod
+    def get_database_stats(self) -> Dict:
+        """Certificate and user counts (see stats_result)"""
+    
+    @abstractmethod
+    def check_query_plans(self) -> List[Dict]:
+        """Report per query shape whether it is served by an index: {'shape', 'stages', 'indexes', 'ok'}"""
+    
+    @abstractmethod
+    def close_connection(self):
+        """Flush buffered writes and release the connection"""
+    
+    def load_hash_filter(self):
+        """
+        Build the hash filter (no-op for backends without one)
+        """
+    
+    def refresh_hash_filter(self):
+        """
+        Catch the hash filter up with other writers (no-op for backends without one)
+        """
+    
+    def get_hash_filter_stats(self) -> Dict:
+        """
+        Hash filter size, memory use and false-positive rates
+        """
+        if not self.hash_filter:
+            return {"enabled": False}
+        return self.hash_filter.info()
+    
+    def get_lookup_cache_stats(self) -> Dict:
+        """
+        Verify and search cache hit ratios
+        """
+        if not self.lookup_cache:
+            return {"enabled": False}
+        return self.lookup_cache.stats()
+    
+    def get_attempt_counter_stats(self) -> Dict:
+        """
+        Buffered verification attempts and flush counts
+        """
+        if not self.attempt_counter:
+            return {"enabled": False}
+        return {"enabled": True, **self.attempt_counter.info()}
+
+
+class CertificateDatabase(CertificateStore):
+    def __init__(self, connection_string: str = None, database_name: str = None):
         """
         Initialize MongoDB connection
         """
@@ -20,16 +650,30 @@ class CertificateDatabase:
             'MONGODB_URI', 
             'mongodb://localhost:27017/'
         )
-        self.database_name = 'certificate_validator'
+        self.database_name = database_name or os.getenv('MONGODB_DATABASE', 'certificate_validator')
         self.certificates_collection = 'certificates'
         self.users_collection = 'users'
         
+        # Bloom filter over stored hashes, built by load_hash_filter() (HASH_FILTER=off disables)
+        self.hash_filter = HashFilter() if os.getenv('HASH_FILTER', 'on').lower() != 'off' else None
+        
+        # Last get_database_stats result
+        self._stats_cache = StatsCache()
+        
         try:
-            self.client = MongoClient(self.connection_string)
+            self.client = MongoClient(self.connection_string, **client_options())
             self.db = self.client[self.database_name]
             self.certificates = self.db[self.certificates_collection]
             self.users = self.db[self.users_collection]
             
+            # Recently found certificates, by hash and by certificate ID (LOOKUP_CACHE=off disables)
+            self.lookup_cache = LookupCache() if os.getenv('LOOKUP_CACHE', 'on').lower() != 'off' else None
+            
+            # Write-behind verification_attempts increments (ATTEMPT_BUFFER=off writes each one)
+            self.attempt_counter = (
+                AttemptCounter(self.certificates) if os.getenv('ATTEMPT_BUFFER', 'on').lower() != 'off' else None
+            )
+            
             # Create indexes for better performance
             self._create_indexes()
             print("Connected to MongoDB successfully!")
@@ -42,16 +686,10 @@ class CertificateDatabase:
         """
         Create database indexes for optimal performance
         """
-        # Certificate collection indexes
-        self.certificates.create_index([("hash", ASCENDING)], unique=True)
-        self.certificates.create_index([("certificate_id", ASCENDING)])
-        self.certificates.create_index([("roll_no", ASCENDING)])
-        self.certificates.create_index([("upload_date", DESCENDING)])
-        self.certificates.create_index([("status", ASCENDING)])
-        
-        # Users collection indexes
-        self.users.create_index([("email", ASCENDING)], unique=True)
-        self.users.create_index([("user_id", ASCENDING)], unique=True)
+        for keys, options in CERTIFICATE_INDEXES:
+            self.certificates.create_index(keys, **options)
+        for keys, options in USER_INDEXES:
+            self.users.create_index(keys, **options)
     
     def store_certificate(self, certificate_data: Dict) -> Dict:
         """
@@ -65,33 +703,12 @@ class CertificateDatabase:
         """
         try:
             # Prepare document for storage
-            document = {
-                "certificate_id": certificate_data.get("certificate_id"),
-                "hash": certificate_data.get("hash"),
-                "extracted_data": {
-                    "name": certificate_data.get("name"),
-                    "roll_no": certificate_data.get("roll_no"),
-                    "certificate_id": certificate_data.get("certificate_id"),
-                    "marks": certificate_data.get("marks"),
-                    "institution": certificate_data.get("institution")
-                },
-                "processing_info": certificate_data.get("processing_info", {}),
-                "confidence": certificate_data.get("confidence", 0),
-                "filename": certificate_data.get("filename"),
-                "file_size": certificate_data.get("file_size"),
-                "upload_date": datetime.utcnow(),
-                "uploaded_by": certificate_data.get("uploaded_by"),
-                "status": "verified" if certificate_data.get("confidence", 0) > 80 else "pending",
-                "verification_attempts": 0,
-                "metadata": {
-                    "ocr_version": "1.0.0",
-                    "processing_time": certificate_data.get("processing_time"),
-                    "file_type": certificate_data.get("file_type")
-                }
-            }
+            document = certificate_document(certificate_data)
             
             # Insert document
             result = self.certificates.insert_one(document)
+            if self.hash_filter:
+                self.hash_filter.add(document["hash"])
             
             return {
                 "success": True,
@@ -112,6 +729,35 @@ class CertificateDatabase:
                 "error": f"Database error: {str(e)}"
             }
     
+    def insert_certificates(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Insert prepared certificate documents with one unordered insert_many
+        
+        Args:
+            documents: Documents built by certificate_document
+            
+        Returns:
+            One {'index', 'duplicate', 'error'} entry per document that was not inserted
+        """
+        rejected = []
+        if documents:
+            try:
+                self.certificates.insert_many(documents, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every other document was still written
+                rejected = [
+                    {"index": error["index"], "duplicate": error["code"] == DUPLICATE_KEY_ERROR,
+                     "error": error.get("errmsg")}
+                    for error in e.details["writeErrors"]
+                ]
+        
+        if self.hash_filter:
+            skipped = {entry["index"] for entry in rejected}
+            for index, document in enumerate(documents):
+                if index not in skipped:
+                    self.hash_filter.add(document["hash"])
+        return rejected
+    
     def verify_certificate_by_hash(self, hash_value: str) -> Dict:
         """
         Verify certificate by its SHA-256 hash
@@ -122,43 +768,92 @@ class CertificateDatabase:
         Returns:
             Dictionary with verification result
         """
+        policy = VerifyPolicy(self.hash_filter, self.lookup_cache, self.attempt_counter)
         try:
-            certificate = self.certificates.find_one({"hash": hash_value})
+            # Forged and mistyped hashes are answered without a lookup; unless this
+            # process is the only writer, a miss is rechecked against recent documents
+            if policy.filtered(hash_value):
+                recheck = policy.recheck_query(hash_value)
+                if recheck is None or not self.certificates.find_one(recheck, {"_id": 1}):
+                    return verification_result(hash_value, None)
+                policy.found_unseen(hash_value)
             
+            certificate = policy.cached(hash_value)
             if certificate:
-                # Update verification attempts
-                self.certificates.update_one(
+                # Served from the cache; the attempt is still counted
+                if not policy.buffer_attempt(hash_value):
+                    self.certificates.update_one({"hash": hash_value}, {"$inc": {"verification_attempts": 1}})
+                return verification_result(hash_value, certificate)
+            
+            if policy.buffers_attempts:
+                # A read only; the attempt reaches the document at the next counter flush
+                certificate = self.certificates.find_one({"hash": hash_value}, VERIFY_PROJECTION)
+                if certificate:
+                    policy.buffer_attempt(hash_value)
+            else:
+                # Look up and count the attempt atomically in one round trip,
+                # returning only the fields used below
+                certificate = self.certificates.find_one_and_update(
                     {"hash": hash_value},
-                    {"$inc": {"verification_attempts": 1}}
+                    {"$inc": {"verification_attempts": 1}},
+                    projection=VERIFY_PROJECTION,
+                    return_document=ReturnDocument.BEFORE
                 )
-                
-                return {
-                    "verified": True,
-                    "certificate_data": {
-                        "name": certificate["extracted_data"]["name"],
-                        "roll_no": certificate["extracted_data"]["roll_no"],
-                        "certificate_id": certificate["extracted_data"]["certificate_id"],
-                        "marks": certificate["extracted_data"]["marks"],
-                        "institution": certificate["extracted_data"]["institution"],
-                        "upload_date": certificate["upload_date"].isoformat(),
-                        "confidence": certificate["confidence"],
-                        "status": certificate["status"]
-                    },
-                    "hash": hash_value
-                }
-            else:
-                return {
-                    "verified": False,
-                    "hash": hash_value,
-                    "message": "Certificate not found in database"
-                }
-                
+            return policy.settle(hash_value, certificate)
+            
         except Exception as e:
             return {
                 "verified": False,
                 "error": f"Database error: {str(e)}"
             }
     
+    def verify_certificates_by_hashes(self, hash_values: List[str], chunk_size: int = None) -> Iterator[List[Dict]]:
+        """
+        Verify many hashes, one chunk at a time
+        
+        Each chunk costs one $in query for the hashes the filter cannot rule out;
+        their attempt counters go to the attempt counter (or, with ATTEMPT_BUFFER=off,
+        one unordered bulk_write per chunk).
+        
+        Args:
+            hash_values: Hashes to verify (duplicates are allowed)
+            chunk_size: Hashes per query (BULK_VERIFY_CHUNK_SIZE)
+            
+        Yields:
+            Lists of results, in input order, shaped like verify_certificate_by_hash
+        """
+        chunk_size = chunk_size or int(os.getenv('BULK_VERIFY_CHUNK_SIZE', 1000))
+        policy = VerifyPolicy(self.hash_filter, self.lookup_cache, self.attempt_counter)
+        
+        for start in range(0, len(hash_values), chunk_size):
+            chunk = hash_values[start:start + chunk_size]
+            candidates, misses, query = policy.plan_chunk(chunk)
+            
+            try:
+                found = {}
+                if query:
+                    for certificate in self.certificates.find(query, {**VERIFY_PROJECTION, "hash": 1}):
+                        found[certificate["hash"]] = certificate
+                
+                attempts = policy.settle_chunk(chunk, candidates, misses, found)
+                if attempts:
+                    try:
+                        self.certificates.bulk_write([
+                            UpdateOne({"hash": hash_value}, {"$inc": {"verification_attempts": count}})
+                            for hash_value, count in attempts.items()
+                        ], ordered=False)
+                    except Exception as e:
+                        # The lookups succeeded; a lost counter update should not fail them
+                        print(f"Error updating verification attempts: {e}")
+                
+                yield [verification_result(hash_value, found.get(hash_value)) for hash_value in chunk]
+                
+            except Exception as e:
+                yield [
+                    {"verified": False, "hash": hash_value, "error": f"Database error: {str(e)}"}
+                    for hash_value in chunk
+                ]
+    
     def search_certificate_by_id(self, certificate_id: str) -> Dict:
         """
         Search for certificate by certificate ID
@@ -170,29 +865,12 @@ class CertificateDatabase:
             Dictionary with search result
         """
         try:
-            certificate = self.certificates.find_one({"certificate_id": certificate_id})
-            
-            if certificate:
-                return {
-                    "found": True,
-                    "certificate_data": {
-                        "name": certificate["extracted_data"]["name"],
-                        "roll_no": certificate["extracted_data"]["roll_no"],
-                        "certificate_id": certificate["extracted_data"]["certificate_id"],
-                        "marks": certificate["extracted_data"]["marks"],
-                        "institution": certificate["extracted_data"]["institution"],
-                        "upload_date": certificate["upload_date"].isoformat(),
-                        "confidence": certificate["confidence"],
-                        "status": certificate["status"],
-                        "hash": certificate["hash"]
-                    }
-                }
-            else:
-                return {
-                    "found": False,
-                    "certificate_id": certificate_id,
-                    "message": "Certificate ID not found"
-                }
+            certificate = self.lookup_cache.get('search', certificate_id) if self.lookup_cache else None
+            if certificate is None:
+                certificate = self.certificates.find_one({"certificate_id": certificate_id}, SEARCH_PROJECTION)
+                if certificate and self.lookup_cache:
+                    self.lookup_cache.put('search', certificate_id, certificate)
+            return search_result(certificate_id, certificate)
                 
         except Exception as e:
             return {
@@ -200,67 +878,73 @@ class CertificateDatabase:
                 "error": f"Database error: {str(e)}"
             }
     
-    def get_certificates_by_user(self, user_id: str, limit: int = 50) -> List[Dict]:
+    def iter_hashes(self) -> Iterator[str]:
         """
-        Get certificates uploaded by a specific user
+        Every stored hash in ascending order, read from the unique hash index in large batches
+        (for hash_snapshot.export_snapshot)
+        """
+        for document in self.certificates.find({}, {"_id": 0, "hash": 1}, batch_size=10000).sort("hash", ASCENDING):
+            if document.get("hash"):
+                yield document["hash"]
+    
+    def get_certificates_by_user(self, user_id: str, limit: int = 50, page_token: str = None,
+                                 fields: List[str] = None) -> Dict:
+        """
+        Get one page of certificates uploaded by a specific user, newest first
         
         Args:
             user_id: User ID
-            limit: Maximum number of certificates to return
+            limit: Certificates per page (at most CERTIFICATE_PAGE_MAX)
+            page_token: next_page_token from the previous page
+            fields: Fields to return (LISTING_FIELDS by default)
             
         Returns:
-            List of certificate documents
-        """
-        try:
-            certificates = list(
-                self.certificates.find({"uploaded_by": user_id})
-                .sort("upload_date", DESCENDING)
-                .limit(limit)
-            )
-            
-            # Convert ObjectId to string and format dates
-            for cert in certificates:
-                cert["_id"] = str(cert["_id"])
-                cert["upload_date"] = cert["upload_date"].isoformat()
+            Dictionary with the certificates, their count and next_page_token (None on the last page)
             
-            return certificates
-            
-        except Exception as e:
-            print(f"Error retrieving certificates: {e}")
-            return []
+        Raises:
+            ValueError: For an invalid page token or an unknown field
+        """
+        return self._listing_page({"uploaded_by": user_id}, limit, page_token, fields)
     
-    def get_all_certificates(self, limit: int = 100, status: str = None) -> List[Dict]:
+    def get_all_certificates(self, limit: int = 100, status: str = None, page_token: str = None,
+                             fields: List[str] = None) -> Dict:
         """
-        Get all certificates (admin function)
+        Get one page of all certificates, newest first (admin function)
         
         Args:
-            limit: Maximum number of certificates to return
+            limit: Certificates per page (at most CERTIFICATE_PAGE_MAX)
             status: Filter by status (optional)
+            page_token: next_page_token from the previous page
+            fields: Fields to return (LISTING_FIELDS by default)
             
         Returns:
-            List of certificate documents
+            Dictionary with the certificates, their count and next_page_token (None on the last page)
+            
+        Raises:
+            ValueError: For an invalid page token or an unknown field
         """
+        query = {}
+        if status:
+            query["status"] = status
+        return self._listing_page(query, limit, page_token, fields)
+    
+    def _listing_page(self, query: Dict, limit: int, page_token: Optional[str], fields: Optional[List[str]]) -> Dict:
+        """
+        Keyset pagination on (upload_date, _id): each page is an index range scan
+        that starts where the previous one ended, however deep the caller pages
+        """
+        query, projection, limit = listing_request(query, limit, page_token, fields)
+        
         try:
-            query = {}
-            if status:
-                query["status"] = status
-            
             certificates = list(
-                self.certificates.find(query)
-                .sort("upload_date", DESCENDING)
-                .limit(limit)
+                self.certificates.find(query, projection)
+                .sort(LISTING_SORT)
+                .limit(limit + 1)
             )
-            
-            # Convert ObjectId to string and format dates
-            for cert in certificates:
-                cert["_id"] = str(cert["_id"])
-                cert["upload_date"] = cert["upload_date"].isoformat()
-            
-            return certificates
+            return listing_page(certificates, limit)
             
         except Exception as e:
-            print(f"Error retrieving certificates: {e}")
-            return []
+            return listing_error(e)
     
     def update_certificate_status(self, hash_value: str, status: str) -> Dict:
         """
@@ -274,17 +958,22 @@ class CertificateDatabase:
             Dictionary with update result
         """
         try:
-            result = self.certificates.update_one(
+            # Returns the certificate_id, so its search entry can be dropped from the cache too
+            certificate = self.certificates.find_one_and_update(
                 {"hash": hash_value},
                 {
                     "$set": {
                         "status": status,
                         "last_updated": datetime.utcnow()
                     }
-                }
+                },
+                projection={"_id": 0, "certificate_id": 1}
             )
             
-            if result.modified_count > 0:
+            if certificate is not None:
+                if self.lookup_cache:
+                    self.lookup_cache.invalidate('verify', hash_value)
+                    self.lookup_cache.invalidate('search', certificate.get("certificate_id"))
                 return {
                     "success": True,
                     "message": "Certificate status updated"
@@ -312,16 +1001,7 @@ class CertificateDatabase:
             Dictionary with storage result
         """
         try:
-            document = {
-                "user_id": user_data.get("user_id"),
-                "email": user_data.get("email"),
-                "name": user_data.get("name"),
-                "role": user_data.get("role", "verifier"),
-                "created_date": datetime.utcnow(),
-                "last_login": datetime.utcnow(),
-                "is_active": True,
-                "verification_count": 0
-            }
+            document = user_document(user_data)
             
             result = self.users.insert_one(document)
             
@@ -344,43 +1024,126 @@ class CertificateDatabase:
     
     def get_database_stats(self) -> Dict:
         """
-        Get database statistics
+        Get database statistics from one aggregation, cached for ADMIN_STATS_CACHE_SECONDS
         
         Returns:
             Dictionary with database statistics
         """
+        cached = self._stats_cache.get()
+        if cached:
+            return cached
+        
         try:
-            total_certificates = self.certificates.count_documents({})
-            verified_certificates = self.certificates.count_documents({"status": "verified"})
-            pending_certificates = self.certificates.count_documents({"status": "pending"})
+            status_groups = list(self.certificates.aggregate(stats_pipeline(), hint=STATUS_LISTING_INDEX))
             total_users = self.users.count_documents({})
             
-            # Get recent activity
-            recent_certificates = self.certificates.count_documents({
-                "upload_date": {"$gte": datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)}
-            })
-            
-            return {
-                "total_certificates": total_certificates,
-                "verified_certificates": verified_certificates,
-                "pending_certificates": pending_certificates,
-                "total_users": total_users,
-                "recent_certificates_today": recent_certificates,
-                "verification_rate": round((verified_certificates / total_certificates * 100), 2) if total_certificates > 0 else 0
-            }
+            return self._stats_cache.put(stats_result(status_groups, total_users))
             
         except Exception as e:
             return {
                 "error": f"Database error: {str(e)}"
             }
     
+    def query_shapes(self) -> List[Tuple[str, Dict]]:
+        """
+        Explain output for every query shape this class issues, with placeholder values
+        """
+        sample_hash = "0" * 64
+        sample_token = encode_page_token({"upload_date": datetime.utcnow(), "_id": ObjectId()})
+        
+        def listing(query: Dict, page_token: str = None):
+            return self.certificates.find(listing_query(query, page_token), listing_projection()).sort(LISTING_SORT).limit(101)
+        
+        shapes = [
+            # verify_certificate_by_hash, update_certificate_status and the attempt counter filter the same way
+            ("verify by hash", self.certificates.find({"hash": sample_hash}, VERIFY_PROJECTION)),
+            ("bulk verify", self.certificates.find({"hash": {"$in": [sample_hash, "f" * 64]}}, {**VERIFY_PROJECTION, "hash": 1})),
+            ("search by certificate_id", self.certificates.find({"certificate_id": "CERT-2024-001"}, SEARCH_PROJECTION)),
+            ("all certificates", listing({})),
+            ("all certificates, next page", listing({}, sample_token)),
+            ("certificates by status", listing({"status": "verified"})),
+            ("certificates by status, next page", listing({"status": "verified"}, sample_token)),
+            ("certificates by user", listing({"uploaded_by": "admin"})),
+            ("certificates by user, next page", listing({"uploaded_by": "admin"}, sample_token)),
+            ("hash snapshot export", self.certificates.find({}, {"_id": 0, "hash": 1}).sort("hash", ASCENDING)),
+            ("hash filter catch-up", self.certificates.find(
+                {"upload_date": {"$gte": datetime.utcnow()}}, {"_id": 0, "hash": 1, "upload_date": 1}
+            ))
+        ]
+        explained = [(name, cursor.explain()) for name, cursor in shapes]
+        explained.append(("admin stats", self.db.command(
+            "aggregate", self.certificates_collection, pipeline=stats_pipeline(),
+            hint=STATUS_LISTING_INDEX, explain=True
+        )))
+        return explained
+    
+    def check_query_plans(self) -> List[Dict]:
+        """
+        Explain every query shape and flag those whose plan scans the collection or sorts in memory
+        
+        Returns:
+            One report per shape: {'shape', 'stages', 'indexes', 'ok'}
+        """
+        reports = []
+        for name, explain in self.query_shapes():
+            stages = plan_stages(explain)
+            reports.append({
+                "shape": name,
+                "stages": [stage["stage"] for stage in stages],
+                "indexes": sorted({stage["index"] for stage in stages if stage["index"]}),
+                "ok": bool(stages) and not any(stage["stage"] in UNINDEXED_STAGES for stage in stages)
+            })
+        return reports
+    
+    def load_hash_filter(self):
+        """
+        Load the persisted hash filter and catch it up, or build it with a streamed scan
+        """
+        if not self.hash_filter:
+            return
+        self.hash_filter.build(self.certificates, self.database_name)
+        self.hash_filter.save(self.database_name)
+    
+    def refresh_hash_filter(self):
+        """
+        Add hashes stored by other processes since the last refresh and persist the filter
+        """
+        if not self.hash_filter or not self.hash_filter.ready:
+            return
+        self.hash_filter.catch_up(self.certificates)
+        self.hash_filter.save(self.database_name)
+    
     def close_connection(self):
         """
         Close database connection
         """
         if hasattr(self, 'client'):
+            # Buffered verification attempts are written before the client goes away
+            if self.attempt_counter:
+                self.attempt_counter.close()
             self.client.close()
             print("Database connection closed")
 
-# Initialize database instance
-db = CertificateDatabase()
+
+DATABASE_BACKENDS = ('mongo', 'sqlite')
+
+
+def create_database(backend: str = None, **kwargs) -> CertificateStore:
+    """
+    Open the configured storage backend
+
+    Args:
+        backend: 'mongo' (MongoDB, the default) or 'sqlite' (embedded, SQLITE_PATH);
+                 DATABASE_BACKEND when None
+        **kwargs: Passed to the backend's constructor
+
+    Raises:
+        ValueError: For an unknown backend
+    """
+    backend = (backend or os.getenv('DATABASE_BACKEND', 'mongo')).lower()
+    if backend == 'mongo':
+        return CertificateDatabase(**kwargs)
+    if backend == 'sqlite':
+        from sqlite_database import SQLiteCertificateDatabase
+        return SQLiteCertificateDatabase(**kwargs)
+    raise ValueError(f"Unknown DATABASE_BACKEND {backend!r}; expected one of {', '.join(DATABASE_BACKENDS)}")
@@ -3,7 +3,8 @@ Database setup and initialization script
 Creates collections, indexes, and sample data
 """
 
-from database import CertificateDatabase
+from database import CertificateStore, create_database
+from field_extraction import canonical_hash
 from datetime import datetime, timedelta
 import hashlib
 import json
@@ -16,7 +17,7 @@ def setup_database():
     
     try:
         # Initialize database
-        db = CertificateDatabase()
+        db = create_database()
         
         # Create sample certificates
         sample_certificates = [
@@ -79,15 +80,7 @@ def setup_database():
         # Generate hashes and store certificates
         for cert_data in sample_certificates:
             # Generate hash
-            normalized_data = {
-                'name': cert_data['name'].strip().upper(),
-                'roll_no': cert_data['roll_no'].strip().upper(),
-                'certificate_id': cert_data['certificate_id'].strip().upper(),
-                'marks': cert_data['marks'].strip(),
-                'institution': cert_data['institution'].strip().upper()
-            }
-            json_string = json.dumps(normalized_data, sort_keys=True)
-            cert_data['hash'] = hashlib.sha256(json_string.encode()).hexdigest()
+            cert_data['hash'] = canonical_hash(cert_data)
             
             # Store in database
             result = db.store_certificate(cert_data)
@@ -145,10 +138,44 @@ def setup_database():
         else:
             print("✗ Verification test failed")
         
+        if not check_indexes(db):
+            print("✗ Some query shapes are not served by an index")
+        
         db.close_connection()
         
     except Exception as e:
         print(f"❌ Database setup failed: {e}")
 
+def check_indexes(db: CertificateStore = None) -> bool:
+    """
+    Explain every query shape the database backend issues; False if any scans the collection or sorts in memory
+    """
+    own_connection = db is None
+    db = db or create_database()
+    
+    print("\n🔎 Checking query plans...")
+    reports = db.check_query_plans()
+    for report in reports:
+        plan = " > ".join(report['stages'])
+        indexes = ", ".join(report['indexes']) or "no index"
+        if report['ok']:
+            print(f"✓ {report['shape']}: {plan} ({indexes})")
+        else:
+            print(f"✗ {report['shape']}: {plan} ({indexes})")
+    
+    if own_connection:
+        db.close_connection()
+    return all(report['ok'] for report in reports)
+
 if __name__ == "__main__":
+    import argparse
+    import sys
+    
+    parser = argparse.ArgumentParser(description="Set up the certificate database")
+    parser.add_argument('--check-indexes', action='store_true',
+                        help="Only check that every query shape is served by an index")
+    args = parser.parse_args()
+    
+    if args.check_indexes:
+        sys.exit(0 if check_indexes() else 1)
     setup_database()
@@ -0,0 +1,213 @@
+"""
+Field Extraction Engine for Certificate OCR Text
+Precompiled, single-pass regex extraction of certificate fields with match spans
+"""
+
+import re
+import hashlib
+import json
+from typing import Dict, List, Optional
+
+# Patterns for different fields, in priority order per field. The first pattern
+# (by priority) that matches anywhere wins, and its leftmost match is used.
+FIELD_PATTERNS = {
+    'name': [
+        r'(?:name|student|candidate)[\s:]+([A-Za-z\s]{2,50})',
+        r'(?:this is to certify that)[\s]+([A-Za-z\s]{2,50})',
+        r'(?:mr\.|ms\.|miss)[\s]+([A-Za-z\s]{2,50})'
+    ],
+    'roll_no': [
+        r'(?:roll|reg|registration|student)[\s]*(?:no|number|id)[\s:]*([A-Z0-9]{4,20})',
+        r'(?:roll|reg)[\s]*:[\s]*([A-Z0-9]{4,20})',
+        r'([A-Z]{2}[0-9]{4,8})'
+    ],
+    'certificate_id': [
+        r'(?:certificate|cert)[\s]*(?:no|number|id)[\s:]*([A-Z0-9-]{4,30})',
+        r'(?:serial|ref)[\s]*(?:no|number)[\s:]*([A-Z0-9-]{4,30})',
+        r'(CERT-[A-Z0-9-]{4,20})'
+    ],
+    'marks': [
+        r'(?:marks|grade|score|percentage)[\s:]*([0-9]{1,3}\.?[0-9]*%?)',
+        r'(?:secured|obtained)[\s]*([0-9]{1,3}\.?[0-9]*%?)',
+        r'([0-9]{1,3}\.?[0-9]*%)'
+    ],
+    'institution': [
+        r'(?:university|college|institute|school)[\s]*(?:of)?[\s]*([A-Za-z\s]{5,100})',
+        r'(?:issued by|from)[\s]*([A-Za-z\s]{5,100})',
+        # The leftmost match always starts where a run of letters/spaces starts;
+        # the lookbehind skips the other start positions, each of which would
+        # otherwise rescan the rest of the run (quadratic on long OCR text)
+        r'(?<![A-Za-z\s])([A-Za-z\s]*(?:university|college|institute))'
+    ]
+}
+
+# Pattern that opens with a plain keyword alternation, e.g. "(?:roll|reg)"
+_KEYWORD_PREFIX = re.compile(r'^\(\?:((?:[a-z ]|\\\.)+(?:\|(?:[a-z ]|\\\.)+)*)\)')
+
+
+class FieldExtractionEngine:
+    def __init__(self, field_patterns: Dict[str, List[str]] = None):
+        """
+        Compile the field patterns and the shared keyword scanner
+
+        Patterns that open with a keyword alternation are matched during one
+        scan of the text for any of those keywords. The rest (e.g. bare
+        "CS2021001" or "85%" shapes) are fallbacks, searched only when every
+        higher-priority pattern of their field missed.
+
+        Args:
+            field_patterns: Field name -> patterns in priority order
+        """
+        self.field_patterns = field_patterns or FIELD_PATTERNS
+
+        # field -> [(compiled pattern, keywords or None for fallbacks)] in priority order
+        self._patterns = {}
+        for field, patterns in self.field_patterns.items():
+            compiled = []
+            for pattern in patterns:
+                prefix = _KEYWORD_PREFIX.match(pattern)
+                keywords = frozenset(prefix.group(1).split('|')) if prefix else None
+                compiled.append((re.compile(pattern, re.IGNORECASE), keywords))
+            self._patterns[field] = compiled
+
+        # keyword -> keyword-led patterns that can match where it occurs; a pattern
+        # keyed by "cert" also has to be probed where "certificate" was found
+        all_keywords = {
+            keyword
+            for patterns in self._patterns.values()
+            for _, keywords in patterns if keywords
+            for keyword in keywords
+        }
+        self._candidates = {
+            keyword: [
+                (field, priority)
+                for field, patterns in self._patterns.items()
+                for priority, (_, keywords) in enumerate(patterns)
+                if keywords and any(keyword.startswith(k) for k in keywords)
+            ]
+            for keyword in all_keywords
+        }
+        self._scanners = {}
+
+    def _scanner(self, keywords: frozenset, ascii_text: bool):
+        """
+        Compiled keyword scanner for the keywords still worth looking for
+        """
+        key = (keywords, ascii_text)
+        if key not in self._scanners:
+            # Longest first so the reported keyword is the most specific one; wrapped
+            # in a lookahead so a keyword never hides another one overlapping it
+            alternation = '|'.join(sorted(keywords, key=len, reverse=True))
+            flags = 0 if ascii_text else re.IGNORECASE
+            self._scanners[key] = re.compile(f"(?=({alternation}))", flags)
+        return self._scanners[key]
+
+    def _open_keywords(self, best: Dict[str, int], found: Dict) -> frozenset:
+        """
+        Keywords of patterns that could still improve some field's result
+        """
+        return frozenset(
+            keyword
+            for field, patterns in self._patterns.items()
+            for priority, (_, keywords) in enumerate(patterns[:best[field]])
+            if keywords and (field, priority) not in found
+            for keyword in keywords
+        )
+
+    def extract(self, text: str) -> Dict[str, Optional[Dict]]:
+        """
+        Extract all fields, scanning the text once for keyword-led patterns
+
+        Returns:
+            Field name -> {'value', 'span', 'pattern'} for the winning match, or None
+        """
+        # Case-sensitive scanning of lowered text is several times faster than
+        # IGNORECASE, and for ASCII text the positions are identical
+        ascii_text = text.isascii()
+        scan_text = text.lower() if ascii_text else text
+
+        # (field, priority) -> earliest match of that keyword-led pattern
+        found = {}
+        # Per field, the best priority found so far; only better ones are probed
+        best = {field: len(patterns) for field, patterns in self._patterns.items()}
+
+        pos = 0
+        keywords = self._open_keywords(best, found)
+        while keywords:
+            hit = self._scanner(keywords, ascii_text).search(scan_text, pos)
+            if hit is None:
+                break
+            pos = hit.start()
+
+            candidates = self._candidates.get(hit.group(1).lower())
+            if candidates is None:
+                # Non-ASCII case folding produced an unexpected spelling; probe everything
+                candidates = [(field, priority) for field in best for priority in range(best[field])]
+
+            narrowed = False
+            for field, priority in candidates:
+                pattern, pattern_keywords = self._patterns[field][priority]
+                if not pattern_keywords or priority >= best[field] or (field, priority) in found:
+                    continue
+                match = pattern.match(text, pos)
+                if match:
+                    found[(field, priority)] = match
+                    best[field] = priority
+                    narrowed = True
+
+            if narrowed:
+                keywords = self._open_keywords(best, found)
+            pos += 1
+
+        results = {}
+        for field, patterns in self._patterns.items():
+            results[field] = None
+            for priority, (pattern, keywords) in enumerate(patterns):
+                match = found.get((field, priority)) if keywords else pattern.search(text)
+                if match:
+                    results[field] = {
+                        'value': match.group(1).strip(),
+                        'span': match.span(1),
+                        'pattern': priority
+                    }
+                    break
+        return results
+
+    def extract_values(self, text: str) -> Dict[str, Optional[str]]:
+        """
+        Extract fields as plain values (None when not found)
+        """
+        return {
+            field: match['value'] if match else None
+            for field, match in self.extract(text).items()
+        }
+
+
+def canonical_hash(fields: Dict) -> str:
+    """
+    SHA-256 of the normalized certificate fields, as stored and verified
+
+    Fields that are missing or None hash as empty strings, so OCR results,
+    registry imports and sample data all produce the same hash for the same
+    certificate.
+    """
+    normalized_data = {
+        'name': (fields.get('name') or '').strip().upper(),
+        'roll_no': (fields.get('roll_no') or '').strip().upper(),
+        'certificate_id': (fields.get('certificate_id') or '').strip().upper(),
+        'marks': (fields.get('marks') or '').strip(),
+        'institution': (fields.get('institution') or '').strip().upper()
+    }
+    json_string = json.dumps(normalized_data, sort_keys=True)
+    return hashlib.sha256(json_string.encode()).hexdigest()
+
+
+def canonical_hashes(records: List[Dict]) -> List[str]:
+    """
+    canonical_hash for a batch of records (one task per batch for worker processes)
+    """
+    return [canonical_hash(record) for record in records]
+
+
+# Shared engine; compiled once per process
+engine = FieldExtractionEngine()
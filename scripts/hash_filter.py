@@ -0,0 +1,310 @@
+"""
+Bloom Filter over Stored Certificate Hashes
+Answers "definitely not stored" for forged or mistyped hashes without a database query
+"""
+
+import os
+import json
+import math
+import hashlib
+import struct
+import threading
+import zlib
+from datetime import datetime, timedelta
+from typing import Dict, Optional
+
+FILTER_MAGIC = b'CVBF'
+FILTER_FORMAT_VERSION = 1
+
+# Catch-up rescans this far behind the watermark, covering inserts that raced a
+# scan and clock skew between API servers
+CATCH_UP_OVERLAP = timedelta(minutes=5)
+
+HASH_FILTER_MODES = ('shared', 'single-writer')
+
+
+def _digest(hash_value: str) -> bytes:
+    """
+    Uniform bytes for a key (mixed, since mistyped or crafted "hashes" need not be random)
+    """
+    return hashlib.blake2b(hash_value.encode(), digest_size=16).digest()
+
+
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        """
+        Size an empty filter
+
+        Args:
+            capacity: Number of hashes the filter is sized for
+            error_rate: Target false-positive rate at capacity
+        """
+        self.capacity = max(1, int(capacity))
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-self.capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.num_hashes = max(1, round(self.num_bits / self.capacity * math.log(2)))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+        self.bits_set = 0
+        self.metadata = {}
+        self._lock = threading.Lock()
+
+    def _positions(self, hash_value: str):
+        # Double hashing: k indexes from two independent 64-bit values
+        digest = _digest(hash_value)
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:16], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def add(self, hash_value: str) -> bool:
+        """
+        Record a stored hash
+
+        Returns:
+            False if every bit was already set (the hash was most likely added before)
+        """
+        positions = self._positions(hash_value)
+        changed = False
+        with self._lock:
+            for position in positions:
+                byte, mask = position >> 3, 1 << (position & 7)
+                if not self.bits[byte] & mask:
+                    self.bits[byte] |= mask
+                    self.bits_set += 1
+                    changed = True
+            # Re-adding a hash (catch-up overlap) does not inflate the count
+            if changed:
+                self.count += 1
+        return changed
+
+    def __contains__(self, hash_value: str) -> bool:
+        """
+        False means the hash was never added; True means it probably was
+        """
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(hash_value))
+
+    def estimated_false_positive_rate(self) -> float:
+        """
+        Chance that an absent hash passes, from the fraction of bits set
+        """
+        return (self.bits_set / self.num_bits) ** self.num_hashes
+
+    def memory_bytes(self) -> int:
+        return len(self.bits)
+
+    def save(self, path: str, metadata: Dict = None):
+        """
+        Write the filter atomically: magic, header length, JSON header, bit array
+        """
+        with self._lock:
+            bits = bytes(self.bits)
+            header = {
+                'version': FILTER_FORMAT_VERSION,
+                'capacity': self.capacity,
+                'error_rate': self.error_rate,
+                'num_bits': self.num_bits,
+                'num_hashes': self.num_hashes,
+                'count': self.count,
+                'bits_set': self.bits_set,
+                'crc32': zlib.crc32(bits),
+                'metadata': metadata or {}
+            }
+        encoded = json.dumps(header).encode()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(FILTER_MAGIC + struct.pack('<I', len(encoded)) + encoded)
+            f.write(bits)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['BloomFilter']:
+        """
+        Read a saved filter, or None if the file is missing, corrupt or from another version
+        """
+        try:
+            with open(path, 'rb') as f:
+                if f.read(4) != FILTER_MAGIC:
+                    return None
+                (header_length,) = struct.unpack('<I', f.read(4))
+                header = json.loads(f.read(header_length))
+                bits = f.read()
+        except (OSError, ValueError, struct.error):
+            return None
+
+        if header.get('version') != FILTER_FORMAT_VERSION or zlib.crc32(bits) != header['crc32']:
+            return None
+
+        bloom = cls.__new__(cls)
+        bloom.capacity = header['capacity']
+        bloom.error_rate = header['error_rate']
+        bloom.num_bits = header['num_bits']
+        bloom.num_hashes = header['num_hashes']
+        bloom.bits = bytearray(bits)
+        bloom.count = header['count']
+        bloom.bits_set = header['bits_set']
+        bloom._lock = threading.Lock()
+        bloom.metadata = header['metadata']
+        return bloom
+
+
+class HashFilter:
+    def __init__(self, path: str = None, capacity: int = None, error_rate: float = None, mode: str = None):
+        """
+        Bloom filter over the certificates collection, kept in step with it
+
+        Args:
+            path: File the filter is persisted to ('' disables persistence)
+            capacity: Minimum number of hashes to size for (grows with the collection)
+            error_rate: Target false-positive rate
+            mode: 'single-writer' (default): a miss is final and answered without a query;
+                  certificates stored by other processes are picked up at the next catch-up.
+                  'shared': a miss is rechecked against documents stored since the last
+                  catch-up, for deployments where that window must be closed
+        """
+        self.path = path if path is not None else os.getenv('HASH_FILTER_PATH', 'certificate_hashes.bloom')
+        self.capacity = capacity or int(os.getenv('HASH_FILTER_CAPACITY', 1_000_000))
+        self.error_rate = error_rate or float(os.getenv('HASH_FILTER_ERROR_RATE', 0.001))
+        self.mode = (mode or os.getenv('HASH_FILTER_MODE', 'single-writer')).lower()
+        if self.mode not in HASH_FILTER_MODES:
+            raise ValueError(f"Unknown hash filter mode: {self.mode}")
+
+        self.bloom: Optional[BloomFilter] = None
+        # Newest upload_date included; later documents are picked up by catch_up()
+        self.watermark: Optional[datetime] = None
+        self.source = None
+        self.stats = {'filtered_misses': 0, 'passed': 0, 'false_positives': 0, 'rechecked': 0, 'found_unseen': 0}
+        # Counted from request threads and the refresh thread alike
+        self._stats_lock = threading.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.bloom is not None
+
+    def build(self, collection, database_name: str):
+        """
+        Load the persisted filter and catch up, or rebuild it with a streamed scan
+        """
+        total = collection.estimated_document_count()
+        capacity = max(self.capacity, 2 * total)
+
+        bloom = BloomFilter.load(self.path) if self.path else None
+        if bloom is not None and bloom.metadata.get('database') == database_name and bloom.capacity >= total:
+            self.bloom = bloom
+            watermark = bloom.metadata.get('watermark')
+            self.watermark = datetime.fromisoformat(watermark) if watermark else None
+            self.source = 'disk'
+            added = self.catch_up(collection)
+            print(f"Loaded hash filter from {self.path} ({bloom.count} hashes, {added} added since)")
+            return
+
+        bloom = BloomFilter(capacity, self.error_rate)
+        watermark = None
+        # Only the hash and upload date are read, in large batches
+        for document in collection.find({}, {"_id": 0, "hash": 1, "upload_date": 1}, batch_size=10000):
+            if document.get("hash"):
+                bloom.add(document["hash"])
+            if document.get("upload_date") and (watermark is None or document["upload_date"] > watermark):
+                watermark = document["upload_date"]
+        self.bloom = bloom
+        self.watermark = watermark
+        self.source = 'scan'
+        self.catch_up(collection)
+        print(f"Built hash filter from {bloom.count} stored hashes ({bloom.memory_bytes() / 2**20:.1f} MB)")
+
+    def catch_up(self, collection) -> int:
+        """
+        Add hashes stored since the watermark (by other processes, or while the filter was saved)
+        """
+        query = {"upload_date": {"$gte": self.watermark - CATCH_UP_OVERLAP}} if self.watermark else {}
+        added = 0
+        for document in collection.find(query, {"_id": 0, "hash": 1, "upload_date": 1}, batch_size=10000):
+            if document.get("hash") and self.bloom.add(document["hash"]):
+                added += 1
+            if document.get("upload_date") and (self.watermark is None or document["upload_date"] > self.watermark):
+                self.watermark = document["upload_date"]
+        return added
+
+    def add(self, hash_value: str):
+        if self.bloom is not None and hash_value:
+            self.bloom.add(hash_value)
+
+    def _count(self, stat: str):
+        with self._stats_lock:
+            self.stats[stat] += 1
+
+    def might_contain(self, hash_value: str) -> bool:
+        """
+        False only when the hash is definitely not stored (always True until built)
+        """
+        if self.bloom is None:
+            return True
+        if hash_value in self.bloom:
+            self._count('passed')
+            return True
+        self._count('filtered_misses')
+        return False
+
+    def unseen_query(self) -> Optional[Dict]:
+        """
+        Condition for documents the filter may not have seen: those stored since the
+        last catch-up, by another process
+
+        A filter miss is only final for documents older than that. None when every
+        miss is final (HASH_FILTER_MODE=single-writer).
+        """
+        if self.mode == 'single-writer':
+            return None
+        self._count('rechecked')
+        if self.watermark is None:
+            return {}
+        return {"upload_date": {"$gte": self.watermark - CATCH_UP_OVERLAP}}
+
+    def record_unseen(self, hash_value: str):
+        """
+        Add a hash the filter missed but the recheck found (stored elsewhere since the last catch-up)
+        """
+        self._count('found_unseen')
+        self.add(hash_value)
+
+    def record_false_positive(self):
+        """
+        Count a hash that passed the filter but was not in the database
+        """
+        self._count('false_positives')
+
+    def save(self, database_name: str):
+        if self.bloom is None or not self.path:
+            return
+        self.bloom.save(self.path, {
+            'database': database_name,
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            'saved_at': datetime.utcnow().isoformat()
+        })
+
+    def info(self) -> Dict:
+        if self.bloom is None:
+            return {'enabled': True, 'ready': False}
+
+        with self._stats_lock:
+            stats = dict(self.stats)
+        absent_lookups = stats['filtered_misses'] + stats['false_positives']
+        return {
+            'enabled': True,
+            'ready': True,
+            'mode': self.mode,
+            'source': self.source,
+            'hashes': self.bloom.count,
+            'capacity': self.bloom.capacity,
+            'num_hashes': self.bloom.num_hashes,
+            'memory_bytes': self.bloom.memory_bytes(),
+            'fill_ratio': round(self.bloom.bits_set / self.bloom.num_bits, 4),
+            'estimated_false_positive_rate': self.bloom.estimated_false_positive_rate(),
+            'observed_false_positive_rate': (
+                stats['false_positives'] / absent_lookups if absent_lookups else 0.0
+            ),
+            'watermark': self.watermark.isoformat() if self.watermark else None,
+            **stats
+        }
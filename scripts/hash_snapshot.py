@@ -0,0 +1,214 @@
+"""
+Memory-Mapped Hash Registry Snapshot
+Every stored certificate hash as a sorted array of raw 32-byte SHA-256 digests,
+for partners verifying offline: the reader maps the file and binary-searches it
+in place, so it opens in milliseconds and keeps almost nothing on the heap
+"""
+
+import os
+import mmap
+import bisect
+import struct
+import time
+import zlib
+from datetime import datetime
+from typing import Dict, Iterable
+
+SNAPSHOT_MAGIC = b'CVHS'
+SNAPSHOT_FORMAT_VERSION = 1
+DIGEST_SIZE = 32
+
+# magic, version, digest size, digest count, created (unix time), crc32 of the digests;
+# padded so the digest array starts on a 64-byte boundary
+HEADER = struct.Struct('<4sHHQdI')
+HEADER_SIZE = 64
+
+HEX_DIGITS = frozenset('0123456789abcdef')
+
+
+def write_snapshot(hash_values: Iterable[str], path: str) -> Dict:
+    """
+    Write a snapshot atomically from hex hashes in ascending order
+
+    The array is streamed to disk, so memory use does not grow with the registry.
+    Values that are not 64 lowercase hex digits are skipped (they cannot be a
+    canonical hash), as is any value not greater than the one before it.
+
+    Args:
+        hash_values: Stored hashes, sorted ascending (e.g. CertificateStore.iter_hashes())
+        path: Snapshot file to (re)place
+
+    Returns:
+        {'path', 'count', 'skipped', 'bytes'}
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    count = skipped = 0
+    crc = 0
+    previous = b''
+
+    with open(tmp_path, 'wb') as f:
+        f.write(bytes(HEADER_SIZE))
+        buffer = bytearray()
+        for hash_value in hash_values:
+            valid = isinstance(hash_value, str) and len(hash_value) == 2 * DIGEST_SIZE
+            if not valid or not HEX_DIGITS.issuperset(hash_value):
+                skipped += 1
+                continue
+            digest = bytes.fromhex(hash_value)
+            if digest <= previous:
+                skipped += 1
+                continue
+            buffer += digest
+            previous = digest
+            count += 1
+            if len(buffer) >= 1 << 20:
+                crc = zlib.crc32(buffer, crc)
+                f.write(buffer)
+                buffer.clear()
+        crc = zlib.crc32(buffer, crc)
+        f.write(buffer)
+
+        # The header goes in last, once the count and checksum are known
+        f.seek(0)
+        f.write(HEADER.pack(SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, DIGEST_SIZE, count, time.time(), crc))
+    os.replace(tmp_path, path)
+
+    return {'path': path, 'count': count, 'skipped': skipped, 'bytes': HEADER_SIZE + count * DIGEST_SIZE}
+
+
+def export_snapshot(db, path: str = None) -> Dict:
+    """
+    Write a snapshot of every hash stored in a database backend (HASH_SNAPSHOT_PATH by default)
+    """
+    return write_snapshot(db.iter_hashes(), path or os.getenv('HASH_SNAPSHOT_PATH', 'certificate_hashes.snapshot'))
+
+
+class _Digests:
+    """
+    The mapped digest array as a sequence, so bisect can search it where it lies
+    """
+
+    def __init__(self, buffer: mmap.mmap, count: int):
+        self.buffer = buffer
+        self.count = count
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __getitem__(self, index: int) -> bytes:
+        offset = HEADER_SIZE + index * DIGEST_SIZE
+        return self.buffer[offset:offset + DIGEST_SIZE]
+
+
+class HashSnapshot:
+    def __init__(self, path: str = None):
+        """
+        Map a snapshot file read-only; only the header is read here
+
+        Raises:
+            ValueError: If the file is not a snapshot of this version, or is truncated
+        """
+        self.path = path or os.getenv('HASH_SNAPSHOT_PATH', 'certificate_hashes.snapshot')
+        with open(self.path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size < HEADER_SIZE:
+                raise ValueError(f"{self.path} is not a hash snapshot")
+            self._buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, digest_size, self.count, created, self.crc32 = HEADER.unpack_from(self._buffer)
+        if magic != SNAPSHOT_MAGIC or version != SNAPSHOT_FORMAT_VERSION or digest_size != DIGEST_SIZE:
+            self._buffer.close()
+            raise ValueError(f"{self.path} is not a version {SNAPSHOT_FORMAT_VERSION} hash snapshot")
+        if size != HEADER_SIZE + self.count * DIGEST_SIZE:
+            self._buffer.close()
+            raise ValueError(f"{self.path} is truncated ({size} bytes for {self.count} digests)")
+        self.created_at = datetime.utcfromtimestamp(created)
+        self._digests = _Digests(self._buffer, self.count)
+
+        # Lookups are random probes; read-ahead would only pull in pages that are never used
+        if hasattr(mmap, 'MADV_RANDOM'):
+            self._buffer.madvise(mmap.MADV_RANDOM)
+
+    def __len__(self) -> int:
+        return self.count
+
+    def __contains__(self, hash_value: str) -> bool:
+        """
+        Whether a hex hash is in the snapshot: about log2(count) 32-byte page reads
+        """
+        try:
+            digest = bytes.fromhex(hash_value)
+        except (TypeError, ValueError):
+            return False
+        if len(digest) != DIGEST_SIZE:
+            return False
+        index = bisect.bisect_left(self._digests, digest)
+        return index < self.count and self._digests[index] == digest
+
+    def verify_checksum(self) -> bool:
+        """
+        Check the digests against the header's crc32 (reads the whole file)
+        """
+        crc = 0
+        end = HEADER_SIZE + self.count * DIGEST_SIZE
+        for offset in range(HEADER_SIZE, end, 1 << 20):
+            crc = zlib.crc32(self._buffer[offset:min(offset + (1 << 20), end)], crc)
+        return crc == self.crc32
+
+    def info(self) -> Dict:
+        return {
+            'path': self.path,
+            'count': self.count,
+            'bytes': HEADER_SIZE + self.count * DIGEST_SIZE,
+            'created_at': self.created_at.isoformat()
+        }
+
+    def close(self):
+        self._buffer.close()
+
+    def __enter__(self) -> 'HashSnapshot':
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main():
+    """
+    Export the snapshot, or check hashes against one:
+
+        python hash_snapshot.py export certificate_hashes.snapshot
+        python hash_snapshot.py check certificate_hashes.snapshot <hash> [<hash> ...]
+    """
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Export or query a memory-mapped hash registry snapshot")
+    commands = parser.add_subparsers(dest='command', required=True)
+    export = commands.add_parser('export', help="Write every stored hash from the configured database")
+    export.add_argument('path', nargs='?', help="Snapshot file (default HASH_SNAPSHOT_PATH)")
+    check = commands.add_parser('check', help="Look hashes up in a snapshot")
+    check.add_argument('path', help="Snapshot file")
+    check.add_argument('hashes', nargs='+', help="Hex SHA-256 hashes")
+    check.add_argument('--verify-checksum', action='store_true', help="Check the file's crc32 first")
+    args = parser.parse_args()
+
+    if args.command == 'export':
+        from database import create_database
+        db = create_database()
+        try:
+            print(json.dumps(export_snapshot(db, args.path), indent=2))
+        finally:
+            db.close_connection()
+        return
+
+    with HashSnapshot(args.path) as snapshot:
+        if args.verify_checksum and not snapshot.verify_checksum():
+            raise SystemExit(f"{args.path}: checksum mismatch")
+        for hash_value in args.hashes:
+            print(f"{hash_value} {'found' if hash_value in snapshot else 'not found'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Layout Templates for Known Certificate Formats
+Matches a page to an institution's fixed layout so only the field regions are OCRed
+"""
+
+import os
+import json
+import hashlib
+import re
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import cv2
+import numpy as np
+
+from resolution import shrink
+
+SIGNATURE_SIZE = 32  # Pages are compared as a 32x32 grid of ink-density bits
+# Every hashed field; one without a box is read from full-page OCR instead
+TEMPLATE_FIELDS = ('name', 'roll_no', 'certificate_id', 'marks', 'institution')
+
+
+def page_signature(page: np.ndarray) -> np.ndarray:
+    """
+    Coarse layout fingerprint: which cells of a 32x32 grid hold more ink than average
+
+    Borders, logos, headings and printed labels dominate the grid, so two
+    certificates from the same layout match even though their field values differ.
+    """
+    gray = cv2.cvtColor(page, cv2.COLOR_BGR2GRAY) if len(page.shape) == 3 else page
+    ink = 255 - shrink(gray, (SIGNATURE_SIZE, SIGNATURE_SIZE)).astype(np.float32)
+    return (ink > ink.mean()).ravel()
+
+
+class LayoutTemplateRegistry:
+    def __init__(self, template_dir: str = None, max_distance: float = None, aspect_tolerance: float = None):
+        """
+        Load layout templates from a directory of JSON files
+
+        Args:
+            template_dir: Directory of <template id>.json files (missing directory = no templates)
+            max_distance: Largest fraction of differing signature bits accepted as a match
+            aspect_tolerance: Largest relative difference in page aspect ratio accepted
+        """
+        self.template_dir = template_dir or os.getenv(
+            'LAYOUT_TEMPLATE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'layout_templates')
+        )
+        self.max_distance = max_distance or float(os.getenv('LAYOUT_TEMPLATE_MAX_DISTANCE', 0.12))
+        self.aspect_tolerance = aspect_tolerance or float(os.getenv('LAYOUT_TEMPLATE_ASPECT_TOLERANCE', 0.05))
+
+        self._lock = threading.Lock()
+        self.templates: List[Dict] = []
+        self._signatures = np.zeros((0, SIGNATURE_SIZE * SIGNATURE_SIZE), dtype=bool)
+        self._aspects = np.zeros(0)
+        # SHA-256 over the loaded template files, so results can be tied to the template set
+        self.digest = hashlib.sha256().hexdigest()
+        self.load()
+
+    def load(self):
+        """
+        (Re)read every template in the template directory
+        """
+        templates = []
+        digest = hashlib.sha256()
+        if os.path.isdir(self.template_dir):
+            for filename in sorted(os.listdir(self.template_dir)):
+                if not filename.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(self.template_dir, filename), 'rb') as f:
+                        raw = f.read()
+                    templates.append(self._compile(json.loads(raw)))
+                except (OSError, ValueError, KeyError) as e:
+                    print(f"Skipping layout template {filename}: {e}")
+                    continue
+                digest.update(filename.encode() + b'\0' + raw)
+
+        with self._lock:
+            self.templates = templates
+            self._signatures = np.array(
+                [template['_signature'] for template in templates],
+                dtype=bool
+            ).reshape(len(templates), SIGNATURE_SIZE * SIGNATURE_SIZE)
+            self._aspects = np.array([template['aspect'] for template in templates], dtype=np.float64)
+            self.digest = digest.hexdigest()
+
+        if templates:
+            print(f"Loaded {len(templates)} layout templates from {self.template_dir}")
+
+    def _compile(self, template: Dict) -> Dict:
+        """
+        Validate a template and unpack its signature and field patterns
+        """
+        bits = np.unpackbits(np.frombuffer(bytes.fromhex(template['signature']), dtype=np.uint8))
+        if len(bits) != SIGNATURE_SIZE * SIGNATURE_SIZE:
+            raise ValueError("signature has the wrong length")
+
+        for field, spec in template['fields'].items():
+            x, y, w, h = spec['box']
+            if not (0 <= x < 1 and 0 <= y < 1 and 0 < w <= 1 and 0 < h <= 1):
+                raise ValueError(f"box for {field} is not in page fractions")
+
+        return {
+            **template,
+            '_signature': bits.astype(bool),
+            '_patterns': {
+                field: re.compile(spec['pattern'], re.IGNORECASE)
+                for field, spec in template['fields'].items() if spec.get('pattern')
+            }
+        }
+
+    def match(self, page: np.ndarray) -> Optional[Dict]:
+        """
+        Find the template whose layout is closest to a page
+
+        Returns:
+            {'template': template, 'distance': fraction of differing bits}, or None
+            when no template is close enough
+        """
+        if not self.templates:
+            return None
+
+        height, width = page.shape[:2]
+        with self._lock:
+            templates, signatures, aspects = self.templates, self._signatures, self._aspects
+
+        candidates = np.abs(aspects - width / height) <= aspects * self.aspect_tolerance
+        if not candidates.any():
+            return None
+
+        distances = np.count_nonzero(signatures != page_signature(page), axis=1) / signatures.shape[1]
+        distances[~candidates] = np.inf
+        best = int(np.argmin(distances))
+        if distances[best] > self.max_distance:
+            return None
+        return {'template': templates[best], 'distance': round(float(distances[best]), 3)}
+
+    def field_regions(self, template: Dict, page_shape: Tuple[int, ...]) -> Dict[str, Tuple[int, int, int, int]]:
+        """
+        Pixel boxes (left, top, width, height) of the template's fields on a page,
+        padded by the template's margin to absorb small shifts
+        """
+        height, width = page_shape[:2]
+        margin = template.get('margin', 0.01)
+        regions = {}
+        for field, spec in template['fields'].items():
+            x, y, w, h = spec['box']
+            left = max(0, int((x - margin) * width))
+            top = max(0, int((y - margin) * height))
+            right = min(width, int((x + w + margin) * width))
+            bottom = min(height, int((y + h + margin) * height))
+            regions[field] = (left, top, right - left, bottom - top)
+        return regions
+
+    def field_value(self, template: Dict, field: str, text: str) -> Optional[str]:
+        """
+        Clean the OCR text of one field region with the template's optional pattern
+        """
+        text = ' '.join(text.split())
+        pattern = template['_patterns'].get(field)
+        if pattern and text:
+            match = pattern.search(text)
+            if not match:
+                return None
+            text = match.group(1) if pattern.groups else match.group(0)
+        return text.strip() or None
+
+    def add(self, template_id: str, institution: str, reference_page: np.ndarray, fields: Dict[str, Dict]) -> Dict:
+        """
+        Create a template from a preprocessed reference page and save it
+
+        Args:
+            template_id: File name (without .json) and identifier of the template
+            institution: Institution name reported in processing_info.template for
+                         matching pages (metadata only; the hashed institution is read from the page)
+            reference_page: Preprocessed page of a certificate in this layout
+            fields: Field name -> {'box': [x, y, w, h] as page fractions, 'pattern': optional regex}
+        """
+        height, width = reference_page.shape[:2]
+        template = {
+            'id': template_id,
+            'institution': institution,
+            'aspect': round(width / height, 4),
+            'signature': np.packbits(page_signature(reference_page)).tobytes().hex(),
+            'fields': fields,
+            'created_at': datetime.now().isoformat()
+        }
+        self._compile(template)
+
+        os.makedirs(self.template_dir, exist_ok=True)
+        path = os.path.join(self.template_dir, f"{template_id}.json")
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(template, f, indent=2)
+        os.replace(tmp_path, path)
+
+        self.load()
+        return template
+
+    def info(self) -> Dict:
+        return {
+            'template_dir': self.template_dir,
+            'templates': [template['id'] for template in self.templates],
+            'digest': self.digest
+        }
+
+
+def main():
+    """
+    Register a layout template from a reference scan:
+
+        python layout_templates.py --id abc-university-2024 --institution "ABC University" \\
+            --image reference.png --field name=0.30,0.42,0.40,0.05 --field roll_no=0.30,0.50,0.20,0.04
+    """
+    import argparse
+    from ocr_backend import CertificateOCR
+
+    parser = argparse.ArgumentParser(description="Register a certificate layout template")
+    parser.add_argument('--id', required=True, help="Template identifier")
+    parser.add_argument('--institution', required=True, help="Institution name reported for matching pages")
+    parser.add_argument('--image', required=True, help="Reference certificate scan")
+    parser.add_argument('--field', action='append', required=True,
+                        help="field=x,y,w,h in page fractions; optionally field=x,y,w,h:regex")
+    args = parser.parse_args()
+
+    fields = {}
+    for spec in args.field:
+        field, _, value = spec.partition('=')
+        box, _, pattern = value.partition(':')
+        if field not in TEMPLATE_FIELDS:
+            parser.error(f"unknown field {field}; expected one of {', '.join(TEMPLATE_FIELDS)}")
+        fields[field] = {'box': [float(part) for part in box.split(',')]}
+        if pattern:
+            fields[field]['pattern'] = pattern
+
+    image = cv2.imread(args.image, cv2.IMREAD_COLOR)
+    if image is None:
+        parser.error(f"could not read {args.image}")
+
+    # Fingerprint the page exactly as the pipeline will see it
+    processor = CertificateOCR()
+    image, _ = processor.normalizer.normalize(image)
+    page = processor.preprocess_image(image)
+
+    template = processor.templates.add(args.id, args.institution, page, fields)
+    print(f"Saved template {template['id']} with fields: {', '.join(fields)}")
+
+
+if __name__ == "__main__":
+    main()
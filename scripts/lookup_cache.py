@@ -0,0 +1,89 @@
+"""
+Read-Through Cache for Certificate Lookups
+Bounded LRU with a TTL in front of verify-by-hash and search-by-ID; stored
+certificates rarely change, so repeat lookups skip MongoDB
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional
+
+LOOKUP_KINDS = ('verify', 'search')
+
+
+class LookupCache:
+    def __init__(self, max_entries: int = None, ttl_seconds: float = None):
+        """
+        Create an empty cache
+
+        Args:
+            max_entries: Entries kept across all lookup kinds (LOOKUP_CACHE_SIZE)
+            ttl_seconds: Entry lifetime (LOOKUP_CACHE_TTL_SECONDS); bounds how long a
+                         change made by another process can go unseen
+        """
+        self.max_entries = max_entries or int(os.getenv('LOOKUP_CACHE_SIZE', 10000))
+        self.ttl_seconds = ttl_seconds or float(os.getenv('LOOKUP_CACHE_TTL_SECONDS', 60))
+
+        # (kind, key) -> (document, monotonic expiry), least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {
+            kind: {'hits': 0, 'misses': 0, 'expired': 0, 'invalidations': 0}
+            for kind in LOOKUP_KINDS
+        }
+        self._evictions = 0
+
+    def get(self, kind: str, key: Hashable) -> Optional[Dict]:
+        """
+        Cached document for a lookup, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get((kind, key))
+            if entry is not None:
+                if entry[1] > time.monotonic():
+                    self._entries.move_to_end((kind, key))
+                    self._counters[kind]['hits'] += 1
+                    return entry[0]
+                del self._entries[(kind, key)]
+                self._counters[kind]['expired'] += 1
+            self._counters[kind]['misses'] += 1
+            return None
+
+    def put(self, kind: str, key: Hashable, document: Dict):
+        """
+        Cache a found document (absent certificates are not cached, so a new one is seen at once)
+        """
+        with self._lock:
+            self._entries[(kind, key)] = (document, time.monotonic() + self.ttl_seconds)
+            self._entries.move_to_end((kind, key))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def invalidate(self, kind: str, key: Hashable):
+        with self._lock:
+            if self._entries.pop((kind, key), None) is not None:
+                self._counters[kind]['invalidations'] += 1
+
+    def stats(self) -> Dict:
+        """
+        Hit ratio and counters per lookup kind
+        """
+        with self._lock:
+            kinds = {}
+            for kind, counters in self._counters.items():
+                lookups = counters['hits'] + counters['misses']
+                kinds[kind] = {
+                    **counters,
+                    'hit_ratio': round(counters['hits'] / lookups, 4) if lookups else 0
+                }
+            return {
+                'enabled': True,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl_seconds,
+                'evictions': self._evictions,
+                **kinds
+            }
@@ -0,0 +1,176 @@
+"""
+In-Process Latency Metrics
+Monotonic per-stage timers for the certificate pipeline, histograms and counters
+kept in memory, and their Prometheus text exposition for GET /metrics
+"""
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Tuple
+
+# Seconds; from a cached database lookup up to a slow multi-page OCR run
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Stage timings of the request running in this context (None outside the pipeline)
+_current_timings: contextvars.ContextVar = contextvars.ContextVar('stage_timings', default=None)
+
+# Guards StageTimings updates; PDF pages add to one request's timings from several threads
+_timings_lock = threading.Lock()
+
+
+class Histogram:
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        # One count per bucket plus the +Inf overflow; made cumulative when rendered
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...], **extra) -> str:
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        # name -> (type, help text), in registration order
+        self._descriptions: Dict[str, Tuple[str, str]] = {}
+        # name -> {sorted label pairs -> Histogram or counter value}
+        self._series: Dict[str, Dict[Tuple[Tuple[str, str], ...], object]] = {}
+
+    def describe(self, name: str, kind: str, help_text: str):
+        """
+        Register a metric ('histogram' or 'counter') so it is rendered even before its first sample
+        """
+        with self._lock:
+            self._descriptions[name] = (kind, help_text)
+            self._series.setdefault(name, {})
+
+    def observe(self, name: str, value: float, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            histogram = series.get(key)
+            if histogram is None:
+                histogram = series[key] = Histogram()
+            histogram.observe(value)
+
+    def increment(self, name: str, amount: float = 1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def render(self) -> str:
+        """
+        Every metric in the Prometheus text exposition format (version 0.0.4)
+        """
+        lines = []
+        with self._lock:
+            for name, series in self._series.items():
+                kind, help_text = self._descriptions.get(name, ('untyped', name))
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    if isinstance(value, Histogram):
+                        cumulative = 0
+                        for bound, count in zip(value.buckets + (float('inf'),), value.counts):
+                            cumulative += count
+                            le = '+Inf' if bound == float('inf') else repr(bound)
+                            lines.append(f"{name}_bucket{_labels(key, le=le)} {cumulative}")
+                        lines.append(f"{name}_sum{_labels(key)} {value.sum}")
+                        lines.append(f"{name}_count{_labels(key)} {value.count}")
+                    else:
+                        lines.append(f"{name}{_labels(key)} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# Shared by the pipeline, the database clients and the /metrics endpoint
+metrics = MetricsRegistry()
+metrics.describe('certificate_stage_seconds', 'histogram',
+                 "Time spent in each certificate pipeline stage (PDF pages are summed)")
+metrics.describe('certificate_db_round_trips_total', 'counter',
+                 "MongoDB commands sent, by command name and outcome")
+metrics.describe('certificate_db_round_trip_seconds', 'histogram',
+                 "MongoDB command round-trip time, by command name")
+
+
+class StageTimings:
+    """
+    Per-stage durations of one certificate, measured with time.perf_counter()
+
+    Plain data, so it travels with a prepared certificate to an OCR worker process and back.
+    """
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+
+    def add(self, stage: str, seconds: float):
+        with _timings_lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - start)
+
+    @contextmanager
+    def activate(self) -> Iterator['StageTimings']:
+        """
+        Make these the timings timed_stage() adds to, for code running in this context
+        """
+        token = _current_timings.set(self)
+        try:
+            yield self
+        finally:
+            _current_timings.reset(token)
+
+    def breakdown(self) -> Dict[str, float]:
+        """
+        Milliseconds per stage, for processing_info
+        """
+        with _timings_lock:
+            return {stage: round(seconds * 1000, 3) for stage, seconds in self.seconds.items()}
+
+
+@contextmanager
+def timed_stage(name: str) -> Iterator[None]:
+    """
+    Time a block into the active request's StageTimings (not timed outside one)
+    """
+    timings: Optional[StageTimings] = _current_timings.get()
+    if timings is None:
+        yield
+        return
+    with timings.stage(name):
+        yield
+
+
+def observe_stages(stage_ms: Optional[Dict[str, float]]):
+    """
+    Add a result's stage breakdown to the stage histograms
+
+    Called where results arrive in the API process, so stages timed in OCR worker
+    processes are counted too.
+    """
+    for stage, milliseconds in (stage_ms or {}).items():
+        metrics.observe('certificate_stage_seconds', milliseconds / 1000, stage=stage)
@@ -0,0 +1,125 @@
+"""
+Model Registry for the Certificate OCR Backend
+Loads heavy models (torch/transformers) on first use instead of at import time
+"""
+
+import os
+import threading
+import time
+from datetime import datetime
+from typing import Callable, Dict
+
+
+def load_layoutlmv3(model_name: str):
+    """
+    Load the LayoutLMv3 processor and model; torch/transformers are imported here only
+    """
+    from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
+
+    processor = LayoutLMv3Processor.from_pretrained(model_name)
+    model = LayoutLMv3ForTokenClassification.from_pretrained(model_name)
+    model.eval()
+    return processor, model
+
+
+class ModelRegistry:
+    def __init__(self):
+        """
+        Create an empty registry; models are loaded on demand
+        """
+        self._loaders: Dict[str, tuple] = {}
+        self._models: Dict[str, object] = {}
+        self._errors: Dict[str, str] = {}
+        self._load_times: Dict[str, float] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+
+    def register(self, name: str, loader: Callable, *args):
+        """
+        Register a loader without running it
+
+        Args:
+            name: Registry key
+            loader: Callable returning the loaded model object
+            args: Arguments passed to the loader
+        """
+        self._loaders[name] = (loader, args)
+        self._locks[name] = threading.Lock()
+
+    def get(self, name: str):
+        """
+        Return a loaded model, loading it on first use (thread-safe)
+        """
+        if name in self._models:
+            return self._models[name]
+
+        if name not in self._loaders:
+            raise KeyError(f"Model not registered: {name}")
+
+        with self._locks[name]:
+            if name not in self._models:
+                loader, args = self._loaders[name]
+                print(f"Loading model '{name}'...")
+                start = time.monotonic()
+                try:
+                    self._models[name] = loader(*args)
+                except Exception as e:
+                    self._errors[name] = str(e)
+                    raise
+                self._errors.pop(name, None)
+                self._load_times[name] = round(time.monotonic() - start, 2)
+                print(f"Model '{name}' loaded in {self._load_times[name]}s")
+
+        return self._models[name]
+
+    def load_all(self):
+        """
+        Load every registered model, recording failures instead of raising
+        """
+        for name in self._loaders:
+            try:
+                self.get(name)
+            except Exception as e:
+                print(f"Failed to load model '{name}': {e}")
+
+    @property
+    def ready(self) -> bool:
+        """
+        True once every registered model is loaded
+        """
+        return all(name in self._models for name in self._loaders)
+
+    def status(self) -> Dict:
+        """
+        Describe the load state of each registered model
+        """
+        models = {}
+        for name in self._loaders:
+            if name in self._models:
+                state = 'loaded'
+            elif name in self._errors:
+                state = 'failed'
+            elif self._locks[name].locked():
+                state = 'loading'
+            else:
+                state = 'not_loaded'
+
+            models[name] = {'state': state}
+            if name in self._load_times:
+                models[name]['load_time'] = self._load_times[name]
+            if name in self._errors:
+                models[name]['error'] = self._errors[name]
+
+        return {
+            'ready': self.ready,
+            'models': models,
+            'timestamp': datetime.now().isoformat()
+        }
+
+
+# Shared registry; LAYOUT_MODEL_NAME selects the LayoutLMv3 checkpoint
+registry = ModelRegistry()
+registry.register(
+    'layoutlmv3',
+    load_layoutlmv3,
+    os.getenv('LAYOUT_MODEL_NAME', 'microsoft/layoutlmv3-base')
+)
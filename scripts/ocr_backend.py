@@ -8,17 +8,40 @@ import hashlib
 import json
 import cv2
 import numpy as np
-import pytesseract
 from PIL import Image
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, UploadFile, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
-import torch
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from typing import Dict, List, Optional
 import re
 from datetime import datetime
 import base64
 import io
+import time
+import asyncio
+
+from ocr_executor import OCRExecutor
+from batch_processing import expand_uploads, process_batch, read_uploads
+from model_registry import registry as model_registry
+from result_cache import ResultCache
+from field_extraction import FIELD_PATTERNS, canonical_hash, engine as field_engine
+from deskew import estimate_skew_angle
+from resolution import ResolutionNormalizer
+from upload_handling import MAX_FILE_SIZE, decode_image, read_upload
+from ocr_engine import create_ocr_engine, SINGLE_LINE_PSM
+from layout_templates import LayoutTemplateRegistry, TEMPLATE_FIELDS
+from pdf_ingestion import PdfPageReader, is_pdf, read_pages, merge_page_fields
+from metrics import StageTimings, metrics, observe_stages, timed_stage
+
+# Bump whenever a pipeline change alters results, so cached results are not reused
+PIPELINE_VERSION = "1.8.0"
+
+# SERVER_MODE=verify-only serves hash verification without the OCR stack or its models
+SERVER_MODE = os.getenv('SERVER_MODE', 'full').lower()
+OCR_ENABLED = SERVER_MODE != 'verify-only'
+
+# MODEL_WARMUP=background (default) loads models after startup, lazy waits for the first request
+MODEL_WARMUP = os.getenv('MODEL_WARMUP', 'background').lower()
 
 # Initialize FastAPI app
 app = FastAPI(title="Certificate OCR API", version="1.0.0")
@@ -32,16 +55,81 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize LayoutLMv3 model (using a smaller model for demo)
-print("Loading LayoutLMv3 model...")
-processor = LayoutLMv3Processor.from_pretrained("microsoft/layoutlmv3-base")
-model = LayoutLMv3ForTokenClassification.from_pretrained("microsoft/layoutlmv3-base")
-print("Model loaded successfully!")
+# Multipart framing around a single file upload
+MULTIPART_OVERHEAD = 64 * 1024
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    """
+    Refuse single-file uploads whose declared length is over the limit before the
+    multipart body is parsed (chunked uploads are caught by read_upload instead)
+    """
+    if request.url.path == "/process-certificate":
+        content_length = request.headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > MAX_FILE_SIZE + MULTIPART_OVERHEAD:
+            return JSONResponse(status_code=400, content={"detail": "File too large (max 10MB)"})
+    return await call_next(request)
 
 class CertificateOCR:
     def __init__(self):
         self.supported_formats = ['.pdf', '.jpg', '.jpeg', '.png']
         
+        # Layout stage gating: LAYOUT_STAGE=auto runs LayoutLMv3 only when the
+        # pattern stage leaves required fields empty or OCR confidence is low
+        self.layout_stage_mode = os.getenv('LAYOUT_STAGE', 'auto').lower()
+        self.required_fields = [
+            field.strip() for field in os.getenv('REQUIRED_FIELDS', 'name,roll_no,certificate_id').split(',')
+            if field.strip()
+        ]
+        self.layout_confidence_threshold = float(os.getenv('LAYOUT_CONFIDENCE_THRESHOLD', 75.0))
+        
+        # Resample every upload to a common text height / pixel budget (NORMALIZE_MODE etc.)
+        self.normalizer = ResolutionNormalizer()
+        
+        # Long-lived Tesseract instances when tesserocr is available (OCR_ENGINE=auto|pool|subprocess)
+        self.ocr_engine = create_ocr_engine()
+        
+        # Known institution layouts: OCR only the field regions (LAYOUT_TEMPLATE_DIR)
+        self.templates = LayoutTemplateRegistry()
+        
+        # Multi-page PDFs: text layer where present, rasterize + OCR the rest (PDF_* settings)
+        self.pdf_reader = PdfPageReader()
+    
+    def warm_up(self) -> bool:
+        """
+        Load the OCR engine and the LayoutLMv3 model ahead of the first request
+        """
+        self.ocr_engine.warm_up()
+        model_registry.get('layoutlmv3')
+        return True
+        
+    def config_fingerprint(self) -> Dict:
+        """
+        The settings that change what the pipeline extracts, for the result cache key
+        """
+        return {
+            'normalize': {
+                'mode': self.normalizer.mode,
+                'target_text_height': self.normalizer.target_text_height,
+                'max_megapixels': self.normalizer.max_megapixels,
+                'max_upscale': self.normalizer.max_upscale
+            },
+            'layout_stage': self.layout_stage_mode,
+            'layout_confidence_threshold': self.layout_confidence_threshold,
+            'required_fields': self.required_fields,
+            'ocr_engine': self.ocr_engine.name,
+            'templates': {
+                'digest': self.templates.digest,
+                'max_distance': self.templates.max_distance,
+                'aspect_tolerance': self.templates.aspect_tolerance
+            },
+            'pdf': {
+                'render_dpi': self.pdf_reader.render_dpi,
+                'max_pages': self.pdf_reader.max_pages,
+                'text_layer_min_chars': self.pdf_reader.text_layer_min_chars
+            }
+        }
+        
     def preprocess_image(self, image: np.ndarray) -> np.ndarray:
         """
         Preprocess image using OpenCV for better OCR accuracy
@@ -64,32 +152,27 @@ class CertificateOCR:
         kernel = np.ones((2, 2), np.uint8)
         cleaned = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, kernel)
         
-        # Deskew the image
-        coords = np.column_stack(np.where(cleaned > 0))
-        if len(coords) > 0:
-            angle = cv2.minAreaRect(coords)[-1]
-            if angle < -45:
-                angle = -(90 + angle)
-            else:
-                angle = -angle
-                
-            if abs(angle) > 0.5:  # Only rotate if angle is significant
-                (h, w) = cleaned.shape[:2]
-                center = (w // 2, h // 2)
-                M = cv2.getRotationMatrix2D(center, angle, 1.0)
-                cleaned = cv2.warpAffine(cleaned, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+        # Deskew the image (estimated on a downsampled copy with bounded memory)
+        angle = estimate_skew_angle(cleaned)
+        if abs(angle) > 0.5:  # Only rotate if angle is significant
+            (h, w) = cleaned.shape[:2]
+            center = (w // 2, h // 2)
+            M = cv2.getRotationMatrix2D(center, angle, 1.0)
+            cleaned = cv2.warpAffine(cleaned, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
         
         return cleaned
     
-    def extract_text_tesseract(self, image: np.ndarray) -> Dict:
+    def extract_text_tesseract(self, image: np.ndarray, psm: int = None, offset: tuple = (0, 0)) -> Dict:
         """
         Extract text using Tesseract OCR
-        """
-        # Configure Tesseract
-        custom_config = r'--oem 3 --psm 6 -c tessedit_char_whitelist=0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,:-/% '
         
-        # Extract text with bounding boxes
-        data = pytesseract.image_to_data(image, config=custom_config, output_type=pytesseract.Output.DICT)
+        Args:
+            image: Page (or region crop) to read
+            psm: Tesseract page segmentation mode (defaults to the engine's block mode)
+            offset: (left, top) of the crop on the page, added to the bounding boxes
+        """
+        # Extract text with bounding boxes (engine holds the Tesseract configuration)
+        data = self.ocr_engine.image_to_data(image, psm=psm)
         
         # Filter out low confidence text
         filtered_text = []
@@ -100,7 +183,10 @@ class CertificateOCR:
                     filtered_text.append({
                         'text': text,
                         'confidence': data['conf'][i],
-                        'bbox': [data['left'][i], data['top'][i], data['width'][i], data['height'][i]]
+                        'bbox': [
+                            data['left'][i] + offset[0], data['top'][i] + offset[1],
+                            data['width'][i], data['height'][i]
+                        ]
                     })
         
         return {
@@ -111,54 +197,86 @@ class CertificateOCR:
     def extract_fields_with_patterns(self, text: str) -> Dict:
         """
         Extract specific fields using regex patterns
+        Values keep the case of the OCR text; the hash normalizes case itself.
         """
-        fields = {
-            'name': None,
-            'roll_no': None,
-            'certificate_id': None,
-            'marks': None,
-            'institution': None
-        }
-        
-        # Patterns for different fields
-        patterns = {
-            'name': [
-                r'(?:name|student|candidate)[\s:]+([A-Za-z\s]{2,50})',
-                r'(?:this is to certify that)[\s]+([A-Za-z\s]{2,50})',
-                r'(?:mr\.|ms\.|miss)[\s]+([A-Za-z\s]{2,50})'
-            ],
-            'roll_no': [
-                r'(?:roll|reg|registration|student)[\s]*(?:no|number|id)[\s:]*([A-Z0-9]{4,20})',
-                r'(?:roll|reg)[\s]*:[\s]*([A-Z0-9]{4,20})',
-                r'([A-Z]{2}[0-9]{4,8})'
-            ],
-            'certificate_id': [
-                r'(?:certificate|cert)[\s]*(?:no|number|id)[\s:]*([A-Z0-9-]{4,30})',
-                r'(?:serial|ref)[\s]*(?:no|number)[\s:]*([A-Z0-9-]{4,30})',
-                r'(CERT-[A-Z0-9-]{4,20})'
-            ],
-            'marks': [
-                r'(?:marks|grade|score|percentage)[\s:]*([0-9]{1,3}\.?[0-9]*%?)',
-                r'(?:secured|obtained)[\s]*([0-9]{1,3}\.?[0-9]*%?)',
-                r'([0-9]{1,3}\.?[0-9]*%)'
-            ],
-            'institution': [
-                r'(?:university|college|institute|school)[\s]*(?:of)?[\s]*([A-Za-z\s]{5,100})',
-                r'(?:issued by|from)[\s]*([A-Za-z\s]{5,100})',
-                r'([A-Za-z\s]*(?:university|college|institute))'
-            ]
-        }
+        return field_engine.extract_values(text)
+    
+    def extract_field_matches(self, text: str) -> Dict:
+        """
+        Extract fields with the span and pattern priority of each match
+        """
+        return field_engine.extract(text)
+    
+    def ocr_confidence(self, ocr_data: Dict) -> float:
+        """
+        Mean Tesseract confidence of the kept words (0 when nothing was read)
+        """
+        structured_data = ocr_data['structured_data']
+        if not structured_data:
+            return 0
+        return sum([item['confidence'] for item in structured_data]) / len(structured_data)
+    
+    def estimate_layout_confidence(self, ocr_data: Dict) -> float:
+        """
+        Layout confidence derived from OCR confidence, clamped to [60, 95]
+        """
+        if not ocr_data['structured_data']:
+            return 60.0
+        return min(95.0, max(60.0, self.ocr_confidence(ocr_data)))
+    
+    def plan_layout_stage(self, ocr_data: Dict, extracted_fields: Dict, has_image: bool = True) -> Dict:
+        """
+        Decide whether the LayoutLMv3 forward pass is worth running for a page
+        """
+        if not has_image:
+            return {'run': False, 'reason': 'no rasterized page (text layer only)'}
+        if self.layout_stage_mode == 'always':
+            return {'run': True, 'reason': 'layout stage forced on'}
+        if self.layout_stage_mode == 'never':
+            return {'run': False, 'reason': 'layout stage disabled'}
         
-        text_lower = text.lower()
+        missing = [field for field in self.required_fields if not extracted_fields.get(field)]
+        if missing:
+            return {'run': True, 'reason': f"missing fields: {', '.join(missing)}"}
         
-        for field, field_patterns in patterns.items():
-            for pattern in field_patterns:
-                match = re.search(pattern, text_lower, re.IGNORECASE)
-                if match and not fields[field]:
-                    fields[field] = match.group(1).strip()
-                    break
+        base_confidence = self.ocr_confidence(ocr_data)
+        if base_confidence < self.layout_confidence_threshold:
+            return {
+                'run': True,
+                'reason': f"ocr confidence {base_confidence:.1f} below {self.layout_confidence_threshold:g}"
+            }
         
-        return fields
+        return {'run': False, 'reason': 'pattern extraction found all required fields'}
+    
+    def skip_layout_stage(self, ocr_data: Dict) -> Dict:
+        """
+        Layout result for a page that does not need the LayoutLMv3 pass
+        """
+        return {
+            'layout_confidence': self.estimate_layout_confidence(ocr_data),
+            'enhanced_extraction': False
+        }
+    
+    def run_layout_stage(self, image: Image.Image, ocr_data: Dict, extracted_fields: Dict) -> Dict:
+        """
+        Run LayoutLMv3 only when the scheduler asks for it, recording the path taken
+        """
+        plan = self.plan_layout_stage(ocr_data, extracted_fields, image is not None)
+        if plan['run']:
+            with timed_stage('layout'):
+                layout_result = self.process_with_layoutlmv3(image, ocr_data)
+        else:
+            layout_result = self.skip_layout_stage(ocr_data)
+        return self._record_layout_stage(layout_result, plan)
+    
+    def _record_layout_stage(self, layout_result: Dict, plan: Dict) -> Dict:
+        if not plan['run']:
+            stage = 'skipped'
+        elif layout_result['enhanced_extraction']:
+            stage = 'layoutlmv3'
+        else:
+            stage = 'layoutlmv3_failed'
+        return {**layout_result, 'layout_stage': stage, 'layout_stage_reason': plan['reason']}
     
     def process_with_layoutlmv3(self, image: Image.Image, ocr_data: Dict) -> Dict:
         """
@@ -166,9 +284,18 @@ class CertificateOCR:
         Note: This is a simplified implementation. In production, you'd need a model
         specifically fine-tuned for certificate layout understanding.
         """
+        return self.process_with_layoutlmv3_batch([image], [ocr_data])[0]
+    
+    def process_with_layoutlmv3_batch(self, images: List[Image.Image], ocr_data_list: List[Dict]) -> List[Dict]:
+        """
+        Run LayoutLMv3 over several pages in one padded forward pass
+        """
         try:
-            # Prepare inputs for LayoutLMv3
-            encoding = processor(image, return_tensors="pt")
+            import torch
+            processor, model = model_registry.get('layoutlmv3')
+            
+            # Prepare padded inputs for LayoutLMv3
+            encoding = processor(images, return_tensors="pt", padding=True, truncation=True)
             
             # Run inference
             with torch.no_grad():
@@ -176,85 +303,282 @@ class CertificateOCR:
             
             # For demo purposes, we'll use the OCR confidence as layout confidence
             # In a real implementation, you'd process the LayoutLMv3 outputs properly
-            layout_confidence = min(95.0, max(60.0, 
-                sum([item['confidence'] for item in ocr_data['structured_data']]) / 
-                len(ocr_data['structured_data']) if ocr_data['structured_data'] else 60.0
-            ))
-            
-            return {
-                'layout_confidence': layout_confidence,
+            return [{
+                'layout_confidence': self.estimate_layout_confidence(ocr_data),
                 'enhanced_extraction': True
-            }
+            } for ocr_data in ocr_data_list]
         except Exception as e:
             print(f"LayoutLMv3 processing error: {e}")
-            return {
+            return [{
                 'layout_confidence': 70.0,
                 'enhanced_extraction': False
-            }
+            } for _ in ocr_data_list]
     
     def generate_hash(self, extracted_data: Dict) -> str:
         """
         Generate SHA-256 hash of normalized extracted data
         """
-        # Normalize the data for consistent hashing
-        normalized_data = {
-            'name': extracted_data.get('name', '').strip().upper(),
-            'roll_no': extracted_data.get('roll_no', '').strip().upper(),
-            'certificate_id': extracted_data.get('certificate_id', '').strip().upper(),
-            'marks': extracted_data.get('marks', '').strip(),
-            'institution': extracted_data.get('institution', '').strip().upper()
+        # Fields that were not found are None and hash as empty strings
+        return canonical_hash(extracted_data)
+    
+    def extract_with_template(self, page: np.ndarray, match: Dict) -> Dict:
+        """
+        OCR only the field regions of a page that matched a layout template
+        
+        Returns:
+            {'ocr_result', 'fields', 'covered_fields', 'template'}; 'fields' is None
+            when a region came back empty, in which case the caller falls back to
+            full-page OCR; 'covered_fields' lists the fields the template has regions for
+        """
+        template = match['template']
+        structured_data = []
+        # The template's institution name is only reported; the hashed value is read
+        # from the page, like every other field
+        fields = {field: None for field in FIELD_PATTERNS}
+        
+        for field, (left, top, width, height) in self.templates.field_regions(template, page.shape).items():
+            crop = page[top:top + height, left:left + width]
+            region = self.extract_text_tesseract(crop, psm=SINGLE_LINE_PSM, offset=(left, top))
+            structured_data.extend(region['structured_data'])
+            fields[field] = self.templates.field_value(template, field, region['raw_text'])
+        
+        empty = [field for field in template['fields'] if not fields[field]]
+        info = {
+            'id': template['id'],
+            'institution': template['institution'],
+            'distance': match['distance'],
+            'roi_ocr': not empty
         }
+        if empty:
+            info['fallback_reason'] = f"empty field regions: {', '.join(empty)}"
         
-        # Create JSON string and hash it
-        json_string = json.dumps(normalized_data, sort_keys=True)
-        return hashlib.sha256(json_string.encode()).hexdigest()
+        return {
+            'ocr_result': {
+                'raw_text': ' '.join(item['text'] for item in structured_data),
+                'structured_data': structured_data
+            },
+            'fields': None if empty else fields,
+            'covered_fields': list(template['fields']),
+            'template': info
+        }
     
-    def process_certificate(self, image_data: bytes) -> Dict:
+    def ocr_page(self, image: np.ndarray) -> Dict:
         """
-        Main processing pipeline
+        Normalize, preprocess and OCR a single BGR page
+        
+        Pages matching a layout template are read region by region and come back
+        with 'template_fields'; other pages get full-page OCR. When the template
+        lacks a region for some field, the page is OCRed in full as well and those
+        fields are pattern-extracted ('pattern_matches', also in 'template_fields').
         """
-        try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                raise ValueError("Could not decode image")
-            
-            # Step 1: Preprocess image
+        # Step 0: Normalize resolution so per-page cost does not depend on capture DPI
+        with timed_stage('normalize'):
+            image, normalization = self.normalizer.normalize(image)
+        
+        # Step 1: Preprocess image
+        with timed_stage('preprocess'):
             preprocessed = self.preprocess_image(image)
+        
+        # Step 2: Extract text with Tesseract, only in the field regions for known layouts
+        template_result = None
+        with timed_stage('template_ocr'):
+            match = self.templates.match(preprocessed)
+            if match:
+                template_result = self.extract_with_template(preprocessed, match)
+        
+        template_fields = template_result['fields'] if template_result else None
+        uncovered = []
+        if template_fields:
+            # Fields the template has no region for are read as without a template,
+            # so the certificate hashes the same whichever path it took
+            uncovered = [field for field in TEMPLATE_FIELDS if field not in template_result['covered_fields']]
+        
+        if template_fields and not uncovered:
+            ocr_result = template_result['ocr_result']
+        else:
+            with timed_stage('ocr'):
+                ocr_result = self.extract_text_tesseract(preprocessed)
+        
+        pattern_matches = {}
+        if uncovered:
+            with timed_stage('fields'):
+                matches = self.extract_field_matches(ocr_result['raw_text'])
+            pattern_matches = {field: matches[field] for field in uncovered}
+            template_fields = {
+                **template_fields,
+                **{field: match['value'] if match else None for field, match in pattern_matches.items()}
+            }
+            template_result['template']['full_page_fields'] = uncovered
+        
+        return {
+            'image': Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB)),
+            'ocr_result': ocr_result,
+            'normalization': normalization,
+            'template': template_result['template'] if template_result else None,
+            'template_fields': template_fields,
+            'pattern_matches': pattern_matches
+        }
+    
+    def prepare_certificate(self, image_data: bytes) -> Dict:
+        """
+        Run the OpenCV, Tesseract and pattern stages (everything before LayoutLMv3)
+        
+        The result carries the StageTimings of these stages as 'timings'.
+        """
+        timings = StageTimings()
+        with timings.activate():
+            if is_pdf(image_data):
+                return {**self.prepare_pdf(image_data), 'timings': timings}
             
-            # Step 2: Extract text with Tesseract
-            ocr_result = self.extract_text_tesseract(preprocessed)
-            
-            # Step 3: Extract structured fields
-            extracted_fields = self.extract_fields_with_patterns(ocr_result['raw_text'])
+            # Decode within a fixed pixel budget; very large images decode at a reduced scale
+            budget_pixels = None
+            if self.normalizer.mode != 'off':
+                budget_pixels = int(self.normalizer.max_megapixels * 1_000_000)
+            with timed_stage('decode'):
+                image = decode_image(image_data, budget_pixels)
             
-            # Step 4: Process with LayoutLMv3 for enhanced accuracy
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            layout_result = self.process_with_layoutlmv3(pil_image, ocr_result)
+            # Steps 0-2: Normalize, preprocess and OCR
+            page = self.ocr_page(image)
             
-            # Step 5: Generate hash
+            # Step 3: Extract structured fields (already known when a template matched)
+            extracted_fields = page.pop('template_fields')
+            page.pop('pattern_matches')
+            if not extracted_fields:
+                with timed_stage('fields'):
+                    extracted_fields = self.extract_fields_with_patterns(page['ocr_result']['raw_text'])
+        
+        return {**page, 'extracted_fields': extracted_fields, 'timings': timings}
+    
+    def prepare_pdf(self, pdf_data: bytes) -> Dict:
+        """
+        Prepare a multi-page PDF: pages stream through the reader one at a time,
+        rasterized pages are OCRed in parallel and fields are merged across pages
+        """
+        pages = read_pages(self.pdf_reader.iter_pages(pdf_data), self.ocr_page)
+        if not pages:
+            raise ValueError("PDF has no pages")
+        
+        # Step 3: Extract fields per page, then keep the best match for each field;
+        # template fields outrank every pattern
+        with timed_stage('fields'):
+            extracted_fields = merge_page_fields([
+                {
+                    **{
+                        field: {'value': value, 'span': None, 'pattern': -1} if value else None
+                        for field, value in page['template_fields'].items()
+                    },
+                    # Fields the template does not cover compete as the patterns they came from
+                    **page['pattern_matches']
+                } if page.get('template_fields')
+                else self.extract_field_matches(page['ocr_result']['raw_text'])
+                for page in pages
+            ])
+        
+        first_ocr_page = next((page for page in pages if page['source'] == 'ocr'), None)
+        return {
+            'image': first_ocr_page['image'] if first_ocr_page else None,
+            'ocr_result': {
+                'raw_text': '\n'.join(page['ocr_result']['raw_text'] for page in pages),
+                'structured_data': [
+                    {**item, 'page': page['page']}
+                    for page in pages for item in page['ocr_result']['structured_data']
+                ]
+            },
+            'extracted_fields': extracted_fields,
+            'normalization': first_ocr_page['normalization'] if first_ocr_page else None,
+            'pages': {
+                'total': pages[0]['page_count'],
+                'processed': len(pages),
+                'text_layer': [page['page'] for page in pages if page['source'] == 'text_layer'],
+                'ocr': [page['page'] for page in pages if page['source'] == 'ocr'],
+                'templates': {page['page']: page['template']['id'] for page in pages if page.get('template')}
+            }
+        }
+    
+    def finalize_certificate(self, prepared: Dict, layout_result: Dict) -> Dict:
+        """
+        Hash the extracted fields and combine confidences into the final result
+        """
+        ocr_result = prepared['ocr_result']
+        extracted_fields = prepared['extracted_fields']
+        timings = prepared.get('timings') or StageTimings()
+        
+        # Step 5: Generate hash
+        with timings.stage('hash'):
             certificate_hash = self.generate_hash(extracted_fields)
+        
+        # Calculate overall confidence
+        base_confidence = self.ocr_confidence(ocr_result)
+        layout_confidence = layout_result['layout_confidence']
+        overall_confidence = (base_confidence * 0.6 + layout_confidence * 0.4)
+        
+        return {
+            'success': True,
+            'extracted_data': extracted_fields,
+            'hash': certificate_hash,
+            'confidence': round(overall_confidence, 2),
+            'raw_text': ocr_result['raw_text'],
+            'processing_info': {
+                'tesseract_confidence': round(base_confidence, 2),
+                'layout_confidence': round(layout_confidence, 2),
+                'enhanced_extraction': layout_result['enhanced_extraction'],
+                'layout_stage': layout_result.get('layout_stage'),
+                'layout_stage_reason': layout_result.get('layout_stage_reason'),
+                'normalization': prepared.get('normalization'),
+                'pages': prepared.get('pages'),
+                'template': prepared.get('template'),
+                'stage_ms': timings.breakdown()
+            },
+            'timestamp': datetime.now().isoformat()
+        }
+    
+    def complete_certificates(self, prepared_list: List[Dict]) -> List[Dict]:
+        """
+        Finish a micro-batch of prepared certificates with one LayoutLMv3 pass
+        over the pages the stage scheduler selects
+        """
+        plans = [
+            self.plan_layout_stage(
+                prepared['ocr_result'], prepared['extracted_fields'], prepared['image'] is not None
+            )
+            for prepared in prepared_list
+        ]
+        selected = [prepared for prepared, plan in zip(prepared_list, plans) if plan['run']]
+        start = time.perf_counter()
+        batch_results = iter(self.process_with_layoutlmv3_batch(
+            [prepared['image'] for prepared in selected],
+            [prepared['ocr_result'] for prepared in selected]
+        ) if selected else [])
+        # Every certificate in the micro-batch waited for the whole forward pass
+        layout_seconds = time.perf_counter() - start
+        for prepared in selected:
+            if prepared.get('timings'):
+                prepared['timings'].add('layout', layout_seconds)
+        
+        results = []
+        for prepared, plan in zip(prepared_list, plans):
+            if plan['run']:
+                layout_result = next(batch_results)
+            else:
+                layout_result = self.skip_layout_stage(prepared['ocr_result'])
+            results.append(self.finalize_certificate(prepared, self._record_layout_stage(layout_result, plan)))
+        return results
+    
+    def process_certificate(self, image_data: bytes) -> Dict:
+        """
+        Main processing pipeline
+        """
+        try:
+            # Steps 1-3: OpenCV, Tesseract and pattern extraction
+            prepared = self.prepare_certificate(image_data)
             
-            # Calculate overall confidence
-            base_confidence = sum([item['confidence'] for item in ocr_result['structured_data']]) / len(ocr_result['structured_data']) if ocr_result['structured_data'] else 0
-            layout_confidence = layout_result['layout_confidence']
-            overall_confidence = (base_confidence * 0.6 + layout_confidence * 0.4)
+            # Step 4: Process with LayoutLMv3 when the pattern stage needs help
+            with prepared['timings'].activate():
+                layout_result = self.run_layout_stage(
+                    prepared['image'], prepared['ocr_result'], prepared['extracted_fields']
+                )
             
-            return {
-                'success': True,
-                'extracted_data': extracted_fields,
-                'hash': certificate_hash,
-                'confidence': round(overall_confidence, 2),
-                'raw_text': ocr_result['raw_text'],
-                'processing_info': {
-                    'tesseract_confidence': round(base_confidence, 2),
-                    'layout_confidence': round(layout_confidence, 2),
-                    'enhanced_extraction': layout_result['enhanced_extraction']
-                },
-                'timestamp': datetime.now().isoformat()
-            }
+            return self.finalize_certificate(prepared, layout_result)
             
         except Exception as e:
             return {
@@ -266,30 +590,93 @@ class CertificateOCR:
 # Initialize OCR processor
 ocr_processor = CertificateOCR()
 
+# Run the pipeline off the event loop (OCR_EXECUTION_MODE=thread|process); thread mode
+# runs ocr_processor itself rather than a second copy of its engine and templates
+ocr_executor = OCRExecutor(CertificateOCR, warm_start=MODEL_WARMUP != 'lazy', processor=ocr_processor)
+
+# Repeat uploads are answered from here (RESULT_CACHE_SIZE, RESULT_CACHE_DIR, RESULT_CACHE_DISK_MB)
+result_cache = ResultCache(PIPELINE_VERSION, ocr_processor.config_fingerprint())
+
+@app.on_event("startup")
+async def start_ocr_executor():
+    if not OCR_ENABLED:
+        print("Running in verify-only mode; OCR endpoints are disabled")
+        return
+    ocr_executor.start()
+    if MODEL_WARMUP != 'lazy':
+        asyncio.create_task(ocr_executor.warm_up())
+
+@app.on_event("shutdown")
+async def stop_ocr_executor():
+    ocr_executor.shutdown()
+
 @app.get("/")
 async def root():
     return {"message": "Certificate OCR API is running", "version": "1.0.0"}
 
+def readiness() -> Dict:
+    """
+    Whether the server can process certificates right now
+    """
+    if not OCR_ENABLED:
+        return {"ready": True, "mode": SERVER_MODE}
+    
+    executor_info = ocr_executor.info()
+    status = {
+        "ready": executor_info['ready'] or (MODEL_WARMUP == 'lazy' and executor_info['running']),
+        "mode": SERVER_MODE,
+        "executor": executor_info,
+        "degraded": executor_info['warm_up_error'] is not None,
+        # Process-mode workers build their engine from the same OCR_ENGINE setting
+        "ocr_engine": (ocr_executor.processor or ocr_processor).ocr_engine.name
+    }
+    if ocr_executor.mode == 'thread':
+        # In process mode the models live in the workers, not in this process
+        status["models"] = model_registry.status()['models']
+    return status
+
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "timestamp": datetime.now().isoformat()}
+    """
+    Liveness (the process is serving requests) plus readiness (models are loaded)
+    """
+    return {
+        "status": "healthy",
+        "live": True,
+        "readiness": readiness(),
+        "timestamp": datetime.now().isoformat()
+    }
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness probe: 503 until the OCR pipeline can serve requests
+    """
+    status = readiness()
+    if not status["ready"]:
+        raise HTTPException(status_code=503, detail=status)
+    return status
 
 @app.post("/process-certificate")
 async def process_certificate(file: UploadFile = File(...)):
     """
     Process uploaded certificate and extract structured data
     """
-    # Validate file type
-    if not file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.pdf')):
-        raise HTTPException(status_code=400, detail="Unsupported file format")
+    if not OCR_ENABLED:
+        raise HTTPException(status_code=503, detail="OCR is disabled in verify-only mode")
     
-    # Check file size (10MB limit)
-    contents = await file.read()
-    if len(contents) > 10 * 1024 * 1024:
-        raise HTTPException(status_code=400, detail="File too large (max 10MB)")
+    # Validate file type (by magic bytes) and size (10MB limit) while reading in chunks
+    _, contents = await read_upload(file)
     
-    # Process the certificate
-    result = ocr_processor.process_certificate(contents)
+    # Process the certificate on the OCR pool unless these exact bytes were seen before
+    # Off the event loop: a lookup hashes the upload and may read the disk tier
+    result = await asyncio.to_thread(result_cache.get, contents)
+    cached = result is not None
+    if not cached:
+        result = await ocr_executor.process_certificate(contents)
+        await asyncio.to_thread(result_cache.put, contents, result)
+        if result['success']:
+            observe_stages(result['processing_info'].get('stage_ms'))
     
     if not result['success']:
         raise HTTPException(status_code=500, detail=f"Processing failed: {result['error']}")
@@ -300,9 +687,45 @@ async def process_certificate(file: UploadFile = File(...)):
         "hash": result['hash'],
         "confidence": result['confidence'],
         "processing_info": result['processing_info'],
+        "cached": cached,
         "timestamp": result['timestamp']
     }
 
+@app.post("/process-certificates/batch")
+async def process_certificates_batch(files: List[UploadFile] = File(...)):
+    """
+    Process many certificates (or zip archives of them) and stream one NDJSON line per file
+    """
+    if not OCR_ENABLED:
+        raise HTTPException(status_code=503, detail="OCR is disabled in verify-only mode")
+    
+    uploads, unreadable = await read_uploads(files)
+    accepted, rejected = expand_uploads(uploads)
+    
+    async def stream_results():
+        for result in unreadable + rejected:
+            yield json.dumps(result) + "\n"
+        async for result in process_batch(ocr_executor, accepted, cache=result_cache):
+            if result['success'] and not result['cached']:
+                observe_stages(result['processing_info'].get('stage_ms'))
+            yield json.dumps(result) + "\n"
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """
+    Result cache hit/miss counters and tier sizes
+    """
+    return result_cache.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics_endpoint():
+    """
+    Stage latency histograms and database round-trip counters in the Prometheus text format
+    """
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
 @app.post("/verify-hash")
 async def verify_hash(hash_data: Dict):
     """
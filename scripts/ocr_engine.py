@@ -0,0 +1,192 @@
+"""
+OCR Engines for the Certificate OCR Backend
+A pool of long-lived in-process Tesseract instances, with the pytesseract
+subprocess engine kept as a fallback
+"""
+
+import os
+import queue
+import threading
+from typing import Dict
+
+import numpy as np
+
+TESSERACT_LANG = 'eng'
+TESSERACT_OEM = 3  # Default engine (LSTM when available)
+TESSERACT_PSM = 6  # Assume a single uniform block of text
+SINGLE_LINE_PSM = 7  # Field crops hold one line of text
+CHAR_WHITELIST = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz.,:-/%'
+
+OCR_ENGINES = ('auto', 'pool', 'subprocess')
+
+
+class SubprocessTesseractEngine:
+    """
+    pytesseract: writes the image to a temp file and runs one tesseract process per call
+    """
+    name = 'subprocess'
+
+    def warm_up(self):
+        pass
+
+    def image_to_data(self, image: np.ndarray, psm: int = None) -> Dict:
+        """
+        Word-level OCR output in pytesseract's Output.DICT layout
+        """
+        import pytesseract
+        config = f"--oem {TESSERACT_OEM} --psm {psm or TESSERACT_PSM} -c tessedit_char_whitelist={CHAR_WHITELIST}"
+        return pytesseract.image_to_data(image, lang=TESSERACT_LANG, config=config,
+                                         output_type=pytesseract.Output.DICT)
+
+    def info(self) -> Dict:
+        return {'engine': self.name}
+
+    def close(self):
+        pass
+
+
+class TesseractEnginePool:
+    """
+    Long-lived libtesseract instances (via tesserocr) that take in-memory buffers
+
+    Each instance loads the language data once and is reused across requests. An
+    instance is only used by one thread at a time; callers beyond `pool_size`
+    wait for one to be returned.
+    """
+    name = 'pool'
+
+    def __init__(self, pool_size: int = None):
+        """
+        Args:
+            pool_size: Maximum number of Tesseract instances (defaults to OCR_POOL_SIZE,
+                       then the CPU count); instances are created on demand
+        """
+        import tesserocr
+        self._tesserocr = tesserocr
+
+        self.pool_size = pool_size or int(
+            os.getenv('TESSERACT_POOL_SIZE', os.getenv('OCR_POOL_SIZE', os.cpu_count() or 1))
+        )
+        # LIFO so the most recently used (warm) instances are handed out first
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _create_instance(self):
+        api = self._tesserocr.PyTessBaseAPI(
+            lang=TESSERACT_LANG,
+            psm=TESSERACT_PSM,
+            oem=TESSERACT_OEM
+        )
+        api.SetVariable('tessedit_char_whitelist', CHAR_WHITELIST)
+        return api
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._create_instance()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        return self._idle.get()
+
+    def warm_up(self):
+        """
+        Create one instance ahead of the first request so language data is loaded
+        """
+        self._idle.put(self._acquire())
+
+    def image_to_data(self, image: np.ndarray, psm: int = None) -> Dict:
+        """
+        Word-level OCR output in pytesseract's Output.DICT layout
+        """
+        tesserocr = self._tesserocr
+        if len(image.shape) == 3:
+            image = image[:, :, ::-1]  # BGR -> RGB
+        image = np.ascontiguousarray(image, dtype=np.uint8)
+        height, width = image.shape[:2]
+        channels = 1 if len(image.shape) == 2 else image.shape[2]
+
+        data = {'text': [], 'conf': [], 'left': [], 'top': [], 'width': [], 'height': []}
+        api = self._acquire()
+        try:
+            if psm:
+                api.SetPageSegMode(psm)
+            api.SetImageBytes(image.tobytes(), width, height, channels, width * channels)
+            api.Recognize()
+
+            iterator = api.GetIterator()
+            if iterator is not None:
+                level = tesserocr.RIL.WORD
+                for word in tesserocr.iterate_level(iterator, level):
+                    box = word.BoundingBox(level)
+                    if box is None:
+                        continue
+                    left, top, right, bottom = box
+                    data['text'].append(word.GetUTF8Text(level) or '')
+                    data['conf'].append(word.Confidence(level))
+                    data['left'].append(left)
+                    data['top'].append(top)
+                    data['width'].append(right - left)
+                    data['height'].append(bottom - top)
+        finally:
+            if psm:
+                api.SetPageSegMode(TESSERACT_PSM)
+            api.Clear()
+            self._idle.put(api)
+
+        return data
+
+    def info(self) -> Dict:
+        return {
+            'engine': self.name,
+            'pool_size': self.pool_size,
+            'instances': self._created,
+            'idle': self._idle.qsize()
+        }
+
+    def close(self):
+        """
+        Release the idle instances (instances still in use are left alone)
+        """
+        while True:
+            try:
+                api = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            api.End()
+            with self._lock:
+                self._created -= 1
+
+
+def create_ocr_engine(engine: str = None):
+    """
+    Build the OCR engine selected by OCR_ENGINE
+
+    'pool' requires tesserocr; 'auto' (default) uses it when it is installed
+    and falls back to the subprocess engine otherwise.
+    """
+    engine = (engine or os.getenv('OCR_ENGINE', 'auto')).lower()
+    if engine not in OCR_ENGINES:
+        raise ValueError(f"Unknown OCR engine: {engine}")
+
+    if engine == 'subprocess':
+        return SubprocessTesseractEngine()
+
+    try:
+        return TesseractEnginePool()
+    except ImportError:
+        if engine == 'pool':
+            raise
+        print("tesserocr is not installed; using the subprocess Tesseract engine")
+        return SubprocessTesseractEngine()
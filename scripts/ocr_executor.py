@@ -0,0 +1,259 @@
+"""
+OCR Execution Pool for the Certificate OCR Backend
+Runs the CPU-bound OCR pipeline off the event loop, in threads or worker processes
+"""
+
+import os
+import asyncio
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, Optional, Tuple
+
+EXECUTION_MODES = ('thread', 'process')
+
+# Per-process OCR processor, created once by the pool initializer
+_worker_processor = None
+
+# Why this worker's model warm-up failed, if it did (the worker still serves requests)
+_worker_warm_up_error: Optional[str] = None
+
+
+def _limit_native_threads(worker_threads: int):
+    """
+    Cap the thread pools used by OpenMP, OpenCV and torch inside this process
+    """
+    for var in ('OMP_NUM_THREADS', 'MKL_NUM_THREADS', 'OPENBLAS_NUM_THREADS'):
+        os.environ[var] = str(worker_threads)
+
+    try:
+        import cv2
+        cv2.setNumThreads(worker_threads)
+    except ImportError:
+        pass
+
+    try:
+        import torch
+        torch.set_num_threads(worker_threads)
+    except ImportError:
+        pass
+
+
+def _init_worker(processor_factory: Callable, worker_threads: int, warm_start: bool):
+    """
+    Pool initializer: build the OCR processor (and its model) once per worker
+    """
+    global _worker_processor, _worker_warm_up_error
+    _limit_native_threads(worker_threads)
+    _worker_processor = processor_factory()
+    if warm_start and hasattr(_worker_processor, 'warm_up'):
+        # An initializer that raises breaks the whole pool; without the model the
+        # pipeline still runs, with LayoutLMv3 falling back to pattern extraction
+        try:
+            _worker_processor.warm_up()
+        except Exception as e:
+            _worker_warm_up_error = str(e)
+            print(f"OCR worker {os.getpid()} warm-up failed: {e}")
+
+
+class OCRWorkerError(Exception):
+    """
+    An exception raised by a call in an OCR worker process, carried back as its message
+    """
+
+
+def _run_in_worker(method: str, args: tuple, kwargs: dict) -> Tuple[bool, object]:
+    """
+    Dispatch a call to the worker-local OCR processor
+
+    Returns (True, result) or (False, error message). Exceptions never travel back
+    themselves: one that cannot be unpickled in the parent (e.g. an exception class
+    whose __init__ needs other arguments) breaks the whole pool.
+    """
+    try:
+        return True, getattr(_worker_processor, method)(*args, **kwargs)
+    except Exception as e:
+        return False, str(e) or type(e).__name__
+
+
+def _worker_warm_up_status() -> Optional[str]:
+    """
+    The warm-up error recorded by this worker's initializer, or None
+    """
+    return _worker_warm_up_error
+
+
+class OCRExecutor:
+    def __init__(self, processor_factory: Callable, mode: str = None,
+                 pool_size: int = None, worker_threads: int = None, warm_start: bool = True,
+                 processor=None):
+        """
+        Configure the OCR execution pool
+
+        Args:
+            processor_factory: Picklable callable returning a CertificateOCR
+            mode: 'thread' (shared processor, default) or 'process' (one processor per worker)
+            pool_size: Number of workers (defaults to the CPU count)
+            worker_threads: Native threads each worker may use for OpenCV/torch
+            warm_start: Load models when a worker process starts rather than on first use
+            processor: Existing CertificateOCR to run in thread mode instead of building
+                       another one (process mode always builds one per worker)
+        """
+        self.processor_factory = processor_factory
+        self.mode = (mode or os.getenv('OCR_EXECUTION_MODE', 'thread')).lower()
+        if self.mode not in EXECUTION_MODES:
+            raise ValueError(f"Unknown OCR execution mode: {self.mode}")
+
+        self.pool_size = pool_size or int(os.getenv('OCR_POOL_SIZE', os.cpu_count() or 1))
+        self.worker_threads = worker_threads or int(os.getenv('OCR_WORKER_THREADS', 1))
+        self.warm_start = warm_start
+        self.ready = False
+        self.warm_up_error: Optional[str] = None
+
+        self._executor: Optional[Executor] = None
+        self._shared_processor = processor
+        self._processor = None
+
+    def start(self):
+        """
+        Create the underlying pool (idempotent)
+        """
+        if self._executor is not None:
+            return
+
+        if self.mode == 'process':
+            # spawn keeps torch/OpenMP state out of the children; fork is not safe here
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.pool_size,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker,
+                initargs=(self.processor_factory, self.worker_threads, self.warm_start),
+            )
+        else:
+            self._processor = self._shared_processor or self.processor_factory()
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.pool_size,
+                thread_name_prefix='ocr-worker',
+            )
+
+        print(f"OCR executor started: mode={self.mode}, pool_size={self.pool_size}, "
+              f"worker_threads={self.worker_threads}")
+
+    async def run(self, method: str, *args, **kwargs) -> Dict:
+        """
+        Run a CertificateOCR method on the pool without blocking the event loop
+
+        Raises:
+            OCRWorkerError: In process mode, for an exception raised in the worker
+        """
+        self.start()
+        loop = asyncio.get_running_loop()
+
+        if self.mode == 'process':
+            ok, result = await self._run_in_process(loop, _run_in_worker, method, args, kwargs)
+            if not ok:
+                raise OCRWorkerError(result)
+            return result
+
+        call = getattr(self._processor, method)
+        return await loop.run_in_executor(self._executor, lambda: call(*args, **kwargs))
+
+    async def _run_in_process(self, loop: asyncio.AbstractEventLoop, fn: Callable, *args):
+        """
+        Submit to the process pool, replacing it if a worker died
+
+        A worker that exits abruptly (killed for memory, a native crash) breaks the
+        pool and fails every pending call. The pool is rebuilt and the call retried
+        once; a call that breaks the fresh pool too is raised to the caller.
+        """
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            self._replace_broken_pool(executor)
+
+        executor = self._executor
+        try:
+            return await loop.run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            self._replace_broken_pool(executor)
+            raise
+
+    def _replace_broken_pool(self, broken: Executor):
+        """
+        Swap a broken process pool for a new one (once, however many calls saw it break)
+        """
+        if self._executor is not broken:
+            return
+        print("OCR process pool broke; starting a new one")
+        broken.shutdown(wait=False)
+        self._executor = None
+        self.start()
+
+    async def process_certificate(self, *args, **kwargs) -> Dict:
+        """
+        Run the full certificate pipeline on the pool
+        """
+        return await self.run('process_certificate', *args, **kwargs)
+
+    async def warm_up(self):
+        """
+        Load models ahead of traffic and mark the executor ready
+
+        In process mode one call per worker is submitted so that every worker
+        is spawned (and loads its model in the initializer) up front.
+
+        A failed warm-up still marks the executor ready: requests are served
+        without LayoutLMv3 (enhanced_extraction false) and the error is kept in
+        warm_up_error for the readiness report.
+        """
+        self.start()
+        if self.mode == 'process':
+            loop = asyncio.get_running_loop()
+            errors = await asyncio.gather(*[
+                self._run_in_process(loop, _worker_warm_up_status) for _ in range(self.pool_size)
+            ], return_exceptions=True)
+            errors = [str(error) for error in errors if error]
+        else:
+            try:
+                await self.run('warm_up')
+                errors = []
+            except Exception as e:
+                errors = [str(e)]
+
+        self.warm_up_error = errors[0] if errors else None
+        self.ready = True
+        if self.warm_up_error:
+            print(f"OCR warm-up failed, serving without the layout model: {self.warm_up_error}")
+
+    @property
+    def processor(self):
+        """
+        The CertificateOCR the pool runs in thread mode (None in process mode or before start)
+        """
+        return self._processor
+
+    def info(self) -> Dict:
+        """
+        Describe the current pool configuration
+        """
+        return {
+            'mode': self.mode,
+            'pool_size': self.pool_size,
+            'worker_threads': self.worker_threads,
+            'running': self._executor is not None,
+            'ready': self.ready,
+            'warm_up_error': self.warm_up_error
+        }
+
+    def shutdown(self, wait: bool = True):
+        """
+        Stop the pool and release its workers
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+            self._processor = None
+            self.ready = False
+            self.warm_up_error = None
+            print("OCR executor stopped")
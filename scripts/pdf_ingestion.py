@@ -0,0 +1,188 @@
+"""
+PDF Ingestion for the Certificate OCR Backend
+Opens PDFs lazily, one page at a time, using the text layer when a page has one
+and OCRing the remaining pages in parallel
+"""
+
+import os
+import contextvars
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List, Optional
+
+import pypdfium2 as pdfium
+
+from metrics import timed_stage
+
+PDF_MAGIC = b'%PDF-'
+
+# pdfium is not thread-safe, not even across separate documents, and thread-mode
+# OCR workers read several PDFs at once; every pdfium call goes through this lock.
+# It is never held across a yield, so a slow consumer does not stall other requests.
+_pdfium_lock = threading.Lock()
+
+
+def is_pdf(data: bytes) -> bool:
+    """
+    True if the upload starts with the PDF signature
+    """
+    return data[:1024].lstrip().startswith(PDF_MAGIC)
+
+
+class PdfPageReader:
+    def __init__(self, render_dpi: int = None, max_pages: int = None, text_layer_min_chars: int = None):
+        """
+        Configure PDF page extraction
+
+        Args:
+            render_dpi: Resolution pages without a text layer are rasterized at
+            max_pages: Pages beyond this are ignored
+            text_layer_min_chars: Non-whitespace characters a page's text layer needs to
+                                  be used instead of OCR (0 always rasterizes)
+        """
+        self.render_dpi = render_dpi or int(os.getenv('PDF_RENDER_DPI', 200))
+        self.max_pages = max_pages or int(os.getenv('PDF_MAX_PAGES', 50))
+        self.text_layer_min_chars = (
+            text_layer_min_chars if text_layer_min_chars is not None
+            else int(os.getenv('PDF_TEXT_LAYER_MIN_CHARS', 20))
+        )
+
+    def iter_pages(self, data: bytes) -> Iterator[Dict]:
+        """
+        Yield pages in order, each either as text-layer text or as a BGR image
+
+        Only the page being yielded is loaded or rendered, so memory stays bounded
+        by how many yielded pages the caller keeps alive.
+
+        Yields:
+            {'page': 1-based number, 'page_count': pages in the document,
+             'text': str or None, 'image': np.ndarray or None}
+        """
+        # Opening, text-layer reads and rendering are timed as the 'render' stage
+        # (waits for _pdfium_lock included); time the caller spends on a page is not
+        with timed_stage('render'), _pdfium_lock:
+            document = pdfium.PdfDocument(data)
+            page_count = len(document)
+        try:
+            for index in range(min(page_count, self.max_pages)):
+                with timed_stage('render'):
+                    with _pdfium_lock:
+                        page = document[index]
+                    text = image = None
+                    try:
+                        text = self._text_layer(page)
+                        if text is None:
+                            with _pdfium_lock:
+                                bitmap = page.render(scale=self.render_dpi / 72)
+                                # Copy out of pdfium's buffer so the bitmap can be freed right away
+                                image = bitmap.to_numpy().copy()
+                                bitmap.close()
+                    finally:
+                        with _pdfium_lock:
+                            page.close()
+                yield {'page': index + 1, 'page_count': page_count, 'text': text, 'image': image}
+        finally:
+            with timed_stage('render'), _pdfium_lock:
+                document.close()
+
+    def _text_layer(self, page):
+        """
+        The page's embedded text, or None when it is missing or too sparse to trust
+        """
+        if self.text_layer_min_chars <= 0:
+            return None
+
+        with _pdfium_lock:
+            textpage = page.get_textpage()
+            try:
+                text = textpage.get_text_range()
+            finally:
+                textpage.close()
+
+        if len(''.join(text.split())) < self.text_layer_min_chars:
+            return None
+        return text
+
+
+def text_layer_result(text: str) -> Dict:
+    """
+    OCR-shaped result for a page read from its text layer (exact, so full confidence)
+    """
+    words = text.split()
+    return {
+        'raw_text': ' '.join(words),
+        'structured_data': [{'text': word, 'confidence': 100, 'bbox': None} for word in words]
+    }
+
+
+def read_pages(pages: Iterator[Dict], ocr_page: Callable[[object], Dict], workers: int = None) -> List[Dict]:
+    """
+    OCR rasterized pages on a thread pool while the next pages are being rendered
+
+    Rendering stays on the calling thread, and pdfium calls are serialized
+    process-wide (see _pdfium_lock), since pdfium is not thread-safe. At most
+    `workers` rendered pages are in flight, so a long document never holds more
+    than workers + 1 page bitmaps at once.
+
+    Args:
+        pages: Output of PdfPageReader.iter_pages
+        ocr_page: Callable taking a BGR page image and returning
+                  {'ocr_result': ..., 'image': ..., 'normalization': ...}
+        workers: Pages OCRed concurrently
+
+    Returns:
+        Per-page dicts in page order with 'page', 'page_count', 'source'
+        ('text_layer' or 'ocr') and 'ocr_result', plus 'normalization' for OCRed
+        pages and 'image' for the first of them
+    """
+    workers = workers or int(os.getenv('PDF_PAGE_WORKERS', min(4, os.cpu_count() or 1)))
+    results = []
+    in_flight = deque()
+
+    def collect(page_number, page_count, future):
+        result = future.result()
+        # Only the first rasterized page is kept as an image (the layout stage input)
+        if any('image' in kept for kept in results):
+            result.pop('image', None)
+        results.append({'page': page_number, 'page_count': page_count, 'source': 'ocr', **result})
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for page in pages:
+            if page['text'] is not None:
+                results.append({
+                    'page': page['page'],
+                    'page_count': page['page_count'],
+                    'source': 'text_layer',
+                    'ocr_result': text_layer_result(page['text'])
+                })
+                continue
+
+            if len(in_flight) >= workers:
+                collect(*in_flight.popleft())
+            # In a copy of this context, so the page's stage timings reach the request's
+            context = contextvars.copy_context()
+            in_flight.append((page['page'], page['page_count'], pool.submit(context.run, ocr_page, page['image'])))
+
+        while in_flight:
+            collect(*in_flight.popleft())
+
+    return sorted(results, key=lambda result: result['page'])
+
+
+def merge_page_fields(page_matches: List[Optional[Dict]]) -> Dict[str, Optional[str]]:
+    """
+    Merge per-page FieldExtractionEngine.extract results into one set of values
+
+    Keeps the single-text rule: the highest-priority pattern that matched on any
+    page wins, and ties go to the earliest page.
+    """
+    merged = {}
+    for matches in page_matches:
+        for field, match in matches.items():
+            best = merged.get(field)
+            if match and (best is None or match['pattern'] < best['pattern']):
+                merged[field] = match
+            elif field not in merged:
+                merged[field] = None
+    return {field: match['value'] if match else None for field, match in merged.items()}
@@ -0,0 +1,304 @@
+"""
+Bulk Registry Import
+Streams an institution's certificate registry (CSV or JSONL) into the database:
+canonical hashes are computed in worker processes, records are written in
+unordered batches, duplicates are reported without aborting and
+an interrupted import resumes from its checkpoint
+"""
+
+import os
+import csv
+import json
+import hashlib
+import multiprocessing
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import certificate_document, create_database
+from field_extraction import canonical_hashes
+
+REGISTRY_FORMATS = ('csv', 'jsonl')
+REGISTRY_FIELDS = ('name', 'roll_no', 'certificate_id', 'marks', 'institution')
+# A row without these cannot identify a certificate
+REQUIRED_FIELDS = ('name', 'certificate_id')
+
+REGISTRY_IMPORT_BATCH_SIZE = int(os.getenv('REGISTRY_IMPORT_BATCH_SIZE', 1000))
+REGISTRY_IMPORT_WORKERS = int(os.getenv('REGISTRY_IMPORT_WORKERS', min(4, os.cpu_count() or 1)))
+# Duplicate and invalid rows listed in the summary (all are counted)
+REGISTRY_IMPORT_MAX_REPORTED = int(os.getenv('REGISTRY_IMPORT_MAX_REPORTED', 100))
+
+CHECKPOINT_VERSION = 1
+
+
+def registry_format(filename: Optional[str], head: bytes) -> str:
+    """
+    'jsonl' or 'csv', from the file extension or else the first non-blank byte
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return 'jsonl'
+    if extension == '.csv':
+        return 'csv'
+    return 'jsonl' if head.lstrip(b'\xef\xbb\xbf \t\r\n').startswith(b'{') else 'csv'
+
+
+def source_fingerprint(path: str) -> Dict:
+    """
+    Size and leading-bytes digest, so a checkpoint is never applied to a different file
+    """
+    with open(path, 'rb') as f:
+        head = f.read(64 * 1024)
+    return {'size': os.path.getsize(path), 'head_sha256': hashlib.sha256(head).hexdigest()}
+
+
+def iter_records(path: str, file_format: str) -> Iterator[Tuple[int, Optional[Dict], Optional[str]]]:
+    """
+    Stream a registry file as (line number, record, error); record is None when the row is invalid
+    """
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        if file_format == 'csv':
+            reader = csv.DictReader(f)
+            if reader.fieldnames:
+                reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+            for row in reader:
+                yield reader.line_num, *_validate(row)
+        else:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                try:
+                    row = json.loads(line)
+                except ValueError:
+                    yield line_number, None, "invalid JSON"
+                    continue
+                if not isinstance(row, dict):
+                    yield line_number, None, "not a JSON object"
+                    continue
+                yield line_number, *_validate(row)
+
+
+def _validate(row: Dict) -> Tuple[Optional[Dict], Optional[str]]:
+    record = {}
+    for field in REGISTRY_FIELDS:
+        value = row.get(field)
+        record[field] = (str(value).strip() or None) if value is not None else None
+    missing = [field for field in REQUIRED_FIELDS if not record[field]]
+    if missing:
+        return None, f"missing {', '.join(missing)}"
+    return record, None
+
+
+class RegistryImport:
+    def __init__(self, db, path: str, file_format: str = None, checkpoint_path: str = None,
+                 batch_size: int = None, workers: int = None, uploaded_by: str = 'registry-import'):
+        """
+        One import of a registry file
+
+        Args:
+            db: Storage backend (CertificateStore) to write through
+            path: CSV or JSONL registry file
+            file_format: 'csv' or 'jsonl' (detected when None)
+            checkpoint_path: Progress file ('<path>.checkpoint.json' when None)
+            batch_size: Records per insert_certificates call (REGISTRY_IMPORT_BATCH_SIZE)
+            workers: Hashing processes (REGISTRY_IMPORT_WORKERS; 1 hashes inline)
+            uploaded_by: Recorded on every imported certificate
+        """
+        self.db = db
+        self.path = path
+        if file_format is None:
+            with open(path, 'rb') as f:
+                file_format = registry_format(path, f.read(1024))
+        if file_format not in REGISTRY_FORMATS:
+            raise ValueError(f"Unsupported registry format: {file_format}")
+        self.file_format = file_format
+        self.checkpoint_path = checkpoint_path or f"{path}.checkpoint.json"
+        self.batch_size = batch_size or REGISTRY_IMPORT_BATCH_SIZE
+        self.workers = workers or REGISTRY_IMPORT_WORKERS
+        self.uploaded_by = uploaded_by
+
+        self.progress = {
+            'status': 'pending',
+            'source': os.path.basename(path),
+            'format': file_format,
+            'records': 0,
+            'inserted': 0,
+            'duplicates': 0,
+            'invalid': 0,
+            'failed': 0,
+            'resumed_from': 0,
+            'duplicate_rows': [],
+            'invalid_rows': []
+        }
+
+    def load_checkpoint(self, fingerprint: Dict) -> bool:
+        """
+        Restore progress from the checkpoint file if it belongs to this source
+
+        Raises:
+            ValueError: If the checkpoint was written for a different file
+        """
+        try:
+            with open(self.checkpoint_path) as f:
+                checkpoint = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        if checkpoint.get('version') != CHECKPOINT_VERSION or checkpoint.get('fingerprint') != fingerprint:
+            raise ValueError(f"Checkpoint {self.checkpoint_path} is for a different file; remove it to restart")
+        self.progress.update(checkpoint['progress'])
+        self.progress['resumed_from'] = self.progress['records']
+        return True
+
+    def save_checkpoint(self, fingerprint: Dict):
+        tmp_path = f"{self.checkpoint_path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': CHECKPOINT_VERSION, 'fingerprint': fingerprint, 'progress': self.progress}, f)
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _batches(self, skip: int) -> Iterator[Dict]:
+        """
+        Group records into batches, after skipping those a previous run finished
+        """
+        batch = {'rows': [], 'invalid': [], 'consumed': 0}
+        for index, (line_number, record, error) in enumerate(iter_records(self.path, self.file_format)):
+            if index < skip:
+                continue
+            batch['consumed'] += 1
+            if record is None:
+                batch['invalid'].append({'line': line_number, 'error': error})
+            else:
+                batch['rows'].append((line_number, record))
+            if len(batch['rows']) >= self.batch_size:
+                yield batch
+                batch = {'rows': [], 'invalid': [], 'consumed': 0}
+        if batch['consumed']:
+            yield batch
+
+    def _report(self, key: str, row: Dict):
+        if len(self.progress[key]) < REGISTRY_IMPORT_MAX_REPORTED:
+            self.progress[key].append(row)
+
+    def _write(self, batch: Dict, hashes: List[str]):
+        """
+        Insert one batch unordered; duplicate-key errors are counted, not raised
+        """
+        documents = [
+            certificate_document({
+                **record,
+                'hash': hash_value,
+                'confidence': 100.0,
+                'filename': self.progress['source'],
+                'uploaded_by': self.uploaded_by,
+                'processing_info': {'source': 'registry_import', 'line': line_number},
+                'file_type': 'text/csv' if self.file_format == 'csv' else 'application/x-ndjson'
+            })
+            for (line_number, record), hash_value in zip(batch['rows'], hashes)
+        ]
+
+        # Unordered: every other document in the batch was still written
+        rejected = self.db.insert_certificates(documents)
+        for entry in rejected:
+            line_number, record = batch['rows'][entry['index']]
+            row = {'line': line_number, 'certificate_id': record['certificate_id'], 'hash': hashes[entry['index']]}
+            if entry['duplicate']:
+                self.progress['duplicates'] += 1
+                self._report('duplicate_rows', row)
+            else:
+                self.progress['failed'] += 1
+                self._report('invalid_rows', {**row, 'error': entry['error']})
+
+        for row in batch['invalid']:
+            self._report('invalid_rows', row)
+        self.progress['invalid'] += len(batch['invalid'])
+        self.progress['inserted'] += len(documents) - len(rejected)
+        self.progress['records'] += batch['consumed']
+
+    def run(self) -> Dict:
+        """
+        Import the file, checkpointing after every batch
+
+        A batch written just before a crash is not in the checkpoint; on resume
+        its records come back as duplicates, since hashes are unique.
+
+        Returns:
+            Progress summary; 'status' is 'completed' or 'failed'
+        """
+        started = datetime.now()
+        try:
+            fingerprint = source_fingerprint(self.path)
+            if self.load_checkpoint(fingerprint) and self.progress['status'] == 'completed':
+                return self.progress
+            self.progress['status'] = 'running'
+
+            batches = self._batches(self.progress['records'])
+            if self.workers <= 1:
+                for batch in batches:
+                    self._write(batch, canonical_hashes([record for _, record in batch['rows']]))
+                    self.save_checkpoint(fingerprint)
+            else:
+                # spawn: workers only need field_extraction, not this process's state
+                with ProcessPoolExecutor(max_workers=self.workers,
+                                         mp_context=multiprocessing.get_context('spawn')) as pool:
+                    # A few batches hash ahead of the writer; results are written in file order
+                    pending = deque()
+                    for batch in batches:
+                        pending.append((batch, pool.submit(canonical_hashes, [record for _, record in batch['rows']])))
+                        if len(pending) >= 2 * self.workers:
+                            done, future = pending.popleft()
+                            self._write(done, future.result())
+                            self.save_checkpoint(fingerprint)
+                    while pending:
+                        done, future = pending.popleft()
+                        self._write(done, future.result())
+                        self.save_checkpoint(fingerprint)
+
+            self.progress['status'] = 'completed'
+            self.save_checkpoint(fingerprint)
+
+        except Exception as e:
+            # Progress up to the last checkpointed batch is kept; rerun to resume
+            self.progress['status'] = 'failed'
+            self.progress['error'] = str(e)
+            print(f"Registry import of {self.path} failed: {e}")
+
+        self.progress['elapsed_seconds'] = round((datetime.now() - started).total_seconds(), 2)
+        return self.progress
+
+
+def main():
+    """
+    Import a registry file, resuming from its checkpoint if one exists:
+
+        python registry_import.py registry.csv --uploaded-by abc-university
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk import a certificate registry (CSV or JSONL)")
+    parser.add_argument('path', help="Registry file; CSV with a header row, or one JSON object per line")
+    parser.add_argument('--format', choices=REGISTRY_FORMATS, help="Detected from the file when omitted")
+    parser.add_argument('--batch-size', type=int, help="Records per write")
+    parser.add_argument('--workers', type=int, help="Hashing processes")
+    parser.add_argument('--uploaded-by', default='registry-import', help="Recorded on every certificate")
+    parser.add_argument('--checkpoint', help="Progress file (default <path>.checkpoint.json)")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    db = create_database()
+    try:
+        job = RegistryImport(db, args.path, args.format, args.checkpoint, args.batch_size,
+                             args.workers, args.uploaded_by)
+        if args.restart and os.path.exists(job.checkpoint_path):
+            os.remove(job.checkpoint_path)
+        result = job.run()
+    finally:
+        db.close_connection()
+
+    print(json.dumps(result, indent=2))
+    if result['status'] != 'completed':
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
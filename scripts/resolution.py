@@ -0,0 +1,128 @@
+"""
+Resolution Normalization for Certificate Scans
+Resamples each page so text has a target height and the pixel count stays bounded
+"""
+
+import os
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+
+NORMALIZATION_MODES = ('text-height', 'pixels', 'off')
+
+
+def shrink(image: np.ndarray, size: Tuple[int, int]) -> np.ndarray:
+    """
+    Area-averaged downscale to `size` (width, height)
+
+    Halves with INTER_AREA first, which OpenCV runs on a fast path for exact 2x
+    reductions (other factors are several times slower). The remaining step is
+    under 2x, where bilinear sampling does not alias.
+    """
+    target_width, target_height = size
+    while image.shape[1] // 2 >= target_width and image.shape[0] // 2 >= target_height:
+        image = cv2.resize(image, (image.shape[1] // 2, image.shape[0] // 2), interpolation=cv2.INTER_AREA)
+    if (image.shape[1], image.shape[0]) != (target_width, target_height):
+        image = cv2.resize(image, (target_width, target_height), interpolation=cv2.INTER_LINEAR)
+    return image
+
+
+def estimate_text_height(image: np.ndarray, max_dimension: int = 1600) -> Optional[float]:
+    """
+    Estimate the typical character height in pixels from connected components
+
+    Runs on an area-averaged copy no larger than max_dimension, so the cost is
+    roughly independent of the upload resolution.
+
+    Returns:
+        Median glyph height in original-image pixels, or None if no text was found
+    """
+    height, width = image.shape[:2]
+    factor = max(1.0, max(height, width) / max_dimension)
+    small = image
+    if factor > 1:
+        small = shrink(image, (max(1, round(width / factor)), max(1, round(height / factor))))
+    gray = cv2.cvtColor(small, cv2.COLOR_BGR2GRAY) if len(small.shape) == 3 else small
+
+    # Dark text on light paper becomes the foreground
+    _, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    small_height, small_width = binary.shape[:2]
+    heights = stats[1:count, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:count, cv2.CC_STAT_WIDTH]
+    areas = stats[1:count, cv2.CC_STAT_AREA]
+
+    # Keep glyph-like blobs: drop specks, rules, borders and photos
+    glyphs = (
+        (heights >= 3) & (heights <= small_height / 10) &
+        (widths <= small_width / 10) & (areas >= 4) &
+        (widths <= heights * 4)
+    )
+    if np.count_nonzero(glyphs) < 10:
+        return None
+
+    return float(np.median(heights[glyphs])) * factor
+
+
+class ResolutionNormalizer:
+    def __init__(self, mode: str = None, target_text_height: float = None, max_megapixels: float = None,
+                 max_upscale: float = None):
+        """
+        Configure resolution normalization
+
+        Args:
+            mode: 'text-height' (default) scales to a target glyph height, 'pixels' only
+                  enforces the pixel budget, 'off' disables the stage
+            target_text_height: Desired median glyph height in pixels
+            max_megapixels: Upper bound on the resampled page size
+            max_upscale: Largest enlargement applied to low-resolution captures
+        """
+        self.mode = (mode or os.getenv('NORMALIZE_MODE', 'text-height')).lower()
+        if self.mode not in NORMALIZATION_MODES:
+            raise ValueError(f"Unknown normalization mode: {self.mode}")
+
+        self.target_text_height = target_text_height or float(os.getenv('TARGET_TEXT_HEIGHT', 30))
+        self.max_megapixels = max_megapixels or float(os.getenv('NORMALIZE_MAX_MEGAPIXELS', 8))
+        self.max_upscale = max_upscale or float(os.getenv('NORMALIZE_MAX_UPSCALE', 2.0))
+
+    def normalize(self, image: np.ndarray) -> Tuple[np.ndarray, Dict]:
+        """
+        Resample an image to the deployment's target resolution
+
+        Returns:
+            Tuple of (resampled image, normalization info for processing_info)
+        """
+        height, width = image.shape[:2]
+        info = {
+            'mode': self.mode,
+            'original_size': [width, height],
+            'text_height': None,
+            'scale': 1.0
+        }
+        if self.mode == 'off':
+            return image, info
+
+        scale = 1.0
+        if self.mode == 'text-height':
+            text_height = estimate_text_height(image)
+            if text_height:
+                info['text_height'] = round(text_height, 1)
+                scale = min(self.target_text_height / text_height, self.max_upscale)
+
+        # Never exceed the pixel budget, whatever the text height suggests
+        budget_scale = (self.max_megapixels * 1_000_000 / (width * height)) ** 0.5
+        scale = min(scale, budget_scale)
+
+        # Small corrections are not worth a resample
+        if abs(scale - 1.0) < 0.1:
+            return image, info
+
+        new_size = (max(1, round(width * scale)), max(1, round(height * scale)))
+        info['scale'] = round(scale, 3)
+        info['normalized_size'] = list(new_size)
+
+        if scale >= 1.0:
+            return cv2.resize(image, new_size, interpolation=cv2.INTER_CUBIC), info
+        return shrink(image, new_size), info
@@ -0,0 +1,178 @@
+"""
+Content-Addressed Result Cache for the Certificate OCR Backend
+Caches pipeline results by SHA-256 of the uploaded bytes, the pipeline version and
+a fingerprint of the pipeline configuration
+"""
+
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Optional
+
+
+class ResultCache:
+    def __init__(self, pipeline_version: str, config: Dict = None, max_entries: int = None,
+                 disk_dir: str = None, disk_max_bytes: int = None):
+        """
+        Create a two-tier (memory LRU + optional disk) result cache
+
+        Args:
+            pipeline_version: Mixed into every key so pipeline changes invalidate old results
+            config: Settings that change results (CertificateOCR.config_fingerprint); their
+                    digest is mixed into every key, so a restart with other settings (or
+                    another server sharing the disk tier) never reuses results
+            max_entries: In-memory LRU capacity (0 disables the memory tier)
+            disk_dir: Directory for the on-disk tier (disabled when not set)
+            disk_max_bytes: Disk tier budget; least recently used files are evicted past it
+        """
+        self.pipeline_version = pipeline_version
+        self.config_digest = hashlib.sha256(
+            json.dumps(config or {}, sort_keys=True).encode()
+        ).hexdigest()[:16]
+        self.max_entries = max_entries if max_entries is not None else int(os.getenv('RESULT_CACHE_SIZE', 256))
+        self.disk_dir = disk_dir or os.getenv('RESULT_CACHE_DIR')
+        self.disk_max_bytes = disk_max_bytes or int(os.getenv('RESULT_CACHE_DISK_MB', 512)) * 1024 * 1024
+
+        self._memory: OrderedDict = OrderedDict()
+        self._disk_index: OrderedDict = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self._counters = {
+            'memory_hits': 0,
+            'disk_hits': 0,
+            'misses': 0,
+            'stores': 0,
+            'memory_evictions': 0,
+            'disk_evictions': 0
+        }
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+            self._load_disk_index()
+
+    def key(self, data: bytes) -> str:
+        """
+        Cache key for a raw upload
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        return f"{self.pipeline_version}-{self.config_digest}-{digest}"
+
+    def get(self, data: bytes) -> Optional[Dict]:
+        """
+        Look up a cached result for the uploaded bytes
+        """
+        key = self.key(data)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._counters['memory_hits'] += 1
+                return self._memory[key]
+
+            result = self._read_disk(key)
+            if result is not None:
+                self._counters['disk_hits'] += 1
+                self._put_memory(key, result)
+                return result
+
+            self._counters['misses'] += 1
+            return None
+
+    def put(self, data: bytes, result: Dict):
+        """
+        Cache a successful pipeline result
+        """
+        if not result.get('success'):
+            return
+
+        key = self.key(data)
+        with self._lock:
+            self._counters['stores'] += 1
+            self._put_memory(key, result)
+            if self.disk_dir:
+                self._write_disk(key, result)
+
+    def stats(self) -> Dict:
+        """
+        Hit/miss counters and tier sizes
+        """
+        with self._lock:
+            hits = self._counters['memory_hits'] + self._counters['disk_hits']
+            lookups = hits + self._counters['misses']
+            return {
+                **self._counters,
+                'hit_ratio': round(hits / lookups, 4) if lookups else 0,
+                'memory_entries': len(self._memory),
+                'memory_max_entries': self.max_entries,
+                'disk_enabled': bool(self.disk_dir),
+                'disk_entries': len(self._disk_index),
+                'disk_bytes': self._disk_bytes,
+                'disk_max_bytes': self.disk_max_bytes if self.disk_dir else 0,
+                'pipeline_version': self.pipeline_version,
+                'config_digest': self.config_digest
+            }
+
+    def _put_memory(self, key: str, result: Dict):
+        if self.max_entries <= 0:
+            return
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self._counters['memory_evictions'] += 1
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _load_disk_index(self):
+        """
+        Rebuild the disk LRU order from file modification times
+        """
+        entries = []
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith('.json'):
+                continue
+            stat = os.stat(os.path.join(self.disk_dir, name))
+            entries.append((stat.st_mtime, name[:-len('.json')], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk_index[key] = size
+            self._disk_bytes += size
+
+    def _read_disk(self, key: str) -> Optional[Dict]:
+        if not self.disk_dir or key not in self._disk_index:
+            return None
+        try:
+            with open(self._path(key), 'r') as f:
+                result = json.load(f)
+            os.utime(self._path(key))
+        except (OSError, ValueError):
+            self._disk_bytes -= self._disk_index.pop(key)
+            return None
+        self._disk_index.move_to_end(key)
+        return result
+
+    def _write_disk(self, key: str, result: Dict):
+        path = self._path(key)
+        tmp_path = f"{path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(result, f)
+            os.replace(tmp_path, path)
+            size = os.path.getsize(path)
+        except OSError as e:
+            print(f"Result cache write failed: {e}")
+            return
+
+        self._disk_bytes += size - self._disk_index.pop(key, 0)
+        self._disk_index[key] = size
+
+        while self._disk_bytes > self.disk_max_bytes and len(self._disk_index) > 1:
+            old_key, old_size = self._disk_index.popitem(last=False)
+            self._disk_bytes -= old_size
+            self._counters['disk_evictions'] += 1
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
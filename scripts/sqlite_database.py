@@ -0,0 +1,535 @@
+"""
+Embedded SQLite Storage Backend
+Same methods and response shapes as CertificateDatabase, in a single local
+file: no server, no network round trip, for single-node and edge deployments
+(DATABASE_BACKEND=sqlite)
+"""
+
+import os
+import re
+import json
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from database import (
+    CertificateStore, StatsCache, certificate_document, count_attempts, decode_page_token,
+    encode_page_token, listing_error, listing_page, listing_projection, page_limit,
+    search_result, stats_result, user_document, verification_result
+)
+
+# Fixed-width ISO timestamps, so text order is time order
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+# SQLite's default limit on bound parameters is 999 before 3.32
+SQLITE_MAX_PARAMETERS = 900
+
+# Columns kept outside the document: lookup and sort keys, and the fields that change after insert
+SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS certificates (
+        id INTEGER PRIMARY KEY,
+        hash TEXT,
+        certificate_id TEXT,
+        roll_no TEXT,
+        upload_date TEXT NOT NULL,
+        uploaded_by TEXT,
+        status TEXT,
+        verification_attempts INTEGER NOT NULL DEFAULT 0,
+        last_updated TEXT,
+        document TEXT NOT NULL
+    )""",
+    """CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY,
+        user_id TEXT,
+        email TEXT,
+        document TEXT NOT NULL
+    )"""
+]
+
+# The indexes of CERTIFICATE_INDEXES and USER_INDEXES; id plays the part of _id
+INDEXES = [
+    "CREATE UNIQUE INDEX IF NOT EXISTS certificates_hash ON certificates (hash)",
+    "CREATE INDEX IF NOT EXISTS certificates_certificate_id ON certificates (certificate_id)",
+    "CREATE INDEX IF NOT EXISTS certificates_roll_no ON certificates (roll_no)",
+    "CREATE INDEX IF NOT EXISTS certificates_listing ON certificates (upload_date, id)",
+    "CREATE INDEX IF NOT EXISTS certificates_status_listing ON certificates (status, upload_date, id)",
+    "CREATE INDEX IF NOT EXISTS certificates_user_listing ON certificates (uploaded_by, upload_date, id)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS users_email ON users (email)",
+    "CREATE UNIQUE INDEX IF NOT EXISTS users_user_id ON users (user_id)"
+]
+
+CERTIFICATE_COLUMNS = "id, upload_date, status, verification_attempts, last_updated, document"
+
+
+def _format_date(value: Optional[datetime]) -> Optional[str]:
+    return value.strftime(DATE_FORMAT) if value else None
+
+
+def _parse_date(value: Optional[str]) -> Optional[datetime]:
+    return datetime.strptime(value, DATE_FORMAT) if value else None
+
+
+def _certificate(row: Tuple, projection: Dict = None) -> Dict:
+    """
+    Rebuild a certificate document from a CERTIFICATE_COLUMNS row, keeping the
+    projected fields the way MongoDB would (_id unless excluded)
+    """
+    document = json.loads(row[5])
+    document.update({
+        "_id": str(row[0]),
+        "upload_date": _parse_date(row[1]),
+        "status": row[2],
+        "verification_attempts": row[3]
+    })
+    if row[4]:
+        document["last_updated"] = _parse_date(row[4])
+    if projection is None:
+        return document
+    return {
+        field: value for field, value in document.items()
+        if projection.get(field) or (field == "_id" and projection.get("_id", 1))
+    }
+
+
+# Unindexed plan steps: a table scan, or a sort of the matches into a temporary b-tree
+UNINDEXED_DETAILS = (re.compile(r"^SCAN \w+$"), re.compile(r"USE TEMP B-TREE"))
+
+
+class SQLiteCertificateDatabase(CertificateStore):
+    def __init__(self, path: str = None):
+        """
+        Open (creating if needed) the database file
+
+        The hash filter, lookup cache and attempt buffer are not used: a lookup is
+        an in-process index probe, with no round trip for them to save.
+
+        Args:
+            path: Database file (SQLITE_PATH); ':memory:' for a throwaway database
+        """
+        self.path = path or os.getenv('SQLITE_PATH', 'certificates.db')
+        self.database_name = os.path.splitext(os.path.basename(self.path))[0] or 'certificates'
+
+        # Last get_database_stats result
+        self._stats_cache = StatsCache()
+
+        # One connection, shared by the API's worker threads and serialized by the lock
+        self._lock = threading.Lock()
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        with self._lock, self.connection:
+            # WAL lets other processes (database_setup, registry_import) read while this one writes
+            self.connection.execute("PRAGMA journal_mode=WAL")
+            self.connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in SCHEMA + INDEXES:
+                self.connection.execute(statement)
+        print(f"Opened SQLite database {self.path}")
+
+    def _insert(self, document: Dict) -> int:
+        """
+        Insert one certificate document (caller holds the lock and the transaction)
+        """
+        stored = {
+            field: value for field, value in document.items()
+            if field not in ("_id", "upload_date", "status", "verification_attempts", "last_updated")
+        }
+        cursor = self.connection.execute(
+            "INSERT INTO certificates (hash, certificate_id, roll_no, upload_date, uploaded_by, status, "
+            "verification_attempts, document) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                document.get("hash"),
+                document.get("certificate_id"),
+                (document.get("extracted_data") or {}).get("roll_no"),
+                _format_date(document["upload_date"]),
+                document.get("uploaded_by"),
+                document.get("status"),
+                document.get("verification_attempts", 0),
+                json.dumps(stored, default=str)
+            )
+        )
+        return cursor.lastrowid
+
+    def store_certificate(self, certificate_data: Dict) -> Dict:
+        """
+        Store certificate data
+
+        Args:
+            certificate_data: Dictionary containing certificate information
+
+        Returns:
+            Dictionary with storage result
+        """
+        try:
+            with self._lock, self.connection:
+                document_id = self._insert(certificate_document(certificate_data))
+
+            return {
+                "success": True,
+                "document_id": str(document_id),
+                "hash": certificate_data.get("hash"),
+                "message": "Certificate stored successfully"
+            }
+
+        except sqlite3.IntegrityError:
+            return {
+                "success": False,
+                "error": "Certificate with this hash already exists",
+                "duplicate": True
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    def insert_certificates(self, documents: List[Dict]) -> List[Dict]:
+        """
+        Insert prepared certificate documents in one transaction, skipping rejected ones
+
+        Returns:
+            One {'index', 'duplicate', 'error'} entry per document that was not inserted
+        """
+        rejected = []
+        with self._lock, self.connection:
+            for index, document in enumerate(documents):
+                try:
+                    self._insert(document)
+                except sqlite3.IntegrityError as e:
+                    rejected.append({"index": index, "duplicate": "UNIQUE" in str(e), "error": str(e)})
+        return rejected
+
+    def verify_certificate_by_hash(self, hash_value: str) -> Dict:
+        """
+        Verify certificate by its SHA-256 hash, counting the attempt in the same transaction
+
+        Args:
+            hash_value: SHA-256 hash to verify
+
+        Returns:
+            Dictionary with verification result
+        """
+        try:
+            with self._lock, self.connection:
+                row = self.connection.execute(
+                    f"SELECT {CERTIFICATE_COLUMNS} FROM certificates WHERE hash = ?", (hash_value,)
+                ).fetchone()
+                if row:
+                    self.connection.execute(
+                        "UPDATE certificates SET verification_attempts = verification_attempts + 1 WHERE id = ?",
+                        (row[0],)
+                    )
+            return verification_result(hash_value, _certificate(row) if row else None)
+
+        except Exception as e:
+            return {
+                "verified": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    def verify_certificates_by_hashes(self, hash_values: List[str], chunk_size: int = None) -> Iterator[List[Dict]]:
+        """
+        Verify many hashes, one chunk (and one transaction) at a time
+
+        Args:
+            hash_values: Hashes to verify (duplicates are allowed)
+            chunk_size: Hashes per transaction (BULK_VERIFY_CHUNK_SIZE)
+
+        Yields:
+            Lists of results, in input order, shaped like verify_certificate_by_hash
+        """
+        chunk_size = chunk_size or int(os.getenv('BULK_VERIFY_CHUNK_SIZE', 1000))
+
+        for start in range(0, len(hash_values), chunk_size):
+            chunk = hash_values[start:start + chunk_size]
+            try:
+                found = {}
+                distinct = list(dict.fromkeys(chunk))
+                with self._lock, self.connection:
+                    for offset in range(0, len(distinct), SQLITE_MAX_PARAMETERS):
+                        batch = distinct[offset:offset + SQLITE_MAX_PARAMETERS]
+                        for row in self.connection.execute(
+                            f"SELECT hash, {CERTIFICATE_COLUMNS} FROM certificates "
+                            f"WHERE hash IN ({', '.join('?' * len(batch))})",
+                            batch
+                        ):
+                            found[row[0]] = _certificate(row[1:])
+
+                    # Duplicate hashes in the request count as separate attempts
+                    self.connection.executemany(
+                        "UPDATE certificates SET verification_attempts = verification_attempts + ? WHERE hash = ?",
+                        [(count, hash_value) for hash_value, count in count_attempts(chunk, found).items()]
+                    )
+
+                yield [verification_result(hash_value, found.get(hash_value)) for hash_value in chunk]
+
+            except Exception as e:
+                yield [
+                    {"verified": False, "hash": hash_value, "error": f"Database error: {str(e)}"}
+                    for hash_value in chunk
+                ]
+
+    def search_certificate_by_id(self, certificate_id: str) -> Dict:
+        """
+        Search for certificate by certificate ID
+
+        Args:
+            certificate_id: Certificate ID to search for
+
+        Returns:
+            Dictionary with search result
+        """
+        try:
+            with self._lock:
+                row = self.connection.execute(
+                    f"SELECT {CERTIFICATE_COLUMNS} FROM certificates WHERE certificate_id = ? LIMIT 1",
+                    (certificate_id,)
+                ).fetchone()
+            return search_result(certificate_id, _certificate(row) if row else None)
+
+        except Exception as e:
+            return {
+                "found": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    def iter_hashes(self) -> Iterator[str]:
+        """
+        Every stored hash in ascending order, read from the unique hash index
+        (for hash_snapshot.export_snapshot)
+        """
+        with self._lock:
+            cursor = self.connection.execute(
+                "SELECT hash FROM certificates WHERE hash IS NOT NULL ORDER BY hash"
+            )
+        # Fetched in batches, taking the lock per batch so lookups are not held up for the whole export
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(10000)
+            if not rows:
+                return
+            for (hash_value,) in rows:
+                yield hash_value
+
+    def get_certificates_by_user(self, user_id: str, limit: int = 50, page_token: str = None,
+                                 fields: List[str] = None) -> Dict:
+        """
+        Get one page of certificates uploaded by a specific user, newest first
+
+        Raises:
+            ValueError: For an invalid page token or an unknown field
+        """
+        return self._listing_page(("uploaded_by = ?", user_id), limit, page_token, fields)
+
+    def get_all_certificates(self, limit: int = 100, status: str = None, page_token: str = None,
+                             fields: List[str] = None) -> Dict:
+        """
+        Get one page of all certificates, newest first (admin function)
+
+        Raises:
+            ValueError: For an invalid page token or an unknown field
+        """
+        return self._listing_page(("status = ?", status) if status else None, limit, page_token, fields)
+
+    def _listing_sql(self, condition: Optional[Tuple[str, str]], page_token: Optional[str], limit: int) -> Tuple[str, List]:
+        """
+        Keyset listing query on (upload_date, id), the SQL counterpart of listing_query
+
+        Raises:
+            ValueError: If the token is malformed
+        """
+        clauses, parameters = [], []
+        if condition:
+            clauses.append(condition[0])
+            parameters.append(condition[1])
+        if page_token:
+            upload_date, document_id = decode_page_token(page_token)
+            try:
+                document_id = int(document_id)
+            except ValueError:
+                raise ValueError("Invalid page token")
+            # A row-value comparison is one index range, starting where the last page ended
+            clauses.append("(upload_date, id) < (?, ?)")
+            parameters.extend([_format_date(upload_date), document_id])
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        return (
+            f"SELECT {CERTIFICATE_COLUMNS} FROM certificates {where}ORDER BY upload_date DESC, id DESC LIMIT ?",
+            parameters + [limit + 1]
+        )
+
+    def _listing_page(self, condition: Optional[Tuple[str, str]], limit: int, page_token: Optional[str],
+                      fields: Optional[List[str]]) -> Dict:
+        limit = page_limit(limit)
+        sql, parameters = self._listing_sql(condition, page_token, limit)
+        projection = listing_projection(fields)
+
+        try:
+            with self._lock:
+                rows = self.connection.execute(sql, parameters).fetchall()
+            return listing_page([_certificate(row, projection) for row in rows], limit)
+
+        except Exception as e:
+            return listing_error(e)
+
+    def update_certificate_status(self, hash_value: str, status: str) -> Dict:
+        """
+        Update certificate status
+
+        Args:
+            hash_value: Certificate hash
+            status: New status
+
+        Returns:
+            Dictionary with update result
+        """
+        try:
+            with self._lock, self.connection:
+                cursor = self.connection.execute(
+                    "UPDATE certificates SET status = ?, last_updated = ? WHERE hash = ?",
+                    (status, _format_date(datetime.utcnow()), hash_value)
+                )
+
+            if cursor.rowcount:
+                return {
+                    "success": True,
+                    "message": "Certificate status updated"
+                }
+            else:
+                return {
+                    "success": False,
+                    "message": "Certificate not found"
+                }
+
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    def store_user(self, user_data: Dict) -> Dict:
+        """
+        Store user information
+
+        Args:
+            user_data: Dictionary containing user information
+
+        Returns:
+            Dictionary with storage result
+        """
+        try:
+            document = user_document(user_data)
+            with self._lock, self.connection:
+                cursor = self.connection.execute(
+                    "INSERT INTO users (user_id, email, document) VALUES (?, ?, ?)",
+                    (document["user_id"], document["email"], json.dumps(document, default=str))
+                )
+
+            return {
+                "success": True,
+                "user_id": str(cursor.lastrowid),
+                "message": "User stored successfully"
+            }
+
+        except sqlite3.IntegrityError:
+            return {
+                "success": False,
+                "error": "User with this email already exists"
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Database error: {str(e)}"
+            }
+
+    def _stats_sql(self) -> Tuple[str, List]:
+        """
+        Counts per status with today's uploads, read from the status listing index alone
+        """
+        start_of_today = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+        return (
+            "SELECT status, COUNT(*), SUM(upload_date >= ?) FROM certificates GROUP BY status",
+            [_format_date(start_of_today)]
+        )
+
+    def get_database_stats(self) -> Dict:
+        """
+        Get database statistics from one grouped query, cached for ADMIN_STATS_CACHE_SECONDS
+
+        Returns:
+            Dictionary with database statistics
+        """
+        cached = self._stats_cache.get()
+        if cached:
+            return cached
+
+        try:
+            with self._lock:
+                status_groups = [
+                    {"_id": status, "count": count, "today": today}
+                    for status, count, today in self.connection.execute(*self._stats_sql())
+                ]
+                total_users = self.connection.execute("SELECT COUNT(*) FROM users").fetchone()[0]
+
+            return self._stats_cache.put(stats_result(status_groups, total_users))
+
+        except Exception as e:
+            return {
+                "error": f"Database error: {str(e)}"
+            }
+
+    def query_shapes(self) -> List[Tuple[str, List[str]]]:
+        """
+        EXPLAIN QUERY PLAN details for every query shape this class issues, with placeholder values
+        """
+        sample_hash = "0" * 64
+        sample_token = encode_page_token({"upload_date": datetime.utcnow(), "_id": 1})
+
+        shapes = [
+            ("verify by hash", (f"SELECT {CERTIFICATE_COLUMNS} FROM certificates WHERE hash = ?", [sample_hash])),
+            ("bulk verify", (f"SELECT hash, {CERTIFICATE_COLUMNS} FROM certificates WHERE hash IN (?, ?)",
+                             [sample_hash, "f" * 64])),
+            ("search by certificate_id", (f"SELECT {CERTIFICATE_COLUMNS} FROM certificates WHERE certificate_id = ? LIMIT 1",
+                                          ["CERT-2024-001"])),
+            ("all certificates", self._listing_sql(None, None, 100)),
+            ("all certificates, next page", self._listing_sql(None, sample_token, 100)),
+            ("certificates by status", self._listing_sql(("status = ?", "verified"), None, 100)),
+            ("certificates by status, next page", self._listing_sql(("status = ?", "verified"), sample_token, 100)),
+            ("certificates by user", self._listing_sql(("uploaded_by = ?", "admin"), None, 100)),
+            ("certificates by user, next page", self._listing_sql(("uploaded_by = ?", "admin"), sample_token, 100)),
+            ("hash snapshot export", ("SELECT hash FROM certificates WHERE hash IS NOT NULL ORDER BY hash", [])),
+            ("admin stats", self._stats_sql())
+        ]
+        with self._lock:
+            return [
+                (name, [row[3] for row in self.connection.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)])
+                for name, (sql, parameters) in shapes
+            ]
+
+    def check_query_plans(self) -> List[Dict]:
+        """
+        Explain every query shape and flag those whose plan scans the table or sorts in a temporary b-tree
+
+        Returns:
+            One report per shape: {'shape', 'stages', 'indexes', 'ok'}
+        """
+        reports = []
+        for name, details in self.query_shapes():
+            reports.append({
+                "shape": name,
+                "stages": details,
+                "indexes": sorted({
+                    match.group(1) for detail in details
+                    for match in [re.search(r"USING (?:COVERING )?INDEX (\w+)", detail)] if match
+                }),
+                "ok": bool(details) and not any(
+                    pattern.search(detail) for detail in details for pattern in UNINDEXED_DETAILS
+                )
+            })
+        return reports
+
+    def close_connection(self):
+        """
+        Close database connection
+        """
+        with self._lock:
+            self.connection.close()
+        print("Database connection closed")
@@ -11,20 +11,34 @@ import pytesseract
 from PIL import Image
 from fastapi import FastAPI, File, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from transformers import LayoutLMv3Processor, LayoutLMv3ForTokenClassification
-import torch
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Optional
 import re
 from datetime import datetime
 import base64
 import io
+import asyncio
+import time
+import uuid
 
 # Import database module
-from database import CertificateDatabase
+from database import create_database
+from async_database import create_async_database
+from ocr_executor import OCRExecutor
+from result_cache import ResultCache
+from upload_handling import MIME_TYPES, read_upload, sniff_format, spool_upload
+from registry_import import REGISTRY_FORMATS, RegistryImport, registry_format
+from metrics import observe_stages
 
+# SERVER_MODE=verify-only serves /verify-hash and search without loading torch/transformers
+SERVER_MODE = os.getenv('SERVER_MODE', 'full').lower()
+OCR_ENABLED = SERVER_MODE != 'verify-only'
 
-# Initialize database
-db = CertificateDatabase()
+
+# Initialize database (DATABASE_BACKEND): the sync client stores results from the
+# OCR pipeline, the async client serves the endpoints without blocking the event loop
+db = create_database()
+async_db = create_async_database(db)
 
 class CertificateOCR:
     # ... existing methods ...
@@ -34,36 +48,27 @@ class CertificateOCR:
         Main processing pipeline with database integration
         """
         try:
-            # Convert bytes to numpy array
-            nparr = np.frombuffer(image_data, np.uint8)
-            image = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
-            
-            if image is None:
-                raise ValueError("Could not decode image")
-            
-            start_time = datetime.now()
-            
-            # Step 1: Preprocess image
-            preprocessed = self.preprocess_image(image)
+            start_time = time.perf_counter()
             
-            # Step 2: Extract text with Tesseract
-            ocr_result = self.extract_text_tesseract(preprocessed)
+            # Steps 0-3: Decode (image or multi-page PDF), normalize, OCR and extract fields
+            prepared = self.prepare_certificate(image_data)
+            ocr_result = prepared['ocr_result']
+            extracted_fields = prepared['extracted_fields']
+            timings = prepared['timings']
             
-            # Step 3: Extract structured fields
-            extracted_fields = self.extract_fields_with_patterns(ocr_result['raw_text'])
-            
-            # Step 4: Process with LayoutLMv3 for enhanced accuracy
-            pil_image = Image.fromarray(cv2.cvtColor(image, cv2.COLOR_BGR2RGB))
-            layout_result = self.process_with_layoutlmv3(pil_image, ocr_result)
+            # Step 4: Process with LayoutLMv3 when the pattern stage needs help
+            with timings.activate():
+                layout_result = self.run_layout_stage(prepared['image'], ocr_result, extracted_fields)
             
             # Step 5: Generate hash
-            certificate_hash = self.generate_hash(extracted_fields)
+            with timings.stage('hash'):
+                certificate_hash = self.generate_hash(extracted_fields)
             
-            # Calculate processing time
-            processing_time = (datetime.now() - start_time).total_seconds()
+            # Calculate processing time (monotonic; the wall clock can step)
+            processing_time = time.perf_counter() - start_time
             
             # Calculate overall confidence
-            base_confidence = sum([item['confidence'] for item in ocr_result['structured_data']]) / len(ocr_result['structured_data']) if ocr_result['structured_data'] else 0
+            base_confidence = self.ocr_confidence(ocr_result)
             layout_confidence = layout_result['layout_confidence']
             overall_confidence = (base_confidence * 0.6 + layout_confidence * 0.4)
             
@@ -78,14 +83,16 @@ class CertificateOCR:
                 'processing_info': {
                     'tesseract_confidence': round(base_confidence, 2),
                     'layout_confidence': round(layout_confidence, 2),
-                    'enhanced_extraction': layout_result['enhanced_extraction']
+                    'enhanced_extraction': layout_result['enhanced_extraction'],
+                    'layout_stage': layout_result['layout_stage']
                 },
-                'file_type': 'image/jpeg',  # Detect actual type in production
+                'file_type': MIME_TYPES.get(sniff_format(image_data[:1024])),
                 'processing_time': processing_time
             }
             
             # Store in database
-            db_result = db.store_certificate(certificate_data)
+            with timings.stage('db_write'):
+                db_result = db.store_certificate(certificate_data)
             
             return {
                 'success': True,
@@ -97,7 +104,13 @@ class CertificateOCR:
                     'tesseract_confidence': round(base_confidence, 2),
                     'layout_confidence': round(layout_confidence, 2),
                     'enhanced_extraction': layout_result['enhanced_extraction'],
-                    'processing_time': processing_time
+                    'layout_stage': layout_result['layout_stage'],
+                    'layout_stage_reason': layout_result['layout_stage_reason'],
+                    'normalization': prepared['normalization'],
+                    'pages': prepared.get('pages'),
+                    'template': prepared.get('template'),
+                    'processing_time': processing_time,
+                    'stage_ms': timings.breakdown()
                 },
                 'database_stored': db_result['success'],
                 'timestamp': datetime.now().isoformat()
@@ -112,15 +125,101 @@ class CertificateOCR:
 
 # ... existing FastAPI setup ...
 
+ocr_processor = CertificateOCR()
+
+# Run the pipeline off the event loop; thread mode runs ocr_processor, while in process
+# mode each worker builds its own processor and opens its own DB client
+ocr_executor = OCRExecutor(CertificateOCR, processor=ocr_processor)
+
+# Repeat uploads (retries, re-checks, reprocessing) skip the pipeline and the DB write;
+# keyed by the upload and the pipeline settings, which every worker reads from the same environment
+result_cache = ResultCache(PIPELINE_VERSION, ocr_processor.config_fingerprint())
+
+# How often the hash filter picks up certificates stored by other processes and is saved
+HASH_FILTER_REFRESH_SECONDS = float(os.getenv('HASH_FILTER_REFRESH_SECONDS', 30))
+
+# Tasks started without being awaited; the event loop keeps only weak references to them
+background_tasks = set()
+
+def run_in_background(coroutine, description: str, on_error=None) -> asyncio.Task:
+    """
+    Start a task nobody awaits, holding it until it finishes and reporting an uncaught exception
+    
+    Args:
+        coroutine: Work to run on the event loop
+        description: What the task does, for the log line
+        on_error: Also called with the exception
+    """
+    task = asyncio.create_task(coroutine)
+    background_tasks.add(task)
+    
+    def finished(task: asyncio.Task):
+        background_tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+        print(f"{description} failed: {task.exception()}")
+        if on_error:
+            on_error(task.exception())
+    
+    task.add_done_callback(finished)
+    return task
+
+async def maintain_hash_filter():
+    """
+    Build the hash filter off the event loop, then keep it in step with the collection
+    """
+    try:
+        await async_db.load_hash_filter()
+    except Exception as e:
+        print(f"Hash filter build failed; verifying every hash against the database: {e}")
+        return
+    while True:
+        await asyncio.sleep(HASH_FILTER_REFRESH_SECONDS)
+        try:
+            await async_db.refresh_hash_filter()
+        except Exception as e:
+            print(f"Hash filter refresh failed: {e}")
+
+@app.on_event("startup")
+async def start_ocr_executor():
+    await async_db.connect()
+    if OCR_ENABLED:
+        ocr_executor.start()
+    # Lookups go to the database until the filter is built
+    if db.hash_filter:
+        run_in_background(maintain_hash_filter(), "Hash filter maintenance")
+
+@app.on_event("shutdown")
+async def stop_ocr_executor():
+    ocr_executor.shutdown()
+    if db.hash_filter and db.hash_filter.ready:
+        db.hash_filter.save(db.database_name)
+    # Both clients share the attempt counter; closing them flushes it
+    await asyncio.to_thread(async_db.close_connection)
+    db.close_connection()
+
 @app.post("/process-certificate")
 async def process_certificate(file: UploadFile = File(...), uploaded_by: str = "anonymous"):
     """
     Process uploaded certificate and store in database
     """
-    # ... existing validation ...
+    if not OCR_ENABLED:
+        raise HTTPException(status_code=503, detail="OCR is disabled in verify-only mode")
+    
+    # Validate file type (by magic bytes) and size (10MB limit) while reading in chunks
+    _, contents = await read_upload(file)
     
-    # Process the certificate with database integration
-    result = ocr_processor.process_certificate(contents, file.filename, uploaded_by)
+    # Process the certificate with database integration on the OCR pool
+    result = await asyncio.to_thread(result_cache.get, contents)
+    cached = result is not None
+    if not cached:
+        result = await ocr_executor.process_certificate(contents, file.filename, uploaded_by)
+        await asyncio.to_thread(result_cache.put, contents, result)
+        if result['success']:
+            observe_stages(result['processing_info'].get('stage_ms'))
+        # Process-mode workers store through their own client; keep this process's filter current
+        if result['success'] and db.hash_filter:
+            db.hash_filter.add(result['hash'])
     
     if not result['success']:
         raise HTTPException(status_code=500, detail=f"Processing failed: {result['error']}")
@@ -132,6 +231,7 @@ async def process_certificate(file: UploadFile = File(...), uploaded_by: str = "
         "confidence": result['confidence'],
         "processing_info": result['processing_info'],
         "database_stored": result['database_stored'],
+        "cached": cached,
         "timestamp": result['timestamp']
     }
 
@@ -146,40 +246,172 @@ async def verify_hash(hash_data: Dict):
         raise HTTPException(status_code=400, detail="Hash is required")
     
     # Verify against database
-    result = db.verify_certificate_by_hash(provided_hash)
+    result = await async_db.verify_certificate_by_hash(provided_hash)
     
     return result
 
+# Bulk verification limits: larger requests are rejected, larger-than-threshold ones are streamed
+BULK_VERIFY_MAX_HASHES = int(os.getenv('BULK_VERIFY_MAX_HASHES', 100000))
+BULK_VERIFY_STREAM_THRESHOLD = int(os.getenv('BULK_VERIFY_STREAM_THRESHOLD', 1000))
+
+@app.post("/verify-hashes/batch")
+async def verify_hashes_batch(hash_data: Dict):
+    """
+    Verify a list of hashes; results come back in input order, as NDJSON for large lists
+    """
+    hashes = hash_data.get('hashes')
+    
+    if not isinstance(hashes, list) or not hashes or not all(isinstance(h, str) and h for h in hashes):
+        raise HTTPException(status_code=400, detail="hashes must be a non-empty list of strings")
+    if len(hashes) > BULK_VERIFY_MAX_HASHES:
+        raise HTTPException(status_code=400, detail=f"Too many hashes (max {BULK_VERIFY_MAX_HASHES})")
+    
+    chunks = async_db.verify_certificates_by_hashes(hashes)
+    
+    if len(hashes) <= BULK_VERIFY_STREAM_THRESHOLD:
+        results = [result async for chunk in chunks for result in chunk]
+        return {
+            "results": results,
+            "count": len(results),
+            "verified_count": sum(1 for result in results if result['verified'])
+        }
+    
+    async def stream_results():
+        # Each chunk's query and counter update are awaited, so other requests keep running
+        async for chunk in chunks:
+            yield ''.join(json.dumps(result) + "\n" for result in chunk)
+    
+    return StreamingResponse(stream_results(), media_type="application/x-ndjson")
+
+# Registry uploads and their checkpoints; uploading the same file again resumes its import
+REGISTRY_IMPORT_DIR = os.getenv('REGISTRY_IMPORT_DIR', 'registry_imports')
+REGISTRY_IMPORT_MAX_SIZE = int(os.getenv('REGISTRY_IMPORT_MAX_MB', 500)) * 1024 * 1024
+registry_imports: Dict[str, RegistryImport] = {}
+
+@app.post("/registry/import")
+async def import_registry(file: UploadFile = File(...), uploaded_by: str = "registry-import"):
+    """
+    Start a bulk import of a CSV or JSONL registry; poll GET /registry/import/{job_id}
+    """
+    os.makedirs(REGISTRY_IMPORT_DIR, exist_ok=True)
+    spool_path = os.path.join(REGISTRY_IMPORT_DIR, f"upload-{uuid.uuid4().hex}")
+    digest = await spool_upload(file, spool_path, REGISTRY_IMPORT_MAX_SIZE)
+    
+    # The job is named after the contents, so a re-upload finds its checkpoint
+    job_id = digest[:16]
+    running = registry_imports.get(job_id)
+    if running and running.progress['status'] == 'running':
+        os.remove(spool_path)
+        return {"job_id": job_id, **running.progress}
+    
+    with open(spool_path, 'rb') as f:
+        head = f.read(1024)
+    if sniff_format(head) is not None:
+        os.remove(spool_path)
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+    file_format = registry_format(file.filename, head)
+    path = os.path.join(REGISTRY_IMPORT_DIR, f"{job_id}.{file_format}")
+    os.replace(spool_path, path)
+    
+    # db shares its hash filter with async_db; every inserted hash is added to it as the batch is written
+    job = RegistryImport(db, path, file_format, uploaded_by=uploaded_by)
+    job.progress['status'] = 'running'
+    registry_imports[job_id] = job
+    
+    def record_failure(error: BaseException):
+        # run() reports its own errors; this catches anything that escapes it
+        job.progress['status'] = 'failed'
+        job.progress['error'] = str(error) or type(error).__name__
+    
+    run_in_background(asyncio.to_thread(job.run), f"Registry import {job_id}", on_error=record_failure)
+    return {"job_id": job_id, **job.progress}
+
+@app.get("/registry/import/{job_id}")
+async def registry_import_status(job_id: str):
+    """
+    Progress of a registry import: inserted, duplicate and invalid counts with sample rows
+    """
+    job = registry_imports.get(job_id)
+    if job:
+        return {"job_id": job_id, **job.progress}
+    
+    # Started before a restart: report the last checkpoint
+    for file_format in REGISTRY_FORMATS:
+        checkpoint_path = os.path.join(REGISTRY_IMPORT_DIR, f"{job_id}.{file_format}.checkpoint.json")
+        if os.path.exists(checkpoint_path):
+            with open(checkpoint_path) as f:
+                progress = json.load(f)['progress']
+            if progress['status'] == 'running':
+                progress['status'] = 'interrupted'
+            return {"job_id": job_id, **progress}
+    raise HTTPException(status_code=404, detail="Import job not found")
+
 @app.get("/search-certificate/{certificate_id}")
 async def search_certificate(certificate_id: str):
     """
     Search for certificate by ID
     """
-    result = db.search_certificate_by_id(certificate_id)
+    result = await async_db.search_certificate_by_id(certificate_id)
     return result
 
+def parse_fields(fields: Optional[str]) -> Optional[List[str]]:
+    """
+    Split a comma-separated fields parameter
+    """
+    if not fields:
+        return None
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
 @app.get("/admin/certificates")
-async def get_all_certificates(limit: int = 100, status: str = None):
+async def get_all_certificates(limit: int = 100, status: str = None, page_token: str = None, fields: str = None):
     """
-    Get all certificates (admin endpoint)
+    Get all certificates, one page at a time (admin endpoint)
+    
+    Pass the response's next_page_token to get the next page; fields is a
+    comma-separated projection.
     """
-    certificates = db.get_all_certificates(limit, status)
-    return {"certificates": certificates, "count": len(certificates)}
+    try:
+        return await async_db.get_all_certificates(limit, status, page_token, parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @app.get("/admin/stats")
 async def get_database_stats():
     """
     Get database statistics (admin endpoint)
     """
-    stats = db.get_database_stats()
+    stats = await async_db.get_database_stats()
     return stats
 
+@app.get("/hash-filter/stats")
+async def hash_filter_stats():
+    """
+    Hash filter memory use and estimated/observed false-positive rates
+    """
+    return await async_db.get_hash_filter_stats()
+
+@app.get("/lookup-cache/stats")
+async def lookup_cache_stats():
+    """
+    Hit ratios of the verify and search caches
+    """
+    return await async_db.get_lookup_cache_stats()
+
+@app.get("/verification-attempts/stats")
+async def attempt_counter_stats():
+    """
+    Verification attempts waiting to be written and how often the buffer has flushed
+    """
+    return await async_db.get_attempt_counter_stats()
+
 @app.get("/user/{user_id}/certificates")
-async def get_user_certificates(user_id: str, limit: int = 50):
+async def get_user_certificates(user_id: str, limit: int = 50, page_token: str = None, fields: str = None):
     """
-    Get certificates for a specific user
+    Get certificates for a specific user, one page at a time
     """
-    certificates = db.get_certificates_by_user(user_id, limit)
-    return {"certificates": certificates, "count": len(certificates)}
+    try:
+        return await async_db.get_certificates_by_user(user_id, limit, page_token, parse_fields(fields))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 # ... rest of existing code ...
@@ -0,0 +1,172 @@
+"""
+Upload Handling for the Certificate OCR Backend
+Reads uploads in chunks with early size rejection, identifies files by their
+magic bytes and decodes images within a fixed pixel budget
+"""
+
+import os
+import io
+import hashlib
+from typing import Dict, Optional, Tuple
+
+import cv2
+import numpy as np
+from fastapi import HTTPException, UploadFile
+from PIL import Image
+
+from pdf_ingestion import is_pdf
+
+MAX_FILE_SIZE = 10 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_KB', 256)) * 1024
+
+# Largest image (in pixels) that is ever fully decoded; a small compressed file
+# can otherwise expand into gigabytes of pixels
+MAX_DECODE_PIXELS = int(float(os.getenv('MAX_DECODE_MEGAPIXELS', 60)) * 1_000_000)
+
+MAGIC_NUMBERS = {
+    'png': (b'\x89PNG\r\n\x1a\n',),
+    'jpeg': (b'\xff\xd8\xff',),
+    'zip': (b'PK\x03\x04', b'PK\x05\x06'),
+}
+CERTIFICATE_FORMATS = ('png', 'jpeg', 'pdf')
+MIME_TYPES = {'png': 'image/png', 'jpeg': 'image/jpeg', 'pdf': 'application/pdf', 'zip': 'application/zip'}
+
+# cv2 flags that decode at 1/2, 1/4 and 1/8 scale (JPEG scales during the DCT)
+REDUCED_DECODE_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """
+    Identify an upload from its first bytes: 'png', 'jpeg', 'pdf', 'zip' or None
+    """
+    for file_format, signatures in MAGIC_NUMBERS.items():
+        if head.startswith(signatures):
+            return file_format
+    if is_pdf(head):
+        return 'pdf'
+    return None
+
+
+async def read_upload(file: UploadFile, formats: Tuple[str, ...] = CERTIFICATE_FORMATS,
+                      max_sizes: Dict[str, int] = None, chunk_size: int = None) -> Tuple[str, bytes]:
+    """
+    Read an upload chunk by chunk, rejecting it as soon as it is known to be invalid
+
+    The format is sniffed from the first chunk and reading stops once the size
+    limit for that format is passed, so a rejected upload never sits in memory.
+
+    Args:
+        file: Uploaded file
+        formats: Accepted formats (see sniff_format)
+        max_sizes: Per-format size limits in bytes (MAX_FILE_SIZE when not listed)
+        chunk_size: Bytes read per call (UPLOAD_CHUNK_KB)
+
+    Returns:
+        Tuple of (format, contents)
+
+    Raises:
+        HTTPException: 400 for an unsupported format or an oversized file
+    """
+    max_sizes = max_sizes or {}
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    largest = max([MAX_FILE_SIZE, *max_sizes.values()])
+
+    # The multipart parser knows the size of the spooled file; no need to read it
+    if file.size is not None and file.size > largest:
+        raise HTTPException(status_code=400, detail=f"File too large (max {largest // (1024 * 1024)}MB)")
+
+    head = await file.read(chunk_size)
+    file_format = sniff_format(head)
+    if file_format not in formats:
+        raise HTTPException(status_code=400, detail="Unsupported file format")
+
+    limit = max_sizes.get(file_format, MAX_FILE_SIZE)
+    buffer = io.BytesIO()
+    buffer.write(head)
+    while head:
+        if buffer.tell() > limit:
+            raise HTTPException(status_code=400, detail=f"File too large (max {limit // (1024 * 1024)}MB)")
+        head = await file.read(chunk_size)
+        buffer.write(head)
+
+    # getvalue() hands over the buffer's bytes without another copy
+    return file_format, buffer.getvalue()
+
+
+async def spool_upload(file: UploadFile, path: str, max_size: int, chunk_size: int = None) -> str:
+    """
+    Write an upload to disk chunk by chunk, for files too large to hold in memory
+
+    Args:
+        file: Uploaded file
+        path: Destination (the partial file is removed on rejection)
+        max_size: Size limit in bytes
+        chunk_size: Bytes read per call (UPLOAD_CHUNK_KB)
+
+    Returns:
+        SHA-256 of the contents
+
+    Raises:
+        HTTPException: 400 for an oversized file
+    """
+    chunk_size = chunk_size or UPLOAD_CHUNK_SIZE
+    too_large = HTTPException(status_code=400, detail=f"File too large (max {max_size // (1024 * 1024)}MB)")
+    if file.size is not None and file.size > max_size:
+        raise too_large
+
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(path, 'wb') as f:
+            while chunk := await file.read(chunk_size):
+                written += len(chunk)
+                if written > max_size:
+                    raise too_large
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(path)
+        raise
+    return digest.hexdigest()
+
+
+def decode_image(data: bytes, budget_pixels: int = None) -> np.ndarray:
+    """
+    Decode an image upload to BGR, checking its dimensions before decoding
+
+    Args:
+        data: Encoded image bytes
+        budget_pixels: Pixel count the pipeline resamples to anyway; images at
+                       least 4x larger are decoded directly at a reduced scale
+
+    Raises:
+        ValueError: If the image cannot be decoded or exceeds MAX_DECODE_MEGAPIXELS
+    """
+    # Reading the header is enough to learn the size
+    try:
+        with Image.open(io.BytesIO(data)) as header:
+            width, height = header.size
+    except Image.DecompressionBombError:
+        raise ValueError("Image dimensions too large")
+    except Exception:
+        raise ValueError("Could not decode image")
+
+    pixels = width * height
+    if pixels > MAX_DECODE_PIXELS:
+        raise ValueError(f"Image dimensions too large ({width}x{height}, max {MAX_DECODE_PIXELS // 1_000_000}MP)")
+
+    flag = cv2.IMREAD_COLOR
+    if budget_pixels:
+        for reduction, reduced_flag in REDUCED_DECODE_FLAGS:
+            if pixels / reduction ** 2 >= budget_pixels:
+                flag = reduced_flag
+                break
+
+    image = cv2.imdecode(np.frombuffer(data, np.uint8), flag)
+    if image is None:
+        raise ValueError("Could not decode image")
+    return image